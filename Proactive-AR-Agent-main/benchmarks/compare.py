@@ -0,0 +1,71 @@
+# benchmarks/compare.py（对比两次基准结果，标出变慢超过阈值的项）
+#
+# 用法：python -m benchmarks.compare base.json new.json [--threshold 10] [--fail-on-regression]
+
+import argparse
+import json
+import sys
+
+# 子系统基准比较的指标（越小越好）
+LATENCY_KEYS = ('mean_us', 'p50_us', 'p95_us')
+
+
+def load_report(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_reports(base, new, threshold):
+    """
+    逐项对比，返回 [(基准名, 指标, 旧值, 新值, 变化百分比, 是否退化)]；
+    耗时类指标变大、端到端 fps 变小超过 threshold% 视为退化
+    """
+    rows = []
+    for name, new_result in new['results'].items():
+        base_result = base['results'].get(name)
+        if not base_result or 'skipped' in base_result or 'skipped' in new_result:
+            continue
+        if 'fps' in new_result:
+            old, value = base_result.get('fps'), new_result['fps']
+            if old:
+                change = (value - old) / old * 100
+                rows.append((name, 'fps', old, value, change, change < -threshold))
+            for stage, stats in new_result.get('stages', {}).items():
+                old = (base_result.get('stages', {}).get(stage) or {}).get('p50_ms')
+                if old and stats.get('p50_ms') is not None:
+                    change = (stats['p50_ms'] - old) / old * 100
+                    rows.append((name, f"{stage}.p50_ms", old, stats['p50_ms'], change, change > threshold))
+            continue
+        for key in LATENCY_KEYS:
+            old, value = base_result.get(key), new_result.get(key)
+            if old and value is not None:
+                change = (value - old) / old * 100
+                rows.append((name, key, old, value, change, change > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比两次基准结果")
+    parser.add_argument('base', help="基线结果JSON")
+    parser.add_argument('new', help="新结果JSON")
+    parser.add_argument('--threshold', type=float, default=10.0, help="视为退化的变化百分比")
+    parser.add_argument('--fail-on-regression', action='store_true', help="有退化时以退出码 1 结束")
+    args = parser.parse_args()
+
+    base, new = load_report(args.base), load_report(args.new)
+    if base['meta'].get('params') != new['meta'].get('params'):
+        print("警告：两次运行的参数不同，结果不可直接比较")
+    print(f"基线 {base['meta'].get('commit')} -> 新 {new['meta'].get('commit')}（阈值 {args.threshold:.0f}%）")
+
+    rows = compare_reports(base, new, args.threshold)
+    regressions = 0
+    for name, key, old, value, change, regressed in rows:
+        regressions += regressed
+        mark = "  <-- 退化" if regressed else ""
+        print(f"{name:22s} {key:22s} {old:>12.3f} -> {value:>12.3f}  {change:+7.1f}%{mark}")
+    print(f"共 {len(rows)} 项，退化 {regressions} 项")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,253 @@
+# benchmarks/run_benchmarks.py（分子系统基准测试 + 无界面端到端基准，结果写入JSON便于跨提交对比）
+#
+# 用法（在项目目录下）：
+#   python -m benchmarks.run_benchmarks --objects 8 --motion 2 --class-mix kitchen -o bench.json
+#   python -m benchmarks.compare base.json bench.json
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from modules.analysis_config import AnalysisConfig
+from modules.object_tracker import ObjectTracker
+from modules.preview_renderer import PreviewRenderer
+from modules.scene_analyzer import SceneAnalyzer
+from modules.summarizer import RollingAggregator
+from benchmarks.synthetic import SyntheticScene, parse_class_mix, write_synthetic_video
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS = ('object_tracker', 'deepsort_bookkeeping', 'structured_data', 'scene_frame', 'prompt',
+              'summarizer', 'preview_render', 'headless_e2e')
+
+
+def timing_stats(samples, total_seconds):
+    """
+    每次操作耗时的统计（微秒）
+    """
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))] * 1e6
+    return {
+        'ops': len(ordered),
+        'mean_us': round(sum(ordered) / len(ordered) * 1e6, 3),
+        'p50_us': round(pick(50), 3),
+        'p95_us': round(pick(95), 3),
+        'p99_us': round(pick(99), 3),
+        'ops_per_sec': round(len(ordered) / total_seconds, 1) if total_seconds > 0 else None
+    }
+
+
+def time_ops(make_state, op, inputs, repeat):
+    """
+    每轮用 make_state() 创建新状态，对 inputs 逐个计时执行 op(state, item)；返回所有轮次合并后的统计
+    """
+    samples = []
+    total = 0.0
+    for _ in range(repeat):
+        state = make_state()
+        round_start = time.perf_counter()
+        for item in inputs:
+            start = time.perf_counter()
+            op(state, item)
+            samples.append(time.perf_counter() - start)
+        total += time.perf_counter() - round_start
+    return timing_stats(samples, total)
+
+
+def synthetic_frames(args, class_weights):
+    scene = SyntheticScene(num_objects=args.objects, class_weights=class_weights, motion=args.motion,
+                           churn=args.churn, width=args.width, height=args.height, seed=args.seed)
+    return list(scene.frames(args.frames))
+
+
+def bench_object_tracker(args, frames, config):
+    detections = [[dict(det) for det in dets] for dets in frames]
+    return time_ops(lambda: ObjectTracker(window_size=30, iou_threshold=0.5),
+                    lambda tracker, dets: tracker.update(dets), detections, args.repeat)
+
+
+def bench_deepsort_bookkeeping(args, frames, config):
+    try:
+        from modules.deep_sort_tracker import DeepSortTracker
+    except ImportError as e:
+        return {'skipped': f"缺少依赖: {e}"}
+
+    def make_state():
+        # 只测追踪结果的簿记，不加载 YOLO 和 Deep SORT 模型
+        tracker = DeepSortTracker.__new__(DeepSortTracker)
+        tracker.tracked_objects = []
+        tracker.frame_count = 0
+        return tracker
+
+    tracks = [[{'track_id': det['track_id'], 'class': det['class'], 'bbox': det['bbox'], 'conf': det['conf'],
+                'age': det['age']} for det in dets] for dets in frames]
+    return time_ops(make_state, lambda tracker, batch: tracker._update_tracked_objects([dict(t) for t in batch]),
+                    tracks, args.repeat)
+
+
+def bench_structured_data(args, frames, config):
+    analyzer = SceneAnalyzer(config=config)
+    return time_ops(lambda: analyzer,
+                    lambda a, dets: a.create_structured_data(dets, args.width, args.height), frames, args.repeat)
+
+
+def bench_scene_frame(args, frames, config):
+    def op(state, dets):
+        analyzer, previous = state
+        state[1] = analyzer.process_frame(dets, args.width, args.height, previous)[0]
+
+    return time_ops(lambda: [SceneAnalyzer(config=config), None], op, frames, args.repeat)
+
+
+def bench_prompt(args, frames, config):
+    analyzer = SceneAnalyzer(config=config)
+    structured = [analyzer.create_structured_data(dets, args.width, args.height) for dets in frames]
+    tasks = [config.current.get_default_task(data['scene_id']) for data in structured]
+    return time_ops(lambda: analyzer, lambda a, item: a.create_compact_prompt(*item),
+                    list(zip(structured, tasks)), args.repeat)
+
+
+def bench_summarizer(args, frames, config):
+    classes = [(i / args.fps, [det['class'] for det in dets]) for i, dets in enumerate(frames)]
+
+    def op(aggregator, item):
+        aggregator.update(item[1], item[0])
+        aggregator.classes_seen(3, 10.0)
+
+    return time_ops(RollingAggregator, op, classes, args.repeat)
+
+
+def bench_preview_render(args, frames, config):
+    # 源分辨率与 --render-width/--render-height 一致，检测框按比例放大
+    width, height = args.render_width, args.render_height
+    scale_x, scale_y = width / args.width, height / args.height
+    source = np.full((height, width, 3), 60, dtype=np.uint8)
+    scaled = [[dict(det, bbox=[det['bbox'][0] * scale_x, det['bbox'][1] * scale_y,
+                               det['bbox'][2] * scale_x, det['bbox'][3] * scale_y]) for det in dets]
+              for dets in frames[:min(len(frames), 300)]]
+    return time_ops(PreviewRenderer, lambda renderer, dets: renderer.render(source, dets), scaled, args.repeat)
+
+
+def bench_headless_e2e(args, frames, config):
+    """
+    生成合成视频及对应的检测记录，用回放检测器跑完整的无界面流水线（解码 -> 场景分析 -> 调度 -> JSONL）
+    """
+    import headless
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = os.path.join(tmp, 'synthetic.avi')
+        fixture_path = os.path.join(tmp, 'detections.jsonl')
+        scene = SyntheticScene(num_objects=args.objects, class_weights=parse_class_mix(args.class_mix, config),
+                               motion=args.motion, churn=args.churn, width=args.width, height=args.height,
+                               seed=args.seed)
+        write_synthetic_video(video_path, scene, args.video_frames, fps=args.fps, fixture_path=fixture_path)
+
+        runs = []
+        for _ in range(args.repeat):
+            headless_args = headless.build_parser().parse_args([
+                video_path, '--tracker', 'recorded', '--detections', fixture_path,
+                '-o', os.path.join(tmp, 'results.jsonl'), '--metrics'
+            ])
+            from modules.instrumentation import metrics
+            metrics.reset()
+            runs.append(headless.run_headless(headless_args))
+    best = max(runs, key=lambda report: report['fps'])
+    return {
+        'ops': best['frames'],
+        'fps': round(best['fps'], 1),
+        'fps_runs': [round(report['fps'], 1) for report in runs],
+        'stages': best['stages']
+    }
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=PROJECT_DIR,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def run_benchmarks(args):
+    config = AnalysisConfig()
+    class_weights = parse_class_mix(args.class_mix, config)
+    frames = synthetic_frames(args, class_weights)
+    selected = args.only.split(',') if args.only else list(BENCHMARKS)
+
+    commit, dirty = git_revision()
+    report = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'params': {key: value for key, value in vars(args).items() if key not in ('output', 'only')}
+        },
+        'results': {}
+    }
+    functions = {name: globals()[f"bench_{name}"] for name in BENCHMARKS}
+    for name in selected:
+        if name not in functions:
+            print(f"未知的基准 {name}（可用: {', '.join(BENCHMARKS)}）")
+            continue
+        print(f"运行 {name} ...", flush=True)
+        report['results'][name] = functions[name](args, frames, config)
+    return report
+
+
+def print_report(report):
+    meta = report['meta']
+    print(f"\n===== 基准结果（{meta['commit']}{' 有未提交修改' if meta['dirty'] else ''}）=====")
+    for name, result in report['results'].items():
+        if 'skipped' in result:
+            print(f"{name:22s} 跳过：{result['skipped']}")
+        elif 'fps' in result:
+            print(f"{name:22s} {result['fps']:.1f} 帧/s（{result['ops']} 帧）")
+            for stage, stats in result['stages'].items():
+                print(f"{'':22s}   {stage}: p50 {stats['p50_ms']:.3f} ms，p95 {stats['p95_ms']:.3f} ms")
+        else:
+            print(f"{name:22s} 平均 {result['mean_us']:.1f} µs，p50 {result['p50_us']:.1f} µs，"
+                  f"p95 {result['p95_us']:.1f} µs，p99 {result['p99_us']:.1f} µs（{result['ops']} 次）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分子系统与端到端基准测试")
+    parser.add_argument('-o', '--output', default='benchmark_results.json', help="结果JSON文件")
+    parser.add_argument('--only', default=None, help=f"逗号分隔的基准名（{', '.join(BENCHMARKS)}）")
+    parser.add_argument('--frames', type=int, default=2000, help="子系统基准的合成帧数")
+    parser.add_argument('--video-frames', type=int, default=600, help="端到端基准的合成视频帧数")
+    parser.add_argument('--objects', type=int, default=8, help="每帧物体数")
+    parser.add_argument('--motion', type=float, default=2.0, help="物体每帧最大移动像素")
+    parser.add_argument('--churn', type=float, default=0.01, help="每帧每个物体被替换的概率")
+    parser.add_argument('--class-mix', default='common', help="类别分布：common、场景ID（如 kitchen）或 cup:3,bowl:1")
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--fps', type=float, default=30.0)
+    parser.add_argument('--render-width', type=int, default=1920, help="预览渲染基准的源帧宽度")
+    parser.add_argument('--render-height', type=int, default=1080, help="预览渲染基准的源帧高度")
+    parser.add_argument('--repeat', type=int, default=3, help="每个基准重复的轮数")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    report = run_benchmarks(args)
+    print_report(report)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
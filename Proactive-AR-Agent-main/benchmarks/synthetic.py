@@ -0,0 +1,139 @@
+# benchmarks/synthetic.py（合成检测流与合成视频，参数可控、按 seed 可复现）
+
+import json
+import random
+from typing import Dict, Any, List, Iterator
+
+import cv2
+import numpy as np
+
+from modules.analysis_config import AnalysisConfig
+
+# 不指定场景时使用的类别（COCO 中常见的室内物体）
+COMMON_CLASSES = ['person', 'cup', 'bowl', 'bottle', 'chair', 'laptop', 'keyboard', 'mouse', 'book',
+                  'cell phone', 'oven', 'refrigerator', 'sink', 'knife', 'spoon', 'tv', 'couch', 'potted plant']
+
+
+def parse_class_mix(class_mix: str, config: AnalysisConfig = None) -> Dict[str, float]:
+    """
+    解析类别分布：
+    - 场景ID（如 kitchen、office）：使用配置中该场景的关键词，等权
+    - "cup:3,bowl:1" 形式：按权重
+    - "common" 或空：COMMON_CLASSES 等权
+    """
+    if not class_mix or class_mix == 'common':
+        return {cls: 1.0 for cls in COMMON_CLASSES}
+    if ':' in class_mix or ',' in class_mix:
+        weights = {}
+        for part in class_mix.split(','):
+            name, _, weight = part.partition(':')
+            weights[name.strip()] = float(weight) if weight else 1.0
+        return weights
+    config = config or AnalysisConfig()
+    keywords = config.current.scene_keywords.get(class_mix)
+    if not keywords:
+        raise ValueError(f"未知的类别分布 {class_mix}（可用场景: {', '.join(config.current.scene_order)}）")
+    return {cls: 1.0 for cls in keywords}
+
+
+class SyntheticScene:
+    def __init__(self, num_objects: int = 8, class_weights: Dict[str, float] = None, motion: float = 2.0,
+                 churn: float = 0.01, width: int = 640, height: int = 480, seed: int = 0):
+        """
+        合成场景：num_objects 个物体在画面中匀速运动（碰到边界反弹），并带少量位置抖动
+        class_weights: 类别 -> 权重
+        motion: 每帧最大移动像素
+        churn: 每帧每个物体被替换为新物体（新类别、新位置）的概率
+        """
+        self.num_objects = num_objects
+        self.class_weights = class_weights or {cls: 1.0 for cls in COMMON_CLASSES}
+        self.motion = motion
+        self.churn = churn
+        self.width = width
+        self.height = height
+        self._random = random.Random(seed)
+        self._classes = list(self.class_weights)
+        self._weights = [self.class_weights[cls] for cls in self._classes]
+        self._next_id = 0
+        self.objects = [self._spawn() for _ in range(num_objects)]
+
+    def _spawn(self) -> Dict[str, Any]:
+        rng = self._random
+        w = rng.uniform(0.05, 0.25) * self.width
+        h = rng.uniform(0.05, 0.25) * self.height
+        self._next_id += 1
+        return {
+            'track_id': self._next_id,
+            'class': rng.choices(self._classes, self._weights)[0],
+            'x': rng.uniform(0, self.width - w),
+            'y': rng.uniform(0, self.height - h),
+            'w': w,
+            'h': h,
+            'vx': rng.uniform(-self.motion, self.motion),
+            'vy': rng.uniform(-self.motion, self.motion),
+            'conf': rng.uniform(0.5, 0.95),
+            'age': 0
+        }
+
+    def step(self) -> List[Dict[str, Any]]:
+        """
+        前进一帧，返回该帧的检测结果（与检测器输出格式相同，另带 track_id 和 age）
+        """
+        rng = self._random
+        detections = []
+        for i, obj in enumerate(self.objects):
+            if rng.random() < self.churn:
+                obj = self.objects[i] = self._spawn()
+            obj['x'] += obj['vx']
+            obj['y'] += obj['vy']
+            if obj['x'] < 0 or obj['x'] + obj['w'] > self.width:
+                obj['vx'] = -obj['vx']
+                obj['x'] = min(max(obj['x'], 0), self.width - obj['w'])
+            if obj['y'] < 0 or obj['y'] + obj['h'] > self.height:
+                obj['vy'] = -obj['vy']
+                obj['y'] = min(max(obj['y'], 0), self.height - obj['h'])
+            obj['age'] += 1
+            jitter = rng.uniform(-1.0, 1.0)
+            detections.append({
+                'class': obj['class'],
+                'bbox': [obj['x'] + jitter, obj['y'] + jitter, obj['x'] + obj['w'] + jitter, obj['y'] + obj['h'] + jitter],
+                'conf': min(0.99, max(0.3, obj['conf'] + rng.uniform(-0.05, 0.05))),
+                'track_id': obj['track_id'],
+                'age': obj['age']
+            })
+        return detections
+
+    def frames(self, count: int) -> Iterator[List[Dict[str, Any]]]:
+        for _ in range(count):
+            yield self.step()
+
+
+def write_synthetic_video(path: str, scene: SyntheticScene, count: int, fps: float = 30.0,
+                          fixture_path: str = None) -> Dict[str, Any]:
+    """
+    生成合成视频（MJPG AVI）：物体画成带类别文字的色块；fixture_path 不为空时同时写出与画面一致的检测流
+    """
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (scene.width, scene.height))
+    if not writer.isOpened():
+        raise IOError(f"无法写入视频: {path}")
+    fixture = open(fixture_path, 'w', encoding='utf-8') if fixture_path else None
+    colors = {}
+    background = np.zeros((scene.height, scene.width, 3), dtype=np.uint8)
+    background[:] = (40, 40, 40)
+    try:
+        for frame_index, detections in enumerate(scene.frames(count)):
+            frame = background.copy()
+            for det in detections:
+                color = colors.setdefault(det['class'], tuple(int(c) for c in np.random.RandomState(
+                    len(colors)).randint(60, 255, 3)))
+                x1, y1, x2, y2 = (int(v) for v in det['bbox'])
+                cv2.rectangle(frame, (x1, y1), (x2, y2), color, -1)
+                cv2.putText(frame, det['class'], (x1 + 2, y1 + 14), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 0), 1)
+            writer.write(frame)
+            if fixture is not None:
+                fixture.write(json.dumps({'frame': frame_index, 'detections': detections}, ensure_ascii=False) + "\n")
+    finally:
+        writer.release()
+        if fixture is not None:
+            fixture.close()
+    return {'path': path, 'frames': count, 'fps': fps, 'size': (scene.width, scene.height)}
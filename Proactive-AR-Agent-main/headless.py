@@ -0,0 +1,305 @@
+# headless.py（无界面批处理：视频 -> 检测/追踪 -> 场景分析 -> LLM调度，结果写入JSONL）
+
+import argparse
+import bisect
+import json
+import os
+import threading
+import time
+
+from modules.analysis_config import AnalysisConfig
+from modules.scene_analyzer import SceneAnalyzer
+from modules.llm_scheduler import ChangeTriggeredScheduler
+from modules.pacing import PacingController, PACING_MAX, PACING_MODES
+from modules.instrumentation import metrics, summarize
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v')
+
+
+def collect_videos(inputs):
+    """
+    展开输入：文件直接使用，目录递归查找视频文件（按路径排序）
+    """
+    videos = []
+    for path in inputs:
+        if os.path.isdir(path):
+            found = []
+            for root, _, files in os.walk(path):
+                found.extend(os.path.join(root, name) for name in files
+                             if name.lower().endswith(VIDEO_EXTENSIONS))
+            videos.extend(sorted(found))
+        elif os.path.isfile(path):
+            videos.append(path)
+        else:
+            print(f"跳过不存在的输入: {path}")
+    return videos
+
+
+def create_detector(tracker, model_path, detections_path=None):
+    if tracker == 'recorded':
+        from modules.recorded_detector import RecordedDetector
+        return RecordedDetector(detections_path)
+    if tracker == 'deepsort':
+        from modules.deep_sort_tracker import DeepSortTracker
+        return DeepSortTracker(model_path)
+    from modules.simple_detector import SimpleDetector
+    return SimpleDetector(model_path)
+
+
+def frame_record(video, video_frame, media_time, structured_data, frame_temporal, temporal_analysis, trigger):
+    """
+    每帧写入JSONL的记录
+    """
+    return {
+        'type': 'frame',
+        'video': video,
+        'frame': video_frame,
+        'time': round(media_time, 3),
+        'scene': structured_data['scene'],
+        'scene_id': structured_data.get('scene_id'),
+        'scene_confidence': round(structured_data['scene_confidence'], 3),
+        'raw_scene': structured_data['raw_scene'],
+        'objects': [
+            {'class': obj['class'], 'confidence': round(obj['confidence'], 3), 'position': obj['relative_position']}
+            for obj in structured_data['objects']
+        ],
+        'changes': frame_temporal['changes'],
+        'change_score': round(temporal_analysis['change_score'], 3),
+        'llm_trigger': trigger
+    }
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        """
+        线程安全的JSONL写入（检测循环和LLM结果回调都会写入）
+        """
+        self._file = open(path, 'w', encoding='utf-8')
+        self._lock = threading.Lock()
+        self.records = 0
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self.records += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def run_headless(args):
+    videos = collect_videos(args.inputs)
+    if not videos:
+        print("没有可处理的视频")
+        return None
+
+    config = AnalysisConfig()
+    if args.metrics or args.metrics_port:
+        metrics.configure({'enabled': True, 'metrics_port': args.metrics_port})
+    detector = create_detector(args.tracker, args.model, args.detections)
+    writer = JsonlWriter(args.output)
+    # 批处理默认不限速（max），也可按视频时钟实时回放或固定速率处理
+    pacer = PacingController(mode=args.pace, fixed_fps=args.fixed_fps)
+    # 解码选项：命令行参数覆盖 video_decode 配置
+    source_options = dict(config.current.video_decode)
+    for key in ('read_ahead', 'max_width', 'sample_every', 'sample_mode', 'seek_threshold'):
+        if getattr(args, key) is not None:
+            source_options[key] = getattr(args, key)
+
+    # 全局帧序号 -> 视频（LLM结果只带全局帧序号）
+    video_starts = []
+    video_names = []
+    llm_results = []
+    pipeline = None
+    if args.llm:
+        from modules.llm_pipeline import LLMPipeline
+
+        def on_result(result):
+            snapshot = result.snapshot
+            index = bisect.bisect_right(video_starts, snapshot.get('frame_idx') or 0) - 1
+            llm_results.append(result)
+            writer.write({
+                'type': 'llm',
+                'video': video_names[index] if index >= 0 else None,
+                'global_frame': snapshot.get('frame_idx'),
+                'task_type': result.request.task_type,
+                'scene': snapshot.get('scene'),
+                'response': result.response,
+                'structured': snapshot.get('structured'),
+                'error': result.error,
+                'latency': round(result.latency, 3),
+                'cached': bool(snapshot.get('cached') or snapshot.get('similar_cached'))
+            })
+
+    detect_times = []
+    analyze_times = []
+    triggers = 0
+    global_frame = 0
+    started = time.perf_counter()
+    try:
+        for video in videos:
+            # 每个视频使用独立的场景状态、时序窗口和调度器
+            scene_analyzer = SceneAnalyzer(config=config)
+            scheduler = ChangeTriggeredScheduler.from_config(
+                config.current.llm_scheduling,
+                threshold=config.current.temporal.get('change_detection_threshold', 0.3)
+            )
+            if args.llm:
+                if pipeline is None:
+                    # 流水线只用场景分析器生成prompt，不依赖逐帧状态，可跨视频共用
+                    pipeline = LLMPipeline.from_config(config, scene_analyzer, use_caches=args.caches,
+                                                       on_result=on_result, verbose=False,
+                                                       max_in_flight=args.concurrency)
+                elif pipeline.context_session is not None:
+                    # 新视频不沿用上一个视频的对话上下文
+                    pipeline.context_session.reset()
+            video_starts.append(global_frame + 1)
+            video_names.append(video)
+
+            previous_scene_data = None
+            processed = 0
+            frames = detector.process_video_frame(video, pacer=pacer, source_options=source_options)
+            while True:
+                detect_start = time.perf_counter()
+                item = next(frames, None)
+                if item is None:
+                    break
+                analyze_start = time.perf_counter()
+                frame_objects, frame_detections, frame = item
+                processed += 1
+                global_frame += 1
+                # 帧号和调度都使用视频时钟（节奏控制器记录源帧序号和帧率），结果与处理速度无关
+                video_frame = pacer.frame_index + 1
+                media_time = pacer.media_time
+
+                frame_height, frame_width = frame.shape[:2]
+                structured_data, frame_temporal, temporal_analysis = scene_analyzer.process_frame(
+                    frame_detections, frame_width, frame_height, previous_scene_data)
+
+                trigger = scheduler.update(temporal_analysis['change_score'], now=media_time)
+                if trigger:
+                    triggers += 1
+                    if pipeline is not None:
+                        pipeline.submit_scene(structured_data, temporal_analysis, global_frame)
+                    previous_scene_data = structured_data
+
+                writer.write(frame_record(video, video_frame, media_time, structured_data,
+                                          frame_temporal, temporal_analysis, trigger))
+                detect_times.append(analyze_start - detect_start)
+                analyze_times.append(time.perf_counter() - analyze_start)
+
+                if args.max_frames and processed >= args.max_frames:
+                    frames.close()
+                    break
+            pacing_info = pacer.get_debug_info()
+            print(f"{video}: {processed} 帧，丢帧 {pacing_info['stats']['dropped']}，"
+                  f"最大延迟 {pacing_info['stats']['max_lag'] * 1000:.0f} ms")
+        elapsed = time.perf_counter() - started
+
+        # 等待进行中的LLM请求完成
+        if pipeline is not None:
+            drain_deadline = time.time() + args.drain
+            while time.time() < drain_deadline:
+                info = pipeline.dispatcher.get_debug_info()
+                if not info['in_flight'] and not info['pending']:
+                    break
+                time.sleep(0.05)
+    finally:
+        if pipeline is not None:
+            pipeline.close()
+        writer.close()
+
+    report = {
+        'videos': len(videos),
+        'frames': global_frame,
+        'elapsed': elapsed,
+        'fps': global_frame / elapsed if elapsed > 0 else 0.0,
+        'detect': summarize(detect_times),
+        'analyze': summarize(analyze_times),
+        'llm_triggers': triggers,
+        'records': writer.records,
+        'stages': metrics.snapshot()
+    }
+    if pipeline is not None:
+        succeeded = [r for r in llm_results if r.error is None]
+        report['llm'] = {
+            'delivered': len(llm_results),
+            'errors': len(llm_results) - len(succeeded),
+            'latency': summarize([r.latency for r in succeeded]),
+            'dispatcher': pipeline.dispatcher.get_debug_info()['stats']
+        }
+    return report
+
+
+def print_report(report):
+    def fmt(stats):
+        if not stats['count']:
+            return "无数据"
+        return (f"平均 {stats['avg'] * 1000:.1f} ms，p50 {stats['p50'] * 1000:.1f} ms，"
+                f"p95 {stats['p95'] * 1000:.1f} ms，最大 {stats['max'] * 1000:.1f} ms")
+
+    print("\n===== 处理结果 =====")
+    print(f"视频 {report['videos']} 个，共 {report['frames']} 帧，耗时 {report['elapsed']:.1f} s，"
+          f"吞吐量 {report['fps']:.1f} 帧/s")
+    print(f"解码+检测: {fmt(report['detect'])}")
+    print(f"场景分析: {fmt(report['analyze'])}")
+    print(f"LLM触发 {report['llm_triggers']} 次，写入 {report['records']} 条记录")
+    for stage, stats in report['stages'].items():
+        print(f"  {stage}: p50 {stats['p50_ms']:.2f} ms，p95 {stats['p95_ms']:.2f} ms，"
+              f"p99 {stats['p99_ms']:.2f} ms（{stats['count']} 次）")
+    if 'llm' in report:
+        llm = report['llm']
+        print(f"LLM交付 {llm['delivered']} 个（错误 {llm['errors']}），端到端耗时: {fmt(llm['latency'])}")
+        print(f"调度统计: {llm['dispatcher']}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="无界面批处理视频场景分析")
+    parser.add_argument('inputs', nargs='+', help="视频文件或目录（目录递归查找视频）")
+    parser.add_argument('-o', '--output', default='results.jsonl', help="JSONL结果文件")
+    parser.add_argument('--tracker', choices=['simple', 'deepsort', 'recorded'], default='simple',
+                        help="检测模式（recorded 回放 --detections 中记录的检测结果）")
+    parser.add_argument('--detections', default=None, help="recorded 模式的检测记录（JSONL）")
+    parser.add_argument('--model', default='yolov8n.pt', help="YOLO 模型路径")
+    parser.add_argument('--pace', choices=PACING_MODES, default=PACING_MAX,
+                        help="读帧节奏：max 不限速，realtime 按视频帧率（落后时丢帧），fixed 固定速率")
+    parser.add_argument('--fixed-fps', type=float, default=15.0, help="fixed 模式下每秒处理的帧数")
+    parser.add_argument('--read-ahead', type=int, default=None, help="解码线程预读帧数（0 表示在检测线程中解码）")
+    parser.add_argument('--max-width', type=int, default=None, help="解码后把帧缩小到的最大宽度")
+    parser.add_argument('--sample-every', type=int, default=None, help="每 N 帧处理一帧（离线扫描）")
+    parser.add_argument('--sample-mode', choices=['grab', 'seek'], default=None,
+                        help="跳帧方式：grab 逐帧跳过，seek 直接定位（间隔较大时更快）")
+    parser.add_argument('--seek-threshold', type=int, default=None,
+                        help="grab 方式下一次跳过的帧数达到该值时改为 seek（0 表示总是 grab）")
+    parser.add_argument('--max-frames', type=int, default=0, help="每个视频最多处理的帧数（0 表示不限）")
+    parser.add_argument('--llm', action='store_true', help="触发时提交到LLM（默认只记录触发点）")
+    parser.add_argument('--concurrency', type=int, default=1, help="同时进行的LLM请求数")
+    parser.add_argument('--caches', action='store_true', help="按配置启用回复缓存和近似场景缓存")
+    parser.add_argument('--drain', type=float, default=60.0, help="处理结束后等待LLM请求的最长时间（秒）")
+    parser.add_argument('--metrics', action='store_true', help="统计各阶段耗时分位数（解码、推理、场景分析、prompt、LLM等）")
+    parser.add_argument('--metrics-port', type=int, default=None, help="在本地该端口提供 /metrics（隐含 --metrics）")
+    parser.add_argument('--json', default=None, help="把处理报告写入JSON文件")
+    return parser
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.tracker == 'recorded' and not args.detections:
+        parser.error("--tracker recorded 需要 --detections")
+
+    report = run_headless(args)
+    if report is None:
+        return
+    print_report(report)
+    print(f"结果已写入 {args.output}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"报告已写入 {args.json}")
+
+
+if __name__ == '__main__':
+    main()
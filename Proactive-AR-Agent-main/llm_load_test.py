@@ -0,0 +1,183 @@
+# llm_load_test.py（LLM链路压测：场景变化 -> LLMPipeline -> Ollama / 本地替身）
+
+import argparse
+import json
+import random
+import threading
+import time
+
+from modules.analysis_config import AnalysisConfig
+from modules.scene_analyzer import SceneAnalyzer
+from modules.llm_agent import OllamaClient
+from modules.llm_pipeline import LLMPipeline
+from modules.mock_ollama import MockOllamaServer
+from modules.instrumentation import summarize
+
+FRAME_WIDTH = 640
+FRAME_HEIGHT = 480
+
+
+def random_detections(rng, cfg):
+    """
+    随机生成一个场景的检测结果：从某个场景的关键词中抽取物体，位置随机
+    """
+    scene_id = rng.choice(cfg.scene_order)
+    keywords = list(cfg.scene_keywords[scene_id])
+    detections = []
+    for cls in rng.sample(keywords, rng.randint(2, min(6, len(keywords)))):
+        for _ in range(rng.randint(1, 2)):
+            x = rng.uniform(0, FRAME_WIDTH - 80)
+            y = rng.uniform(0, FRAME_HEIGHT - 80)
+            detections.append({
+                'class': cls,
+                'conf': rng.uniform(0.7, 0.99),
+                'bbox': [x, y, x + rng.uniform(30, 80), y + rng.uniform(30, 80)]
+            })
+    return detections
+
+
+def run_load_test(args):
+    rng = random.Random(args.seed)
+    config = AnalysisConfig()
+    scene_analyzer = SceneAnalyzer(config=config)
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = MockOllamaServer(
+            tokens_per_second=args.tps, prefill_latency=args.latency, failure_rate=args.failure_rate,
+            think_tokens=args.think_tokens, seed=args.seed
+        ).start()
+        base_url = server.url
+
+    client = OllamaClient(pool_maxsize=max(4, args.concurrency))
+    client.update_settings(config.current.llm_settings)
+    client.base_url = base_url
+    client.stream = not args.no_stream
+
+    results = []
+    results_lock = threading.Lock()
+
+    def on_result(result):
+        with results_lock:
+            results.append(result)
+
+    pipeline = LLMPipeline.from_config(
+        config, scene_analyzer, client=client, use_caches=args.caches,
+        on_result=on_result, verbose=False, max_in_flight=args.concurrency
+    )
+
+    print(f"压测开始：{args.duration:.0f} s，场景变化 {args.change_rate} 次/s，用户提问 {args.user_rate} 次/s，"
+          f"并发 {args.concurrency}，服务 {base_url}")
+
+    started = time.time()
+    next_change = started
+    next_question = started + (1.0 / args.user_rate if args.user_rate > 0 else float('inf'))
+    previous_data = None
+    latest_data = None
+    frame_idx = 0
+    while time.time() - started < args.duration:
+        now = time.time()
+        if now >= next_change:
+            frame_idx += 1
+            structured_data = scene_analyzer.create_structured_data(
+                random_detections(rng, config.current), FRAME_WIDTH, FRAME_HEIGHT)
+            temporal_analysis = scene_analyzer.analyze_temporal_changes(structured_data, previous_data)
+            pipeline.submit_scene(structured_data, temporal_analysis, frame_idx)
+            previous_data = latest_data = structured_data
+            next_change += 1.0 / args.change_rate
+        if now >= next_question:
+            pipeline.submit_question("我接下来应该做什么？", latest_data, frame_idx)
+            next_question += 1.0 / args.user_rate
+        time.sleep(max(0.0, min(next_change, next_question) - time.time()))
+    elapsed = time.time() - started
+
+    # 等待进行中的请求完成
+    drain_deadline = time.time() + args.drain
+    while time.time() < drain_deadline:
+        info = pipeline.dispatcher.get_debug_info()
+        if not info['in_flight'] and not info['pending']:
+            break
+        time.sleep(0.05)
+
+    with results_lock:
+        delivered = list(results)
+    succeeded = [r for r in delivered if r.error is None]
+    report = {
+        'config': {
+            'duration': args.duration,
+            'change_rate': args.change_rate,
+            'user_rate': args.user_rate,
+            'concurrency': args.concurrency,
+            'stream': client.stream,
+            'caches': args.caches,
+            'mock': server is not None
+        },
+        'elapsed': elapsed,
+        'throughput': len(succeeded) / elapsed if elapsed > 0 else 0.0,
+        'dispatcher': pipeline.dispatcher.get_debug_info()['stats'],
+        'latency': summarize([r.latency for r in succeeded]),
+        'queue_delay': summarize([r.request.started_at - r.request.created_at for r in delivered]),
+        'ttft': summarize([r.snapshot['ttft'] for r in succeeded if r.snapshot.get('ttft') is not None]),
+        'latency_by_lane': pipeline.dispatcher.get_latency_stats(),
+        'errors': len(delivered) - len(succeeded)
+    }
+    if server is not None:
+        report['server'] = server.get_stats()
+
+    pipeline.close()
+    if server is not None:
+        server.stop()
+    return report
+
+
+def print_report(report):
+    def fmt(stats):
+        if not stats['count']:
+            return "无数据"
+        return (f"平均 {stats['avg'] * 1000:.0f} ms，p50 {stats['p50'] * 1000:.0f} ms，"
+                f"p95 {stats['p95'] * 1000:.0f} ms，最大 {stats['max'] * 1000:.0f} ms（{stats['count']} 次）")
+
+    stats = report['dispatcher']
+    print("\n===== 压测结果 =====")
+    print(f"吞吐量: {report['throughput']:.2f} 个回复/s（{report['elapsed']:.1f} s）")
+    print(f"端到端耗时: {fmt(report['latency'])}")
+    print(f"排队延迟: {fmt(report['queue_delay'])}")
+    print(f"首个token耗时: {fmt(report['ttft'])}")
+    print(f"提交 {stats['submitted']}，开始 {stats['started']}，交付 {stats['delivered']}，错误 {report['errors']}")
+    print(f"排队被替换 {stats['replaced']}，过期丢弃 {stats['dropped_stale']}，取消 {stats['cancelled']}，"
+          f"抢占 {stats['preempted']}，超时 {stats['expired']}")
+    for lane, lane_stats in report['latency_by_lane'].items():
+        print(f"  {lane}: 平均 {lane_stats['avg']:.2f} s，最大 {lane_stats['max']:.2f} s（{lane_stats['count']} 次）")
+    if 'server' in report:
+        print(f"替身服务: {report['server']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM链路压测")
+    parser.add_argument('--duration', type=float, default=30.0, help="压测时长（秒）")
+    parser.add_argument('--change-rate', type=float, default=2.0, help="每秒场景变化次数")
+    parser.add_argument('--user-rate', type=float, default=0.0, help="每秒用户提问次数")
+    parser.add_argument('--concurrency', type=int, default=1, help="同时进行的LLM请求数")
+    parser.add_argument('--base-url', default=None, help="Ollama 地址，不传时启动本地替身服务")
+    parser.add_argument('--no-stream', action='store_true', help="使用非流式生成")
+    parser.add_argument('--caches', action='store_true', help="按配置启用回复缓存和近似场景缓存")
+    parser.add_argument('--tps', type=float, default=40.0, help="替身服务每秒生成的token数")
+    parser.add_argument('--latency', type=float, default=0.2, help="替身服务首个token前的延迟（秒）")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="替身服务请求失败概率")
+    parser.add_argument('--think-tokens', type=int, default=0, help="替身服务输出的思考过程token数")
+    parser.add_argument('--drain', type=float, default=30.0, help="结束后等待进行中请求的最长时间（秒）")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', default=None, help="把结果写入JSON文件")
+    args = parser.parse_args()
+
+    report = run_load_test(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,210 +1,250 @@
 # main.py（集成场景分析器 + 结构化语义化输入）
 
+import queue
 import threading
 import tkinter as tk
 from tkinter import scrolledtext
-from PIL import Image, ImageTk
-import cv2
-import time
 import json
+import logging
 from modules.simple_detector import SimpleDetector
+from modules.analysis_config import AnalysisConfig
 from modules.scene_analyzer import SceneAnalyzer
-from modules.summarizer import update_window, get_attention_summary
-from modules.llm_agent import query_ollama
+from modules.summarizer import RollingAggregator, get_attention_summary
+from modules.llm_pipeline import LLMPipeline, format_snapshot_tag, format_structured_text
+from modules.llm_scheduler import ChangeTriggeredScheduler
+from modules.voice_input import get_user_input
+from modules.frame_mailbox import FrameMailbox
+from modules.preview_renderer import PreviewRenderer
+from modules.pacing import PacingController
+from modules.logging_setup import LogManager, get_logger
+from modules.instrumentation import metrics
 
-# 修改为基于时间的间隔
-LLM_INTERVAL_SECONDS = 5  # 每5秒调用一次LLM
-object_window = []
+# 最近 1 s / 10 s / 60 s 的物体类别计数（环形缓冲区增量维护）
+object_window = RollingAggregator()
 frame_idx = 0
 current_summary = ""
 llm_output = "尚未生成"
-last_llm_time = 0  # 记录上次LLM调用的时间
+
+# 加载分析配置（监视配置文件，修改后无需重启即可生效）
+analysis_config = AnalysisConfig(watch=True)
+
+# 日志层：格式化和写出在后台线程，逐帧日志按类别限速（见 logging 配置）
+log_manager = LogManager.from_config(analysis_config.current.logging)
+analysis_config.add_listener(lambda cfg: log_manager.reconfigure(cfg.logging))
+frame_logger = get_logger('frame')
+frame_detail_logger = get_logger('frame.detail')
+question_logger = get_logger('question')
+
+# 分阶段耗时统计（默认关闭，开启后可从本地 /metrics 读取各阶段 p50/p95/p99）
+metrics.configure(analysis_config.current.instrumentation)
+analysis_config.add_listener(lambda cfg: metrics.configure(cfg.instrumentation))
 
 # 初始化检测器和场景分析器
 simple_detector = SimpleDetector()
-scene_analyzer = SceneAnalyzer()
+scene_analyzer = SceneAnalyzer(config=analysis_config)
+
+# 变化触发的LLM调度：变化分数超过 change_detection_threshold 后去抖触发，受最小/最大间隔约束
+llm_scheduler = ChangeTriggeredScheduler.from_config(
+    analysis_config.current.llm_scheduling,
+    threshold=analysis_config.current.temporal.get('change_detection_threshold', 0.3)
+)
+analysis_config.add_listener(lambda cfg: llm_scheduler.reconfigure(
+    cfg.llm_scheduling, cfg.temporal.get('change_detection_threshold', 0.3)))
+
+# 按视频时钟控制读帧节奏（realtime / max / fixed，见 pacing 配置）
+pacer = PacingController.from_config(analysis_config.current.pacing)
+analysis_config.add_listener(lambda cfg: pacer.reconfigure(cfg.pacing))
+
+# 流式输出：工作线程把增量文本放入队列，由Tk主循环取出写入 llm_text
+llm_stream_queue = queue.Queue()
+LLM_STREAM_POLL_MS = 50
+# 预览画面：检测线程投递最新帧，界面线程约每 33 ms（30 fps）取一次
+frame_mailbox = FrameMailbox()
+PREVIEW_REFRESH_MS = 33
+preview_renderer = PreviewRenderer(480, 360)
+
+# AR叠加层最多显示的建议条数
+MAX_OVERLAY_SUGGESTIONS = 4
+overlay_suggestions = []
 
 # 存储历史数据用于时序分析
 previous_scene_data = None
+# 最新一帧的结构化数据（用户提问时作为场景信息）
+latest_scene_data = None
 
 video_path = "Proactive-AR-Agent-main/test.mp4"  # 修正视频路径
 
 def update_gui():
     summary_text.delete(1.0, tk.END)
     summary_text.insert(tk.END, current_summary or "（暂未识别到目标）")
-    llm_text.delete(1.0, tk.END)
-    llm_text.insert(tk.END, llm_output or "（尚无回复）")
+    pacing_info = pacer.get_debug_info()
+    summary_text.insert(tk.END, f"\n播放节奏: {pacing_info['mode']}，延迟 {pacer.lag * 1000:.0f} ms，"
+                                f"丢帧 {pacing_info['stats']['dropped']}")
     window.after(1000, update_gui)
 
-def llm_worker(prompt, task_type="scene_analysis"):
-    global llm_output
+def poll_llm_stream():
+    """
+    在Tk主循环中取出LLM增量输出并写入 llm_text
+    """
     try:
-        # 根据任务类型添加不同的系统提示
-        if task_type == "cooking_assistant":
-            system_prompt = "你是专业的烹饪助手，擅长分析厨房场景并给出烹饪建议。"
-        elif task_type == "activity_prediction":
-            system_prompt = "你是智能行为预测助手，能够根据环境物体推测用户活动。"
-        else:
-            system_prompt = "你是智能环境分析助手，能够分析场景并给出合理建议。"
-        
-        full_prompt = f"{system_prompt}\n\n{prompt}"
-        llm_output = query_ollama(full_prompt)
-    except Exception as e:
-        llm_output = f"LLM调用失败: {str(e)}"
+        while True:
+            kind, text = llm_stream_queue.get_nowait()
+            if kind == 'suggestion':
+                # 结构化输出中的建议一完整就显示在画面上
+                if len(overlay_suggestions) < MAX_OVERLAY_SUGGESTIONS:
+                    overlay_suggestions.append(text)
+                    draw_overlay()
+                continue
+            if kind == 'reset':
+                llm_text.delete(1.0, tk.END)
+                overlay_suggestions.clear()
+                draw_overlay()
+            llm_text.insert(tk.END, text)
+            llm_text.see(tk.END)
+    except queue.Empty:
+        pass
+    window.after(LLM_STREAM_POLL_MS, poll_llm_stream)
+
+def refresh_preview():
+    """
+    在Tk主循环中按显示刷新率取出最新一帧，原地更新同一个画布图像项；
+    两次刷新之间到达的多帧只显示最新的一帧
+    """
+    latest = frame_mailbox.take()
+    if latest is not None:
+        frame, meta = latest
+        preview_renderer.render(frame, meta['detections'])
+        # PhotoImage 原地更新，图像项只需在首次绑定
+        canvas.itemconfigure(preview_item, image=preview_renderer.photo())
+    window.after(PREVIEW_REFRESH_MS, refresh_preview)
+
+def draw_overlay():
+    """
+    在预览画面左下角绘制AR建议叠加层
+    """
+    canvas.delete('overlay')
+    for i, suggestion in enumerate(reversed(overlay_suggestions)):
+        y = 350 - i * 22
+        canvas.create_rectangle(6, y - 18, 474, y + 2, fill='black', stipple='gray50', outline='', tags='overlay')
+        canvas.create_text(12, y - 8, text=f"• {suggestion}", anchor=tk.W, fill='yellow', tags='overlay')
+
+def on_llm_result(result):
+    """
+    调度器交付的结果（已过滤过期和被取消的回复），标注其对应的场景快照
+    """
+    global llm_output
+    if result.error is not None:
+        llm_output = f"LLM调用失败: {result.error}"
+    elif result.snapshot.get('structured'):
+        llm_output = format_structured_text(result.snapshot['structured'])
+    else:
+        llm_output = result.response
+    llm_stream_queue.put(('reset', format_snapshot_tag(result.snapshot) + (llm_output or "（尚无回复）")))
+    structured = result.snapshot.get('structured') or {}
+    data = structured.get('structured_data') if isinstance(structured.get('structured_data'), dict) else structured
+    if isinstance(data.get('suggestions'), list):
+        for suggestion in data['suggestions']:
+            llm_stream_queue.put(('suggestion', str(suggestion)))
+    llm_pipeline.print_stats(result)
+
+# LLM请求链路：调度器、缓存、上下文复用和 Ollama 客户端均按配置创建
+llm_pipeline = LLMPipeline.from_config(
+    analysis_config, scene_analyzer,
+    on_stream=lambda kind, text: llm_stream_queue.put((kind, text)),
+    on_result=on_llm_result
+)
+
+def submit_user_query():
+    """
+    读取用户的语音提问，结合最新场景以用户优先级提交（在后台线程中调用，语音输入可能阻塞）
+    """
+    question = get_user_input()
+    if not question:
+        return
+    request = llm_pipeline.submit_question(question, latest_scene_data, frame_idx)
+    question_logger.info("#%d %s（通道 %s，优先级 %d）", request.seq, question, request.lane, request.priority)
+
+def on_ask_clicked():
+    threading.Thread(target=submit_user_query, daemon=True).start()
 
 def run_detection():
-    global frame_idx, current_summary, last_llm_time, previous_scene_data
+    global frame_idx, current_summary, previous_scene_data, latest_scene_data
     
-    print("run_detection 线程已启动")
+    frame_logger.info("run_detection 线程已启动，读取视频帧...")
     
-    # 使用简单检测器处理视频
-    print("读取视频帧...")
-    for frame_objects, frame_detections, frame in simple_detector.process_video_frame(video_path):
+    for frame_objects, frame_detections, frame in simple_detector.process_video_frame(
+            video_path, pacer=pacer, source_options=analysis_config.current.video_decode):
         frame_idx += 1
         
         # 获取帧尺寸
         frame_height, frame_width = frame.shape[:2]
         
-        # 使用场景分析器处理检测结果
-        structured_data = scene_analyzer.create_structured_data(frame_detections, frame_width, frame_height)
-        
-        # 分析时序变化
-        temporal_analysis = scene_analyzer.analyze_temporal_changes(structured_data, previous_scene_data)
-        
-        # 实时输出结构化检测结果
-        print(f"\n[帧 {frame_idx}] 场景分析结果:")
-        print(f"  场景: {structured_data['scene']}")
-        print(f"  检测到 {structured_data['total_objects']} 个物体:")
-        
-        for obj in structured_data['objects']:
-            print(f"    - {obj['class']}: 置信度{obj['confidence']:.2f}, 位置{obj['relative_position']}")
+        # 使用场景分析器处理检测结果：结构化数据、场景平滑、逐帧时序变化，以及相对上次LLM调用时的时序变化
+        structured_data, frame_temporal, temporal_analysis = scene_analyzer.process_frame(
+            frame_detections, frame_width, frame_height, previous_scene_data)
         
-        if structured_data['groups']:
-            print(f"  物体分组:")
-            for group_name, group_objects in structured_data['groups'].items():
-                group_names = {
-                    'cooking_tools': '烹饪工具',
-                    'food_items': '食材',
-                    'furniture': '家具',
-                    'electronics': '电子设备',
-                    'appliances': '家用电器',
-                    'personal_items': '个人物品'
-                }
-                print(f"    - {group_names.get(group_name, group_name)}: {', '.join(group_objects)}")
+        # 每帧摘要按类别限速输出；逐帧详情（物体、分组）只在开启 frame_detail 时生成
+        frame_logger.info("帧 %d 场景 %s（置信度%.2f）%d 个物体，变化分数 %.2f",
+                          frame_idx, structured_data['scene'], structured_data['scene_confidence'],
+                          structured_data['total_objects'], frame_temporal['scores']['overall'],
+                          extra={'data': {'frame': frame_idx, 'scene': structured_data['scene'],
+                                          'scene_confidence': structured_data['scene_confidence'],
+                                          'total_objects': structured_data['total_objects'],
+                                          'change_score': frame_temporal['scores']['overall']}})
+        if frame_detail_logger.isEnabledFor(logging.DEBUG):
+            group_names = analysis_config.current.group_names
+            frame_detail_logger.debug("帧 %d 详情", frame_idx, extra={'data': {
+                'frame': frame_idx,
+                'scene': structured_data['scene'],
+                'raw_scene': structured_data['raw_scene'],
+                'objects': [{'class': obj['class'], 'confidence': round(obj['confidence'], 2),
+                             'position': obj['relative_position']} for obj in structured_data['objects']],
+                'groups': {group_names.get(name, name): objects for name, objects in structured_data['groups'].items()},
+                'changes': frame_temporal['changes']
+            }})
         
-        print(f"  时序变化: {temporal_analysis['changes']}")
+        # 多时间窗口滚动计数（按视频时间）
+        object_window.update(frame_objects, pacer.media_time)
         
-        # 保持原有的窗口更新逻辑（用于兼容）
-        update_window(object_window, frame_objects)
+        # 把帧投递到信箱，由界面线程按显示刷新率取走并绘制（检测线程不做任何界面操作）
+        frame_mailbox.put(frame, {'detections': frame_detections, 'frame_idx': frame_idx})
         
-        # 显示视频帧
-        img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        latest_scene_data = structured_data
         
-        # 在帧上绘制检测框和检测信息
-        for detection in frame_detections:
-            bbox = detection['bbox']  # [x1, y1, x2, y2]
-            class_name = detection['class']
-            detection_id = detection.get('detection_id', 'N/A')
-            conf = detection.get('conf', 0.0)
-            
-            # 安全处理conf值
-            if conf is None:
-                conf = 0.0
-            
-            # 计算边界框中心点坐标
-            center_x = (bbox[0] + bbox[2]) / 2
-            center_y = (bbox[1] + bbox[3]) / 2
-            
-            # 计算相对位置（百分比）
-            relative_x = (center_x / frame_width) * 100
-            relative_y = (center_y / frame_height) * 100
-            
-            # 确定位置描述
-            if relative_x < 33:
-                x_position = "左"
-            elif relative_x < 66:
-                x_position = "中"
-            else:
-                x_position = "右"
-                
-            if relative_y < 33:
-                y_position = "上"
-            elif relative_y < 66:
-                y_position = "中"
-            else:
-                y_position = "下"
-            
-            # 绘制边界框
-            x1, y1, x2, y2 = int(bbox[0]), int(bbox[1]), int(bbox[2]), int(bbox[3])
-            cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            
-            # 绘制标签（包含位置信息）
-            label = f"{class_name} {x_position}{y_position} ({conf:.2f})"
-            label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
-            cv2.rectangle(img, (x1, y1 - label_size[1] - 10), (x1 + label_size[0], y1), (0, 255, 0), -1)
-            cv2.putText(img, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
-        
-        img = cv2.resize(img, (480, 360))  # 放大预览画面
-        img_pil = Image.fromarray(img)
-        img_tk = ImageTk.PhotoImage(img_pil)
-        canvas.create_image(0, 0, anchor=tk.NW, image=img_tk)
-        canvas.image = img_tk
-        
-        # 基于时间间隔调用LLM（每5秒）
-        current_time = time.time()
-        if current_time - last_llm_time >= LLM_INTERVAL_SECONDS:
+        # 场景变化分数超过阈值（去抖）或超过最大间隔时调用LLM
+        if llm_scheduler.update(temporal_analysis['change_score']):
             # 使用场景分析器的结构化数据
             current_summary = f"场景: {structured_data['scene']}, 检测到 {structured_data['total_objects']} 个物体"
             
-            if structured_data['objects']:  # 如果有检测到目标
-                # 根据场景类型选择不同的任务类型
-                scene = structured_data['scene']
-                if '厨房' in scene:
-                    task_type = 'cooking_assistant'
-                elif '办公室' in scene:
-                    task_type = 'activity_prediction'
-                else:
-                    task_type = 'scene_analysis'
-                
-                # 创建语义化prompt
-                semantic_prompt = scene_analyzer.create_semantic_prompt(structured_data, task_type)
-                
-                # 添加时序变化信息
-                if temporal_analysis['changes'] != '首次检测':
-                    semantic_prompt += f"\n\n[时序变化]：{temporal_analysis['changes']}"
-                
-                # 启动LLM分析线程
-                threading.Thread(target=llm_worker, args=(semantic_prompt, task_type), daemon=True).start()
-            
-            last_llm_time = current_time  # 更新上次LLM调用时间
+            # 提交到该场景任务的周期性通道（无物体时不提交）
+            llm_pipeline.submit_scene(structured_data, temporal_analysis, frame_idx)
             
             # 保存当前数据用于下次时序分析
             previous_scene_data = structured_data
-            
-        time.sleep(0.01)
-
-    print("视频读取结束或失败")
 
-# 保持原有的窗口更新函数（用于兼容）
-def update_window(object_window, frame_objects):
-    if len(object_window) >= 60:
-        object_window.pop(0)
-    object_window.append(frame_objects)
+    frame_logger.info("视频读取结束或失败")
 
 window = tk.Tk()
 window.title("智能场景分析系统 - 结构化语义化输入版")
 window.geometry("800x600")
 canvas = tk.Canvas(window, width=480, height=360, bg="black")
 canvas.pack(padx=10, pady=5, anchor=tk.NW)
+# 唯一的预览图像项，每次刷新原地替换图像
+preview_item = canvas.create_image(0, 0, anchor=tk.NW)
 summary_label = tk.Label(window, text="场景分析摘要:")
 summary_label.pack()
 summary_text = scrolledtext.ScrolledText(window, height=5)
 summary_text.pack(fill=tk.X, padx=10)
 llm_label = tk.Label(window, text="LLM 智能分析:")
 llm_label.pack()
+ask_button = tk.Button(window, text="语音提问", command=on_ask_clicked)
+ask_button.pack()
 llm_text = scrolledtext.ScrolledText(window, height=10)
 llm_text.pack(fill=tk.BOTH, expand=True, padx=10)
 detector_thread = threading.Thread(target=run_detection, daemon=True)
 detector_thread.start()
+llm_text.insert(tk.END, llm_output)
 update_gui()
+poll_llm_stream()
+refresh_preview()
 window.mainloop()
@@ -0,0 +1,317 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, Callable, Optional
+
+from modules.logging_setup import get_logger
+
+# 默认配置文件路径
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'analysis_config.json')
+
+logger = get_logger('config')
+
+# 配置文件缺失或缺少某个配置块时使用的内置默认值
+DEFAULT_CONFIG = {
+    'task_types': {
+        'scene_analysis': {
+            'system_prompt': '你是智能环境分析助手，能够分析场景并给出合理建议。',
+            'confidence_threshold': 0.6,
+            'output_format': 'text'
+        },
+        'cooking_assistant': {
+            'system_prompt': '你是专业的烹饪助手，擅长分析厨房场景并给出烹饪建议。',
+            'confidence_threshold': 0.7,
+            'output_format': 'text'
+        },
+        'activity_prediction': {
+            'system_prompt': '你是智能行为预测助手，能够根据环境物体推测用户活动。',
+            'confidence_threshold': 0.6,
+            'output_format': 'text'
+        }
+    },
+    'scene_mapping': {
+        'kitchen': {'keywords': ['oven', 'microwave', 'toaster', 'sink', 'refrigerator', 'fork', 'knife', 'spoon', 'bowl', 'cup', 'wine glass'], 'default_task': 'cooking_assistant'},
+        'living_room': {'keywords': ['tv', 'couch', 'chair', 'coffee table', 'remote', 'laptop'], 'default_task': 'scene_analysis'},
+        'bedroom': {'keywords': ['bed', 'chair', 'tv', 'laptop'], 'default_task': 'scene_analysis'},
+        'office': {'keywords': ['laptop', 'keyboard', 'mouse', 'chair', 'desk'], 'default_task': 'activity_prediction'},
+        'bathroom': {'keywords': ['toilet', 'sink', 'toothbrush', 'hair drier'], 'default_task': 'scene_analysis'},
+        'outdoor': {'keywords': ['car', 'bicycle', 'motorcycle', 'bus', 'train', 'truck', 'traffic light', 'fire hydrant', 'stop sign'], 'default_task': 'scene_analysis'}
+    },
+    'scene_names': {
+        'kitchen': '厨房',
+        'living_room': '客厅',
+        'bedroom': '卧室',
+        'office': '办公室',
+        'bathroom': '浴室',
+        'outdoor': '户外'
+    },
+    'functional_groups': {
+        'cooking_tools': ['fork', 'knife', 'spoon', 'bowl', 'cup', 'wine glass', 'oven', 'microwave', 'toaster', 'sink'],
+        'food_items': ['banana', 'apple', 'sandwich', 'orange', 'broccoli', 'carrot', 'hot dog', 'pizza', 'donut', 'cake'],
+        'furniture': ['chair', 'couch', 'bed', 'dining table', 'toilet'],
+        'electronics': ['tv', 'laptop', 'mouse', 'remote', 'keyboard', 'cell phone'],
+        'appliances': ['microwave', 'oven', 'toaster', 'sink', 'refrigerator'],
+        'personal_items': ['backpack', 'umbrella', 'handbag', 'tie', 'suitcase', 'toothbrush', 'hair drier']
+    },
+    'group_names': {
+        'cooking_tools': '烹饪工具',
+        'food_items': '食材',
+        'furniture': '家具',
+        'electronics': '电子设备',
+        'appliances': '家用电器',
+        'personal_items': '个人物品'
+    },
+    'scene_smoothing': {
+        'decay': 0.8,
+        'switch_margin': 0.15,
+        'min_dwell_frames': 5,
+        'min_confidence': 0.05
+    },
+    'temporal_analysis': {
+        'enabled': True,
+        'max_history_frames': 10,
+        'change_detection_threshold': 0.3,
+        'position_change_threshold': 0.1,
+        'significant_changes': ['object_appearance', 'object_disappearance', 'position_change']
+    },
+    'llm_settings': {
+        'model': 'deepseek-r1:1.5b'
+    }
+}
+
+UNKNOWN_SCENE_NAME = '未知场景'
+DEFAULT_TASK_TYPE = 'scene_analysis'
+
+
+class CompiledConfig:
+    def __init__(self, raw: Dict[str, Any], version: int = 0):
+        """
+        编译后的分析配置：把 analysis_config.json 展开为按物体类别直接查询的表
+        实例创建后不再修改，热加载时整体替换
+        """
+        self.raw = raw
+        self.version = version
+        self.loaded_at = time.time()
+
+        scene_mapping = raw.get('scene_mapping') or DEFAULT_CONFIG['scene_mapping']
+        functional_groups = raw.get('functional_groups') or DEFAULT_CONFIG['functional_groups']
+        task_types = raw.get('task_types') or DEFAULT_CONFIG['task_types']
+
+        # 场景表：保留配置中的顺序，用于得分相同时的取舍
+        self.scene_order = tuple(scene_mapping)
+        self.scene_keywords = {scene: tuple(entry.get('keywords', [])) for scene, entry in scene_mapping.items()}
+        self.scene_names = dict(raw.get('scene_names') or DEFAULT_CONFIG['scene_names'])
+        self.scene_ids = {name: scene for scene, name in self.scene_names.items()}
+        self.scene_default_task = {
+            scene: entry.get('default_task', DEFAULT_TASK_TYPE) for scene, entry in scene_mapping.items()
+        }
+        # 场景 -> {物体类别: 优先级}，数值越小越优先
+        self.priority_rank = {
+            scene: {cls: rank for rank, cls in enumerate(entry.get('priority_objects', []))}
+            for scene, entry in scene_mapping.items()
+        }
+
+        # 物体类别 -> 投票的场景
+        class_scenes = {}
+        for scene in self.scene_order:
+            for cls in self.scene_keywords[scene]:
+                class_scenes.setdefault(cls, []).append(scene)
+        self.class_scenes = {cls: tuple(scenes) for cls, scenes in class_scenes.items()}
+
+        # 物体类别 -> 所属功能分组
+        self.group_order = tuple(functional_groups)
+        self.group_members = {group: tuple(objects) for group, objects in functional_groups.items()}
+        class_groups = {}
+        for group in self.group_order:
+            for cls in self.group_members[group]:
+                class_groups.setdefault(cls, []).append(group)
+        self.class_groups = {cls: tuple(groups) for cls, groups in class_groups.items()}
+        self.group_names = dict(raw.get('group_names') or DEFAULT_CONFIG['group_names'])
+
+        # 任务表
+        self.task_types = {task: dict(entry) for task, entry in task_types.items()}
+        self.task_system_prompt = {task: entry.get('system_prompt', '') for task, entry in task_types.items()}
+        self.task_threshold = {task: entry.get('confidence_threshold', 0.6) for task, entry in task_types.items()}
+        self.task_output_format = {task: entry.get('output_format', 'text') for task, entry in task_types.items()}
+        self.task_generation = {task: dict(entry.get('generation') or {}) for task, entry in task_types.items()}
+
+        self.default_confidence_threshold = self.task_threshold.get(DEFAULT_TASK_TYPE, 0.6)
+        self.temporal = dict(raw.get('temporal_analysis') or DEFAULT_CONFIG['temporal_analysis'])
+        self.scene_smoothing = dict(raw.get('scene_smoothing') or DEFAULT_CONFIG['scene_smoothing'])
+        self.llm_settings = dict(raw.get('llm_settings') or DEFAULT_CONFIG['llm_settings'])
+        self.response_cache = dict(raw.get('response_cache') or {})
+        self.similarity_cache = dict(raw.get('similarity_cache') or {})
+        self.llm_scheduling = dict(raw.get('llm_scheduling') or {})
+        self.pacing = dict(raw.get('pacing') or {})
+        self.video_decode = dict(raw.get('video_decode') or {})
+        self.logging = dict(raw.get('logging') or {})
+        self.instrumentation = dict(raw.get('instrumentation') or {})
+        self.output_formats = dict(raw.get('output_formats') or {})
+
+    def get_system_prompt(self, task_type: str) -> str:
+        """
+        获取任务的系统提示，未知任务回退到通用场景分析
+        """
+        prompt = self.task_system_prompt.get(task_type)
+        if prompt is None:
+            prompt = self.task_system_prompt.get(DEFAULT_TASK_TYPE, '')
+        return prompt
+
+    def get_generation(self, task_type: str) -> Dict[str, Any]:
+        """
+        获取任务的生成预算（max_tokens、temperature、stop、max_answer_chars 等），未知任务回退到通用场景分析
+        """
+        generation = self.task_generation.get(task_type)
+        if generation is None:
+            generation = self.task_generation.get(DEFAULT_TASK_TYPE, {})
+        return generation
+
+    def get_output_template(self, task_type: str) -> Optional[Dict[str, Any]]:
+        """
+        获取任务的JSON输出模板；output_format 为 text 或未定义模板时返回 None
+        hybrid 模板中的 structured_data 展开为 structured_json 的模板
+        """
+        output_format = self.task_output_format.get(task_type, 'text')
+        template = (self.output_formats.get(output_format) or {}).get('template')
+        if not isinstance(template, dict):
+            return None
+        structured = (self.output_formats.get('structured_json') or {}).get('template')
+        if output_format == 'hybrid' and isinstance(structured, dict) and 'structured_data' in template:
+            template = dict(template, structured_data=structured)
+        return template
+
+    def get_default_task(self, scene_id: str) -> str:
+        """
+        获取场景对应的默认任务类型
+        """
+        return self.scene_default_task.get(scene_id, DEFAULT_TASK_TYPE)
+
+    def get_scene_name(self, scene_id: str) -> str:
+        """
+        获取场景的中文名
+        """
+        if scene_id is None:
+            return UNKNOWN_SCENE_NAME
+        return self.scene_names.get(scene_id, UNKNOWN_SCENE_NAME)
+
+
+def load_config_file(config_path: str) -> Dict[str, Any]:
+    """
+    读取配置文件，文件不存在时返回内置默认配置
+    """
+    if not config_path or not os.path.exists(config_path):
+        return DEFAULT_CONFIG
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class AnalysisConfig:
+    def __init__(self, config_path: str = DEFAULT_CONFIG_PATH, watch: bool = False, poll_interval: float = 1.0):
+        """
+        分析配置管理器：加载并编译配置文件，可选地监视文件变化并热加载
+        config_path: 配置文件路径
+        watch: 是否启动后台线程监视文件变化
+        poll_interval: 文件检查间隔（秒）
+        """
+        self.config_path = config_path
+        self.poll_interval = poll_interval
+        self.listeners = []
+        self.reload_count = 0
+        self.last_error = None
+
+        self._version = 0
+        self._mtime = self._stat()
+        # 读取方每次取一次 self.current 即得到完整一致的快照；替换是单次属性赋值
+        self.current = CompiledConfig(load_config_file(config_path), self._version)
+
+        self._stop_event = threading.Event()
+        self._watch_thread = None
+        if watch:
+            self.start_watching()
+
+    def _stat(self):
+        """
+        获取文件的修改标记（mtime, size），文件不存在时返回 None
+        """
+        try:
+            st = os.stat(self.config_path)
+            return (st.st_mtime_ns, st.st_size)
+        except (OSError, TypeError):
+            return None
+
+    def reload(self) -> bool:
+        """
+        重新加载并编译配置，成功后原子替换当前配置；失败时保留旧配置
+        """
+        try:
+            raw = load_config_file(self.config_path)
+            compiled = CompiledConfig(raw, self._version + 1)
+        except Exception as e:
+            self.last_error = str(e)
+            logger.warning("配置加载失败，继续使用旧配置: %s", e)
+            return False
+
+        self._version += 1
+        self.current = compiled
+        self.reload_count += 1
+        self.last_error = None
+        logger.info("配置已重新加载 (版本 %d): %s", compiled.version, self.config_path)
+
+        for callback in list(self.listeners):
+            try:
+                callback(compiled)
+            except Exception as e:
+                logger.exception("配置监听回调失败: %s", e)
+        return True
+
+    def check_for_changes(self) -> bool:
+        """
+        检查配置文件是否变化，变化时重新加载
+        """
+        mtime = self._stat()
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        return self.reload()
+
+    def add_listener(self, callback: Callable[[CompiledConfig], None]):
+        """
+        注册配置重新加载后的回调（在监视线程中执行）
+        """
+        self.listeners.append(callback)
+
+    def start_watching(self):
+        """
+        启动文件监视线程
+        """
+        if self._watch_thread is not None and self._watch_thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._watch_thread = threading.Thread(target=self._watch_loop, daemon=True)
+        self._watch_thread.start()
+
+    def stop_watching(self):
+        """
+        停止文件监视线程
+        """
+        self._stop_event.set()
+        if self._watch_thread is not None:
+            self._watch_thread.join(timeout=self.poll_interval + 1.0)
+            self._watch_thread = None
+
+    def _watch_loop(self):
+        while not self._stop_event.wait(self.poll_interval):
+            self.check_for_changes()
+
+    def get_debug_info(self) -> Dict[str, Any]:
+        """
+        获取调试信息
+        """
+        return {
+            'config_path': self.config_path,
+            'version': self.current.version,
+            'reload_count': self.reload_count,
+            'watching': self._watch_thread is not None and self._watch_thread.is_alive(),
+            'last_error': self.last_error
+        }
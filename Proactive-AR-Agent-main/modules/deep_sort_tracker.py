@@ -1,8 +1,9 @@
-import cv2
 import numpy as np
 from ultralytics import YOLO
 from deep_sort_realtime import deepsort_tracker
 import time
+from modules.frame_source import FrameSource
+from modules.instrumentation import metrics, STAGE_INFERENCE, STAGE_POSTPROCESS, STAGE_TRACKING
 
 class DeepSortTracker:
     def __init__(self, model_path="yolov8n.pt"):
@@ -49,35 +50,37 @@ class DeepSortTracker:
         self.tracked_objects = []
         self.frame_count = 0
         
-    def process_video_frame(self, video_path):
+    def process_video_frame(self, video_path, pacer=None, source_options=None):
         """
         处理视频帧并返回追踪结果
+        pacer: 可选的 PacingController，按视频时钟控制读帧节奏（落后时跳帧，跳过的帧只 grab 不做颜色转换，间隔大时直接 seek）
+        source_options: 解码选项（见 video_decode 配置：预读线程、解码时缩小、每N帧采样）
         """
-        cap = cv2.VideoCapture(video_path)
+        source = FrameSource.from_options(video_path, source_options, pacer=pacer)
         
         # 检查视频文件是否能正确打开
-        if not cap.isOpened():
+        if not source.open():
             print(f"错误：无法打开视频文件: {video_path}")
             print(f"请检查文件是否存在且格式正确")
             return
         
         print(f"成功打开视频文件: {video_path}")
         print(f"视频信息：")
-        print(f"  宽度: {int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))}")
-        print(f"  高度: {int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))}")
-        print(f"  总帧数: {int(cap.get(cv2.CAP_PROP_FRAME_COUNT))}")
-        print(f"  FPS: {cap.get(cv2.CAP_PROP_FPS):.2f}")
+        print(f"  宽度: {source.width}")
+        print(f"  高度: {source.height}")
+        print(f"  总帧数: {source.total_frames}")
+        print(f"  FPS: {source.fps:.2f}")
+        if source.output_size != (source.width, source.height):
+            print(f"  解码后缩小为: {source.output_size[0]}x{source.output_size[1]}")
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                print("视频读取结束或失败")
-                break
-                
+        for frame_index, timestamp, frame in source:
             self.frame_count += 1
             
             # YOLO 检测
+            start = metrics.start()
             results = self.yolo_model(frame, verbose=False)
+            metrics.stop(STAGE_INFERENCE, start)
+            start = metrics.start()
             
             # 准备检测结果
             detections = []
@@ -96,8 +99,10 @@ class DeepSortTracker:
                         if cls_name in self.target_classes:
                             detections.append((bbox, conf, cls_name))
                             frame_objects.append(cls_name)
+            metrics.stop(STAGE_POSTPROCESS, start)
             
             # Deep SORT 追踪
+            start = metrics.start()
             tracks = self.tracker.update_tracks(detections, frame=frame)
             
             # 处理追踪结果
@@ -120,10 +125,11 @@ class DeepSortTracker:
             
             # 更新追踪对象列表
             self._update_tracked_objects(tracked_detections)
+            metrics.stop(STAGE_TRACKING, start)
             
             yield frame_objects, tracked_detections, frame
             
-        cap.release()
+        print("视频读取结束或失败")
     
     def _update_tracked_objects(self, new_tracks):
         """
@@ -197,5 +203,6 @@ class DeepSortTracker:
                     'conf': obj['conf']
                 }
                 for obj in self.tracked_objects
-            ]
+            ],
+            'latency': metrics.snapshot([STAGE_INFERENCE, STAGE_POSTPROCESS, STAGE_TRACKING])
         } 
\ No newline at end of file
@@ -0,0 +1,62 @@
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+
+
+class FrameMailbox:
+    def __init__(self):
+        """
+        最新帧信箱：检测线程投递，界面线程按显示刷新率取走
+        只保留最新一帧，投递从不阻塞；界面来不及显示的帧直接被覆盖（跳过）
+        """
+        self._lock = threading.Lock()
+        self._frame = None
+        self._meta = None
+        self._seq = 0
+        self._taken_seq = 0
+
+        self.posted = 0
+        self.taken = 0
+        self.skipped = 0
+        self.last_post_time = None
+
+    def put(self, frame: Any, meta: Dict[str, Any] = None):
+        """
+        投递一帧（替换尚未被取走的旧帧）
+        """
+        with self._lock:
+            if self._seq > self._taken_seq:
+                self.skipped += 1
+            self._frame = frame
+            self._meta = meta
+            self._seq += 1
+            self.posted += 1
+            self.last_post_time = time.time()
+
+    def take(self) -> Optional[Tuple[Any, Dict[str, Any]]]:
+        """
+        取走最新一帧，自上次取走后没有新帧时返回 None
+        """
+        with self._lock:
+            if self._seq == self._taken_seq:
+                return None
+            self._taken_seq = self._seq
+            self.taken += 1
+            frame, meta = self._frame, self._meta
+            # 释放引用，避免信箱持有已显示的帧
+            self._frame = None
+            self._meta = None
+            return frame, meta
+
+    def get_debug_info(self) -> Dict[str, Any]:
+        """
+        获取调试信息
+        """
+        with self._lock:
+            return {
+                'posted': self.posted,
+                'taken': self.taken,
+                'skipped': self.skipped,
+                'skip_rate': self.skipped / self.posted if self.posted else 0.0,
+                'pending': self._seq > self._taken_seq
+            }
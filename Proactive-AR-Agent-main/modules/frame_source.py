@@ -0,0 +1,240 @@
+import queue
+import threading
+import time
+from typing import Dict, Any, Iterator, Tuple
+
+import cv2
+import numpy as np
+
+from modules.instrumentation import metrics, STAGE_DECODE
+from modules.logging_setup import get_logger
+
+SAMPLE_GRAB = 'grab'
+SAMPLE_SEEK = 'seek'
+
+logger = get_logger('video')
+
+# 无法读取源帧率时使用
+DEFAULT_FPS = 30.0
+
+# 需要跳过的帧数达到该值时改为 seek（grab() 仍会解码压缩帧，间隔大时逐帧 grab 比定位到关键帧再解码更慢）
+DEFAULT_SEEK_THRESHOLD = 60
+
+
+class FrameSource:
+    def __init__(self, video_path: str, read_ahead: int = 0, max_width: int = None, sample_every: int = 1,
+                 sample_mode: str = SAMPLE_GRAB, seek_threshold: int = DEFAULT_SEEK_THRESHOLD, pacer=None):
+        """
+        视频帧来源：迭代得到 (源帧序号, 视频时间秒, 帧)，源帧序号从0开始
+        read_ahead: 预读帧数，大于0时在独立线程中解码，检测线程只取已解码的帧
+        max_width: 解码后在解码线程内把宽度超过该值的帧等比缩小（YOLO 输入为640，无需全分辨率）
+        sample_every: 每 N 帧取一帧（离线扫描）
+        sample_mode: 跳帧方式，grab 逐帧 grab()（仍解码压缩帧，只省去 retrieve 的颜色转换和拷贝）；
+                     seek 直接定位到目标帧（间隔大于关键帧间距时更快）
+        seek_threshold: grab 方式下一次需要跳过的帧数达到该值时也改为 seek，0 表示总是逐帧 grab
+        pacer: 可选的 PacingController，按视频时钟控制节奏，落后时跳帧（跳过的帧见 sample_mode）
+        """
+        self.video_path = video_path
+        self.read_ahead = max(0, int(read_ahead or 0))
+        self.max_width = max_width
+        self.sample_every = max(1, int(sample_every or 1))
+        if sample_mode not in (SAMPLE_GRAB, SAMPLE_SEEK):
+            logger.warning("未知的跳帧方式 %s，使用 %s", sample_mode, SAMPLE_GRAB)
+            sample_mode = SAMPLE_GRAB
+        self.sample_mode = sample_mode
+        self.seek_threshold = max(0, int(seek_threshold or 0))
+        self.pacer = pacer
+
+        self.cap = None
+        self.fps = DEFAULT_FPS
+        self.width = 0
+        self.height = 0
+        self.total_frames = 0
+        # 下一次 read() 返回的源帧序号
+        self._position = 0
+
+        self.stats = {
+            'decoded': 0,
+            'skipped': 0,
+            'seeks': 0,
+            'dropped': 0,
+            'decode_seconds': 0.0,
+            'wait_seconds': 0.0
+        }
+
+    @classmethod
+    def from_options(cls, video_path: str, options: Dict[str, Any] = None, pacer=None) -> 'FrameSource':
+        """
+        根据 video_decode 配置创建帧来源
+        """
+        options = options or {}
+        return cls(
+            video_path,
+            read_ahead=options.get('read_ahead', 0),
+            max_width=options.get('max_width'),
+            sample_every=options.get('sample_every', 1),
+            sample_mode=options.get('sample_mode', SAMPLE_GRAB),
+            seek_threshold=options.get('seek_threshold', DEFAULT_SEEK_THRESHOLD),
+            pacer=pacer
+        )
+
+    def open(self) -> bool:
+        """
+        打开视频，失败时返回 False
+        """
+        self.cap = cv2.VideoCapture(self.video_path)
+        if not self.cap.isOpened():
+            self.cap.release()
+            self.cap = None
+            return False
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and fps > 0 else DEFAULT_FPS
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self._position = 0
+        return True
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    @property
+    def output_size(self) -> Tuple[int, int]:
+        """
+        输出帧的 (宽, 高)（考虑 max_width 缩小）
+        """
+        if self.max_width and self.width > self.max_width:
+            return self.max_width, int(round(self.height * self.max_width / self.width))
+        return self.width, self.height
+
+    def __iter__(self) -> Iterator[Tuple[int, float, np.ndarray]]:
+        if self.cap is None and not self.open():
+            return iter(())
+        if self.read_ahead > 0:
+            return self._threaded_frames()
+        return self._decode_frames(pace=True)
+
+    def _advance(self, target: int) -> bool:
+        """
+        移动到 target 帧（下一次 read() 返回该帧）
+        grab() 仍会解码跳过的帧，只省去颜色转换和拷贝；间隔达到 seek_threshold 时直接定位
+        """
+        gap = target - self._position
+        if gap <= 0:
+            return True
+        if gap > 1 and (self.sample_mode == SAMPLE_SEEK or (self.seek_threshold and gap >= self.seek_threshold)):
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            self.stats['seeks'] += 1
+            self.stats['skipped'] += gap
+            self._position = target
+            return True
+        for _ in range(gap):
+            if not self.cap.grab():
+                return False
+            self._position += 1
+            self.stats['skipped'] += 1
+        return True
+
+    def _scale(self, frame: np.ndarray) -> np.ndarray:
+        width, height = self.output_size
+        if width != frame.shape[1]:
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_LINEAR)
+        return frame
+
+    def _decode_frames(self, pace: bool) -> Iterator[Tuple[int, float, np.ndarray]]:
+        """
+        按采样间隔解码；pace 为 True 时在解码前询问节奏控制器（落后时跳帧，
+        跳过的帧在当前线程中 grab 或 seek，见 _advance；预读模式下这部分工作留在解码线程）
+        """
+        if pace and self.pacer is not None:
+            self.pacer.start(self.fps)
+        index = 0
+        try:
+            while True:
+                if pace and self.pacer is not None and not self.pacer.pace(index):
+                    self.stats['dropped'] += 1
+                    index += self.sample_every
+                    continue
+                if not self._advance(index):
+                    break
+                start = time.perf_counter()
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                self._position = index + 1
+                frame = self._scale(frame)
+                elapsed = time.perf_counter() - start
+                self.stats['decoded'] += 1
+                self.stats['decode_seconds'] += elapsed
+                metrics.record(STAGE_DECODE, elapsed)
+                yield index, index / self.fps, frame
+                index += self.sample_every
+        finally:
+            self.release()
+
+    def _threaded_frames(self) -> Iterator[Tuple[int, float, np.ndarray]]:
+        """
+        解码线程预读最多 read_ahead 帧；节奏控制在取帧时进行（落后时丢弃已解码的帧）
+        """
+        frames = queue.Queue(maxsize=self.read_ahead)
+        stop = threading.Event()
+
+        def decode_loop():
+            try:
+                for item in self._decode_frames(pace=False):
+                    while not stop.is_set():
+                        try:
+                            frames.put(item, timeout=0.1)
+                            break
+                        except queue.Full:
+                            continue
+                    if stop.is_set():
+                        return
+            finally:
+                frames.put(None)
+
+        thread = threading.Thread(target=decode_loop, name="frame-decode", daemon=True)
+        thread.start()
+        if self.pacer is not None:
+            self.pacer.start(self.fps)
+        try:
+            while True:
+                start = time.perf_counter()
+                item = frames.get()
+                self.stats['wait_seconds'] += time.perf_counter() - start
+                if item is None:
+                    break
+                if self.pacer is not None and not self.pacer.pace(item[0]):
+                    self.stats['dropped'] += 1
+                    continue
+                yield item
+        finally:
+            stop.set()
+            # 让阻塞在 put 上的解码线程退出
+            while thread.is_alive():
+                try:
+                    frames.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            thread.join()
+
+    def get_debug_info(self) -> Dict[str, Any]:
+        """
+        获取调试信息
+        """
+        decoded = self.stats['decoded']
+        return {
+            'video_path': self.video_path,
+            'fps': self.fps,
+            'source_size': (self.width, self.height),
+            'output_size': self.output_size,
+            'read_ahead': self.read_ahead,
+            'sample_every': self.sample_every,
+            'sample_mode': self.sample_mode,
+            'seek_threshold': self.seek_threshold,
+            'avg_decode_ms': self.stats['decode_seconds'] / decoded * 1000 if decoded else 0.0,
+            'stats': dict(self.stats),
+            'latency': metrics.snapshot([STAGE_DECODE])
+        }
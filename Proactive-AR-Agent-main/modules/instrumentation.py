@@ -0,0 +1,235 @@
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Iterable, Optional
+
+from modules.logging_setup import get_logger
+
+logger = get_logger('metrics')
+
+# 流水线各阶段名称
+STAGE_DECODE = 'decode'
+STAGE_INFERENCE = 'inference'
+STAGE_POSTPROCESS = 'postprocess'
+STAGE_TRACKING = 'tracking'
+STAGE_SCENE_ANALYSIS = 'scene_analysis'
+STAGE_RENDER = 'render'
+STAGE_PROMPT = 'prompt'
+STAGE_LLM = 'llm'
+
+# 直方图桶：从 1 µs 起每桶放大 2^(1/8) 倍（相对误差约 4%），覆盖到约 1000 s
+HISTOGRAM_MIN_SECONDS = 1e-6
+HISTOGRAM_GROWTH = 2 ** 0.125
+HISTOGRAM_BUCKETS = 240
+
+
+def percentile(values, q):
+    """
+    计算分位数（q 取 0~100），无数据时返回 None
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(values):
+    """
+    样本列表的次数、平均值、p50、p95和最大值（无数据时除次数外均为 None）
+    """
+    return {
+        'count': len(values),
+        'avg': sum(values) / len(values) if values else None,
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'max': max(values) if values else None
+    }
+
+
+class LatencyHistogram:
+    def __init__(self):
+        """
+        对数分桶的耗时直方图：记录为 O(1)，分位数按桶的几何中点估计
+        """
+        self._lock = threading.Lock()
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @staticmethod
+    def bucket_index(seconds: float) -> int:
+        if seconds <= HISTOGRAM_MIN_SECONDS:
+            return 0
+        index = int(math.log(seconds / HISTOGRAM_MIN_SECONDS, HISTOGRAM_GROWTH)) + 1
+        return min(index, HISTOGRAM_BUCKETS - 1)
+
+    @staticmethod
+    def bucket_value(index: int) -> float:
+        if index == 0:
+            return HISTOGRAM_MIN_SECONDS
+        # 桶 [min*g^(i-1), min*g^i) 的几何中点
+        return HISTOGRAM_MIN_SECONDS * HISTOGRAM_GROWTH ** (index - 0.5)
+
+    def record(self, seconds: float):
+        index = self.bucket_index(seconds)
+        with self._lock:
+            self.buckets[index] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        估计分位数（q 取 0~100），无数据时返回 None
+        """
+        with self._lock:
+            if not self.count:
+                return None
+            target = max(1, int(math.ceil(q / 100.0 * self.count)))
+            seen = 0
+            for index, count in enumerate(self.buckets):
+                seen += count
+                if seen >= target:
+                    return min(self.bucket_value(index), self.max)
+            return self.max
+
+    def reset(self):
+        with self._lock:
+            self.buckets = [0] * HISTOGRAM_BUCKETS
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        统计摘要（毫秒）
+        """
+        p50, p95, p99 = self.percentile(50), self.percentile(95), self.percentile(99)
+        with self._lock:
+            count, total, maximum = self.count, self.total, self.max
+        to_ms = lambda value: round(value * 1000, 3) if value is not None else None
+        return {
+            'count': count,
+            'avg_ms': to_ms(total / count) if count else None,
+            'p50_ms': to_ms(p50),
+            'p95_ms': to_ms(p95),
+            'p99_ms': to_ms(p99),
+            'max_ms': to_ms(maximum) if count else None
+        }
+
+
+class Instrumentation:
+    def __init__(self, enabled: bool = False):
+        """
+        分阶段耗时统计（perf_counter 单调计时）
+        热路径用法：start = metrics.start() ... metrics.stop(阶段, start)；
+        已自行计时的地方直接 metrics.record(阶段, 秒数)，调用方不必再判断 enabled；
+        关闭时 start() 返回 None，stop() 和 record() 直接返回，开销只有一次属性判断
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._server = None
+        self._server_thread = None
+
+    def configure(self, instrumentation_config: Dict[str, Any]):
+        """
+        应用 instrumentation 配置（可热加载）：开关统计，按需启动或停止本地指标服务
+        """
+        instrumentation_config = instrumentation_config or {}
+        self.enabled = bool(instrumentation_config.get('enabled', False))
+        port = instrumentation_config.get('metrics_port')
+        if self.enabled and port:
+            host = instrumentation_config.get('metrics_host', '127.0.0.1')
+            if self._server is None or self._server.server_address[:2] != (host, port):
+                self.stop_server()
+                self.serve(host, port)
+        else:
+            self.stop_server()
+
+    def start(self) -> Optional[float]:
+        return time.perf_counter() if self.enabled else None
+
+    def stop(self, stage: str, start: Optional[float]):
+        if start is not None:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage: str, seconds: float):
+        if not self.enabled:
+            return
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, LatencyHistogram())
+        histogram.record(seconds)
+
+    def snapshot(self, stages: Iterable[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        各阶段的耗时分位数（毫秒），stages 为空时返回全部阶段
+        """
+        with self._lock:
+            histograms = dict(self._histograms)
+        if stages is not None:
+            histograms = {name: histograms[name] for name in stages if name in histograms}
+        return {name: histogram.snapshot() for name, histogram in histograms.items()}
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+    def serve(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """
+        启动本地指标服务：GET /metrics 返回各阶段耗时的JSON，返回服务地址
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                data = json.dumps({'enabled': metrics.enabled, 'stages': metrics.snapshot()},
+                                  ensure_ascii=False).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._server_thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+        self._server_thread.start()
+        host, port = self._server.server_address[:2]
+        logger.info("指标服务已启动: http://%s:%d/metrics", host, port)
+        return f"http://{host}:{port}"
+
+    def stop_server(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self._server_thread = None
+
+    def get_debug_info(self) -> Dict[str, Any]:
+        """
+        获取调试信息
+        """
+        return {
+            'enabled': self.enabled,
+            'server': f"http://{self._server.server_address[0]}:{self._server.server_address[1]}/metrics"
+                      if self._server is not None else None,
+            'stages': self.snapshot()
+        }
+
+
+# 进程内共享的统计实例，默认关闭
+metrics = Instrumentation()
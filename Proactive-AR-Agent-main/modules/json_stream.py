@@ -0,0 +1,147 @@
+import json
+from typing import Dict, Any, Callable, Optional, Tuple
+
+# 使用JSON输出的格式名（对应 task_types.<任务>.output_format）
+JSON_OUTPUT_FORMATS = ('structured_json', 'hybrid')
+
+
+def format_instruction(template: Dict[str, Any]) -> str:
+    """
+    根据输出模板生成格式要求，附加在prompt末尾
+    """
+    return (
+        "请只输出一个JSON对象，不要输出其他内容。字段及含义如下：\n"
+        f"{json.dumps(template, ensure_ascii=False, indent=2)}\n"
+        "其中 objects 和 suggestions 为字符串数组，confidence 为0~1之间的数字，其余字段为字符串。"
+    )
+
+
+def parse_json_response(text: str) -> Optional[Dict[str, Any]]:
+    """
+    从完整回复中解析JSON对象（容忍前后多余的文字或代码块标记），失败时返回已完整的字段或 None
+    """
+    start = text.find('{')
+    end = text.rfind('}')
+    if start >= 0 and end > start:
+        try:
+            value = json.loads(text[start:end + 1])
+            if isinstance(value, dict):
+                return value
+        except ValueError:
+            pass
+    parser = JsonStreamParser()
+    parser.feed(text)
+    return parser.fields or None
+
+
+class JsonStreamParser:
+    def __init__(self, on_value: Callable[[Tuple, Any], None] = None):
+        """
+        增量JSON解析器：逐段输入模型输出，每当一个值（字段或数组元素）完整时回调 on_value(path, value)
+        path 为从根对象开始的键/下标序列，如 ('suggestions', 0)、('structured_data', 'scene')
+        根对象之前的文字被忽略；无法解析的值被跳过
+        """
+        self.on_value = on_value
+        self.fields = {}  # 根对象中已完整的字段
+        self.done = False
+
+        self._buffer = ""
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+
+    def feed(self, text: str):
+        """
+        输入一段输出
+        """
+        offset = len(self._buffer)
+        self._buffer += text
+        for i in range(offset, len(self._buffer)):
+            if self.done:
+                return
+            self._step(i, self._buffer[i])
+
+    def _step(self, i: int, c: str):
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif c == '\\':
+                self._escape = True
+            elif c == '"':
+                self._in_string = False
+                frame = self._stack[-1]
+                value = self._loads(self._buffer[self._string_start:i + 1])
+                if frame['type'] == '{' and frame['expect_key']:
+                    frame['key'] = value
+                else:
+                    self._complete(frame, value)
+            return
+
+        if not self._stack:
+            if c == '{':
+                self._stack.append(self._frame(c, i, ()))
+            return
+
+        frame = self._stack[-1]
+        if c == '"':
+            self._in_string = True
+            self._string_start = i
+        elif c in '{[':
+            child = frame['key'] if frame['type'] == '{' else frame['index']
+            self._stack.append(self._frame(c, i, frame['path'] + (child,)))
+        elif c in '}]':
+            self._finish_primitive(frame, i)
+            self._stack.pop()
+            value = self._loads(self._buffer[frame['start']:i + 1])
+            if self._stack:
+                self._complete(self._stack[-1], value)
+            else:
+                self.done = True
+                if isinstance(value, dict):
+                    self.fields = value
+        elif c == ':':
+            frame['expect_key'] = False
+        elif c == ',':
+            self._finish_primitive(frame, i)
+            if frame['type'] == '{':
+                frame['expect_key'] = True
+                frame['key'] = None
+            else:
+                frame['index'] += 1
+        elif not c.isspace() and frame['primitive_start'] is None:
+            frame['primitive_start'] = i
+
+    @staticmethod
+    def _frame(kind: str, start: int, path: Tuple) -> Dict[str, Any]:
+        return {'type': kind, 'start': start, 'path': path, 'key': None, 'expect_key': kind == '{',
+                'index': 0, 'primitive_start': None}
+
+    def _finish_primitive(self, frame: Dict[str, Any], end: int):
+        # 数字、true/false/null 在遇到 , } ] 时才算完整
+        if frame['primitive_start'] is None:
+            return
+        token = self._buffer[frame['primitive_start']:end].strip()
+        frame['primitive_start'] = None
+        if token:
+            self._complete(frame, self._loads(token))
+
+    def _complete(self, frame: Dict[str, Any], value: Any):
+        if value is _INVALID:
+            return
+        key = frame['key'] if frame['type'] == '{' else frame['index']
+        path = frame['path'] + (key,)
+        if len(path) == 1:
+            self.fields[key] = value
+        if self.on_value is not None:
+            self.on_value(path, value)
+
+    @staticmethod
+    def _loads(text: str) -> Any:
+        try:
+            return json.loads(text)
+        except ValueError:
+            return _INVALID
+
+
+_INVALID = object()
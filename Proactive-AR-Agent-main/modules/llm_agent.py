@@ -1,13 +1,548 @@
+import json
+import threading
+import time
+from typing import List, Dict, Any, Callable, Iterator, Tuple, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
 
-def query_ollama(prompt):
-    response = requests.post(
-        "http://localhost:11434/api/generate",
-        json={
-            "model": "deepseek-r1:1.5b",
+from modules.logging_setup import get_logger
+
+DEFAULT_BASE_URL = "http://localhost:11434"
+DEFAULT_MODEL = "deepseek-r1:1.5b"
+
+# llm_settings 中的字段 -> Ollama options 字段
+OPTION_KEYS = {
+    'temperature': 'temperature',
+    'max_tokens': 'num_predict',
+    'frequency_penalty': 'frequency_penalty',
+    'presence_penalty': 'presence_penalty',
+    'top_p': 'top_p',
+    'top_k': 'top_k',
+    'num_ctx': 'num_ctx',
+    'stop': 'stop'
+}
+
+# deepseek-r1 等推理模型输出的思考过程标记
+THINK_OPEN_TAG = "<think>"
+THINK_CLOSE_TAG = "</think>"
+
+# 回答达到长度预算后，在这些字符处结束生成
+ANSWER_BREAK_CHARS = "。！？!?\n"
+
+logger = get_logger('llm')
+
+
+def to_ollama_options(settings: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    把配置中的生成参数（llm_settings 或任务的 generation）转换为 Ollama options
+    """
+    settings = settings or {}
+    return {option: settings[key] for key, option in OPTION_KEYS.items() if key in settings}
+
+
+def strip_reasoning(text: str) -> str:
+    """
+    去掉完整回复中的思考过程，只保留回答部分
+    """
+    reasoning_filter = ReasoningFilter()
+    return (reasoning_filter.feed(text) + reasoning_filter.flush()).strip()
+
+
+class ReasoningFilter:
+    def __init__(self, open_tag: str = THINK_OPEN_TAG, close_tag: str = THINK_CLOSE_TAG):
+        """
+        流式过滤思考过程：逐段输入模型输出，只返回 <think>...</think> 之外的回答文本
+        标记可能被拆分在相邻的两段中，可能是标记开头的尾部会暂存到下一段再判断
+        """
+        self.open_tag = open_tag
+        self.close_tag = close_tag
+        self.in_reasoning = False
+        self.reasoning_chars = 0
+        self.answer_chars = 0
+        self._buffer = ""
+
+    def feed(self, text: str) -> str:
+        """
+        输入一段输出，返回其中可以显示的回答文本
+        """
+        self._buffer += text
+        visible = []
+        while self._buffer:
+            tag = self.close_tag if self.in_reasoning else self.open_tag
+            index = self._buffer.find(tag)
+            if index >= 0:
+                self._emit(self._buffer[:index], visible)
+                self._buffer = self._buffer[index + len(tag):]
+                self.in_reasoning = not self.in_reasoning
+                continue
+            # 保留可能是标记开头的尾部
+            keep = 0
+            for n in range(min(len(tag) - 1, len(self._buffer)), 0, -1):
+                if tag.startswith(self._buffer[-n:]):
+                    keep = n
+                    break
+            self._emit(self._buffer[:len(self._buffer) - keep], visible)
+            self._buffer = self._buffer[len(self._buffer) - keep:]
+            break
+        return "".join(visible)
+
+    def flush(self) -> str:
+        """
+        生成结束时输出暂存的文本
+        """
+        visible = []
+        self._emit(self._buffer, visible)
+        self._buffer = ""
+        return "".join(visible)
+
+    def _emit(self, text: str, visible: List[str]):
+        if not text:
+            return
+        if self.in_reasoning:
+            self.reasoning_chars += len(text)
+            return
+        # 回答开头的空行（思考结束后的换行）不显示
+        if self.answer_chars == 0:
+            text = text.lstrip()
+            if not text:
+                return
+        self.answer_chars += len(text)
+        visible.append(text)
+
+# 可重试的HTTP状态码
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class GenerationHandle:
+    def __init__(self):
+        """
+        流式生成的句柄：可在其他线程中取消正在进行的生成
+        """
+        self.cancel_event = threading.Event()
+        self.response = None
+        self.started_at = None
+        self.first_token_at = None
+
+    def cancel(self):
+        """
+        取消生成并关闭底层连接，使阻塞中的读取立即返回
+        """
+        self.cancel_event.set()
+        response = self.response
+        if response is not None:
+            response.close()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    @property
+    def ttft(self) -> float:
+        """
+        首个token耗时（秒），尚未收到token时为 None
+        """
+        if self.started_at is None or self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+
+class OllamaClient:
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, model: str = DEFAULT_MODEL, options: Dict[str, Any] = None,
+                 connect_timeout: float = 3.0, read_timeout: float = 120.0, max_retries: int = 2,
+                 backoff_factor: float = 0.5, pool_maxsize: int = 4, keep_alive: str = None):
+        """
+        Ollama HTTP 客户端：复用连接池（keep-alive），带超时和有限次数的退避重试
+        base_url: Ollama 服务地址（测试时可指向本地桩服务）
+        model: 模型名称
+        options: 传给 Ollama 的生成参数（temperature、num_predict 等）
+        connect_timeout / read_timeout: 连接 / 读取超时（秒）
+        max_retries: 连接失败、超时或5xx时的最大重试次数
+        backoff_factor: 退避基数，第 n 次重试前等待 backoff_factor * 2^(n-1) 秒
+        pool_maxsize: 连接池大小
+        keep_alive: 模型在 Ollama 中的驻留时间（如 "30m"），避免模型被卸载后冷启动
+        """
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.options = dict(options or {})
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_factor = backoff_factor
+        self.keep_alive = keep_alive
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.request_count = 0
+        self.retry_count = 0
+        self.error_count = 0
+        self.stream = False
+        self.think = None
+        self.last_ttft = None
+
+    @classmethod
+    def from_settings(cls, llm_settings: Dict[str, Any]) -> 'OllamaClient':
+        """
+        根据 analysis_config.json 的 llm_settings 创建客户端
+        """
+        client = cls()
+        client.update_settings(llm_settings)
+        return client
+
+    def update_settings(self, llm_settings: Dict[str, Any]):
+        """
+        应用 llm_settings（配置热加载时调用），保留已建立的连接
+        """
+        llm_settings = llm_settings or {}
+        self.base_url = llm_settings.get('base_url', self.base_url).rstrip('/')
+        self.model = llm_settings.get('model', self.model)
+        self.connect_timeout = llm_settings.get('connect_timeout', self.connect_timeout)
+        self.read_timeout = llm_settings.get('read_timeout', self.read_timeout)
+        self.max_retries = max(0, int(llm_settings.get('max_retries', self.max_retries)))
+        self.backoff_factor = llm_settings.get('backoff_factor', self.backoff_factor)
+        self.keep_alive = llm_settings.get('keep_alive', self.keep_alive)
+        self.stream = llm_settings.get('stream', self.stream)
+        # 支持 think 参数的 Ollama 版本可直接关闭推理模型的思考过程
+        self.think = llm_settings.get('think', self.think)
+        self.options = to_ollama_options(llm_settings)
+
+    def build_payload(self, prompt: str, stream: bool = False, options: Dict[str, Any] = None, model: str = None,
+                      context: List[int] = None, output_format: Any = None) -> Dict[str, Any]:
+        """
+        构建 /api/generate 请求体
+        context: 上一次生成返回的 context，传入后模型在其基础上继续，无需重新prefill之前的内容
+        output_format: Ollama 的 format 参数（"json" 或 JSON Schema），约束输出为JSON
+        """
+        merged_options = dict(self.options)
+        if options:
+            merged_options.update(options)
+
+        payload = {
+            "model": model or self.model,
             "prompt": prompt,
-            "stream": False
+            "stream": stream
         }
-    )
-    return response.json()["response"]
+        if merged_options:
+            payload["options"] = merged_options
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        if self.think is not None:
+            payload["think"] = self.think
+        if context:
+            payload["context"] = context
+        if output_format is not None:
+            payload["format"] = output_format
+        return payload
+
+    def post(self, path: str, payload: Dict[str, Any], stream: bool = False) -> requests.Response:
+        """
+        发送POST请求；连接失败、超时或可重试状态码时按指数退避重试
+        """
+        url = f"{self.base_url}{path}"
+        attempt = 0
+        while True:
+            self.request_count += 1
+            try:
+                response = self.session.post(
+                    url, json=payload, stream=stream,
+                    timeout=(self.connect_timeout, self.read_timeout)
+                )
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    return response
+                response.close()
+                error = requests.HTTPError(f"HTTP {response.status_code}", response=response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except requests.HTTPError:
+                self.error_count += 1
+                raise
+
+            if attempt >= self.max_retries:
+                self.error_count += 1
+                raise error
+
+            attempt += 1
+            self.retry_count += 1
+            time.sleep(self.backoff_factor * (2 ** (attempt - 1)))
+
+    def generate(self, prompt: str, options: Dict[str, Any] = None, model: str = None,
+                 context: List[int] = None, output_format: Any = None,
+                 handle: GenerationHandle = None) -> Dict[str, Any]:
+        """
+        非流式生成，返回 Ollama 的完整响应（包含 response、context 及耗时统计）
+        handle: 传入时可被取消。Ollama 的非流式响应在生成结束后才返回响应头，无法中途关闭连接，
+                因此改用流式请求在内部拼接完整回复；被取消时结果中 cancelled 为 True
+        """
+        if handle is not None:
+            parts = []
+            final = {}
+            for chunk in self.iter_generate(prompt, handle=handle, options=options, model=model, context=context,
+                                            output_format=output_format):
+                parts.append(chunk.get("response", ""))
+                if chunk.get("done"):
+                    final = chunk
+            result = dict(final)
+            result["response"] = "".join(parts)
+            result["cancelled"] = handle.cancelled
+            result["ttft"] = handle.ttft
+            return result
+
+        payload = self.build_payload(prompt, stream=False, options=options, model=model, context=context,
+                                     output_format=output_format)
+        response = self.post("/api/generate", payload)
+        return response.json()
+
+    def query(self, prompt: str, options: Dict[str, Any] = None, model: str = None) -> str:
+        """
+        非流式生成，只返回回复文本
+        """
+        return self.generate(prompt, options=options, model=model)["response"]
+
+    def iter_generate(self, prompt: str, handle: GenerationHandle = None, options: Dict[str, Any] = None,
+                      model: str = None, context: List[int] = None, output_format: Any = None) -> Iterator[Dict[str, Any]]:
+        """
+        流式生成：逐条解析 Ollama 返回的 NDJSON，产出每个数据块
+        handle 被取消后停止读取并关闭连接
+        """
+        handle = handle or GenerationHandle()
+        handle.started_at = time.perf_counter()
+        payload = self.build_payload(prompt, stream=True, options=options, model=model, context=context,
+                                     output_format=output_format)
+        response = self.post("/api/generate", payload, stream=True)
+        handle.response = response
+        try:
+            if handle.cancelled:
+                return
+            for line in response.iter_lines():
+                if handle.cancelled:
+                    return
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise RuntimeError(chunk["error"])
+                if handle.first_token_at is None and chunk.get("response"):
+                    handle.first_token_at = time.perf_counter()
+                yield chunk
+                if chunk.get("done"):
+                    return
+        except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError, AttributeError, ValueError):
+            # 取消时连接被关闭，读取线程会在这里收到异常
+            if handle.cancelled:
+                return
+            raise
+        finally:
+            response.close()
+
+    def stream_generate(self, prompt: str, on_token: Callable[[str], None] = None, handle: GenerationHandle = None,
+                        options: Dict[str, Any] = None, model: str = None, context: List[int] = None,
+                        reasoning_filter: ReasoningFilter = None, max_answer_chars: int = None,
+                        output_format: Any = None, should_stop: Callable[[], bool] = None) -> Dict[str, Any]:
+        """
+        流式生成，每收到一段文本调用 on_token(text)，返回完整结果
+        reasoning_filter: 传入时思考过程不写入回复也不回调 on_token
+        max_answer_chars: 回答达到该长度后，在下一个句末处提前结束生成（不会返回 context）
+        should_stop: 每段文本回调后调用，返回 True 时提前结束生成（如JSON根对象已完整）
+        结果包含 response、cancelled、stopped_early、reasoning_chars、ttft（首个token耗时，秒）以及 Ollama 的最终统计
+        """
+        handle = handle or GenerationHandle()
+        parts = []
+        final = {}
+        answer_chars = 0
+        stopped_early = False
+        chunks = self.iter_generate(prompt, handle=handle, options=options, model=model, context=context,
+                                    output_format=output_format)
+        for chunk in chunks:
+            text = chunk.get("response", "")
+            if reasoning_filter is not None:
+                if text:
+                    text = reasoning_filter.feed(text)
+                # Ollama 的最终数据块 response 为空，仍需取出过滤器暂存的尾部
+                if chunk.get("done"):
+                    text += reasoning_filter.flush()
+            if text:
+                parts.append(text)
+                answer_chars += len(text)
+                if on_token is not None:
+                    on_token(text)
+            if chunk.get("done"):
+                final = chunk
+            elif (should_stop is not None and should_stop()) or \
+                    (max_answer_chars and answer_chars >= max_answer_chars and text and text[-1] in ANSWER_BREAK_CHARS):
+                # 回答已完整，不再等待剩余token
+                stopped_early = True
+                chunks.close()
+                break
+
+        ttft = handle.ttft
+        if ttft is not None:
+            self.last_ttft = ttft
+            logger.debug("首个token耗时: %.0f ms", ttft * 1000, extra={'data': {'ttft_ms': round(ttft * 1000, 1)}})
+
+        result = dict(final)
+        result["response"] = "".join(parts)
+        result["cancelled"] = handle.cancelled
+        result["stopped_early"] = stopped_early
+        result["reasoning_chars"] = reasoning_filter.reasoning_chars if reasoning_filter is not None else 0
+        result["ttft"] = ttft
+        return result
+
+    def close(self):
+        """
+        关闭连接池
+        """
+        self.session.close()
+
+    def get_debug_info(self) -> Dict[str, Any]:
+        """
+        获取调试信息
+        """
+        return {
+            'base_url': self.base_url,
+            'model': self.model,
+            'options': dict(self.options),
+            'timeouts': (self.connect_timeout, self.read_timeout),
+            'request_count': self.request_count,
+            'retry_count': self.retry_count,
+            'error_count': self.error_count,
+            'stream': self.stream,
+            'last_ttft': self.last_ttft
+        }
+
+
+class ContextSession:
+    def __init__(self, max_turns: int = 8, max_context_tokens: int = 3072):
+        """
+        上下文复用会话：按会话键（如任务类型）保存 Ollama 返回的 context，
+        后续请求只发送增量内容，避免每次从头prefill系统提示和场景描述
+        max_turns: 复用的最大轮数，达到后重置并发送完整prompt
+        max_context_tokens: context 长度上限，超过后重置，防止无限增长
+        """
+        self.max_turns = max(1, int(max_turns))
+        self.max_context_tokens = max_context_tokens
+        self._lock = threading.Lock()
+        self._states = {}  # 会话键 -> {'context': [...], 'turns': n}
+
+        # 按模式（full / delta）统计prefill耗时
+        self.prefill_stats = {
+            'full': {'calls': 0, 'prompt_tokens': 0, 'prefill_ms': 0.0},
+            'delta': {'calls': 0, 'prompt_tokens': 0, 'prefill_ms': 0.0}
+        }
+        self.reset_count = 0
+        self.stopped_early_count = 0
+
+    @classmethod
+    def from_settings(cls, context_settings: Dict[str, Any]) -> 'ContextSession':
+        """
+        根据 llm_settings.context_reuse 创建会话
+        """
+        session = cls()
+        session.reconfigure(context_settings)
+        return session
+
+    def reconfigure(self, context_settings: Dict[str, Any]):
+        """
+        应用新的复用参数（配置热加载时调用），已保存的 context 在下次 prepare 时按新上限检查
+        """
+        context_settings = context_settings or {}
+        with self._lock:
+            self.max_turns = max(1, int(context_settings.get('max_turns', self.max_turns)))
+            self.max_context_tokens = context_settings.get('max_context_tokens', self.max_context_tokens)
+
+    def prepare(self, key: str, full_prompt: str,
+                build_delta: Callable[[Any], Optional[str]] = None) -> Tuple[str, Optional[List[int]]]:
+        """
+        选择本次要发送的内容：可复用时返回 (增量prompt, context)，否则返回 (完整prompt, None)
+        build_delta(basis): 根据 context 所对应的上一次输入（record 时保存的 basis）生成增量prompt，
+        返回 None 表示无法增量描述（如场景切换）
+        """
+        with self._lock:
+            state = self._states.get(key)
+            if state is None or build_delta is None:
+                return full_prompt, None
+            if state['turns'] >= self.max_turns or len(state['context']) >= self.max_context_tokens:
+                # 定期重置，防止 context 无限增长
+                del self._states[key]
+                self.reset_count += 1
+                return full_prompt, None
+            context, basis = state['context'], state['basis']
+
+        delta_prompt = build_delta(basis)
+        if not delta_prompt:
+            return full_prompt, None
+        return delta_prompt, context
+
+    def record(self, key: str, result: Dict[str, Any], reused: bool, basis: Any = None):
+        """
+        记录一次完成的生成：保存新的 context 及其对应的输入 basis，并统计prefill耗时
+        提前结束的生成没有 Ollama 的最终数据块（无 context 和prefill统计）：不计入统计，
+        保留原有的 context（它仍对应原来的 basis，下一次可继续相对 basis 发送增量）
+        """
+        with self._lock:
+            if result.get('stopped_early'):
+                self.stopped_early_count += 1
+                return
+            context = result.get('context')
+            if context:
+                state = self._states.get(key) if reused else None
+                turns = state['turns'] + 1 if state else 1
+                self._states[key] = {'context': context, 'turns': turns, 'basis': basis}
+            else:
+                self._states.pop(key, None)
+
+            stats = self.prefill_stats['delta' if reused else 'full']
+            stats['calls'] += 1
+            stats['prompt_tokens'] += result.get('prompt_eval_count', 0) or 0
+            stats['prefill_ms'] += (result.get('prompt_eval_duration', 0) or 0) / 1e6
+
+    def reset(self, key: str = None):
+        """
+        丢弃某个会话（或全部会话）的 context；生成被取消、失败或命中缓存时调用，
+        因为此时模型没有看到本次场景，下一次增量将无从参照
+        """
+        with self._lock:
+            if key is None:
+                self._states.clear()
+            else:
+                self._states.pop(key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取prefill统计（平均prefill耗时和prompt token数）
+        """
+        with self._lock:
+            summary = {}
+            for mode, stats in self.prefill_stats.items():
+                calls = stats['calls']
+                summary[mode] = {
+                    'calls': calls,
+                    'avg_prompt_tokens': stats['prompt_tokens'] / calls if calls else 0.0,
+                    'avg_prefill_ms': stats['prefill_ms'] / calls if calls else 0.0
+                }
+            summary['reset_count'] = self.reset_count
+            summary['stopped_early'] = self.stopped_early_count
+            summary['sessions'] = {key: state['turns'] for key, state in self._states.items()}
+            return summary
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client() -> OllamaClient:
+    """
+    获取进程内共享的默认客户端
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = OllamaClient()
+        return _default_client
+
+
+def query_ollama(prompt, model=None):
+    return get_default_client().query(prompt, model=model)
@@ -0,0 +1,386 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Callable, Optional
+
+from modules.llm_agent import GenerationHandle
+
+# 请求来源：周期性场景分析 / 用户主动提问
+SOURCE_PERIODIC = 'periodic'
+SOURCE_USER = 'user'
+
+# 默认优先级（数值越大越优先）：来源优先级 + 任务类型优先级
+DEFAULT_SOURCE_PRIORITIES = {SOURCE_USER: 100, SOURCE_PERIODIC: 0}
+DEFAULT_TASK_PRIORITIES = {}
+
+# 默认截止时间（秒，从提交开始计算），超时的请求不再开始，进行中的被取消
+DEFAULT_DEADLINES = {SOURCE_USER: 60.0, SOURCE_PERIODIC: 20.0}
+
+
+def lane_name(source: str, task_type: str) -> str:
+    """
+    通道名称，如 periodic/cooking_assistant
+    """
+    return f"{source}/{task_type}"
+
+
+def supersession_group(source: str, task_type: str) -> str:
+    """
+    新旧替换分组：所有周期性通道同属一组（场景切换后旧任务类型的请求同样过时），用户提问按通道分组
+    """
+    return SOURCE_PERIODIC if source == SOURCE_PERIODIC else lane_name(source, task_type)
+
+
+def request_deadline(seconds: float) -> Optional[float]:
+    """
+    截止时长（秒）转为时间戳，None 或非正数表示不限
+    """
+    if seconds is None or seconds <= 0:
+        return None
+    return time.time() + seconds
+
+
+class LLMRequest:
+    def __init__(self, seq: int, prompt: str, task_type: str, snapshot: Dict[str, Any],
+                 source: str = SOURCE_PERIODIC, priority: int = 0, deadline: float = None):
+        """
+        一次LLM请求
+        seq: 递增序号，用于判断新旧
+        snapshot: 该请求所对应的场景快照（帧号、场景、物体等）
+        source: 请求来源（periodic / user）
+        priority: 优先级，数值越大越优先
+        deadline: 截止时间（time.time() 时间戳），None 表示不限
+        """
+        self.seq = seq
+        self.prompt = prompt
+        self.task_type = task_type
+        self.snapshot = snapshot
+        self.source = source
+        self.priority = priority
+        self.deadline = deadline
+        self.lane = lane_name(source, task_type)
+        self.group = supersession_group(source, task_type)
+        self.handle = GenerationHandle()
+        self.created_at = time.time()
+        self.started_at = None
+
+    def expired(self, now: float = None) -> bool:
+        return self.deadline is not None and (time.time() if now is None else now) > self.deadline
+
+
+class LLMResult:
+    def __init__(self, request: LLMRequest, response: str = None, error: str = None):
+        """
+        一次LLM请求的结果，通过 request.snapshot 可知它回答的是哪个场景
+        """
+        self.request = request
+        self.response = response
+        self.error = error
+        self.finished_at = time.time()
+
+    @property
+    def snapshot(self) -> Dict[str, Any]:
+        return self.request.snapshot
+
+    @property
+    def latency(self) -> float:
+        return self.finished_at - self.request.created_at
+
+
+class LLMDispatcher:
+    def __init__(self, handler: Callable[[LLMRequest], str], on_result: Callable[[LLMResult], None] = None,
+                 max_in_flight: int = 1, cancel_superseded: bool = True, source_priorities: Dict[str, int] = None,
+                 task_priorities: Dict[str, int] = None, deadlines: Dict[str, float] = None):
+        """
+        LLM请求调度器：按 (来源, 任务类型) 分通道排队，最多 max_in_flight 个请求同时进行
+        - 周期性请求只保留最新一个（新请求替换所有周期性通道中排队的旧请求，不论任务类型），用户提问通道按顺序全部保留
+        - 空闲时先执行优先级最高的请求，同优先级先到先执行
+        - 超过截止时间的请求直接丢弃，进行中的被取消
+        - 全部工作线程繁忙时，更高优先级的新请求会抢占（取消）优先级最低的进行中请求
+        handler: 在工作线程中执行请求并返回回复文本
+        on_result: 结果回调（只回调不过期的结果）
+        max_in_flight: 同时进行的请求数上限
+        cancel_superseded: 新的周期性请求到达时是否取消仍在进行的旧周期性请求
+        source_priorities / task_priorities: 来源 / 任务类型的优先级，请求优先级为两者之和
+        deadlines: 各来源的截止时间（秒）
+        """
+        self.handler = handler
+        self.on_result = on_result
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.cancel_superseded = cancel_superseded
+        self.source_priorities = dict(DEFAULT_SOURCE_PRIORITIES)
+        self.source_priorities.update(source_priorities or {})
+        self.task_priorities = dict(DEFAULT_TASK_PRIORITIES)
+        self.task_priorities.update(task_priorities or {})
+        self.deadlines = dict(DEFAULT_DEADLINES)
+        self.deadlines.update(deadlines or {})
+
+        self._cond = threading.Condition()
+        self._lanes = {}  # 通道名 -> deque[LLMRequest]
+        self._in_flight = {}  # seq -> LLMRequest
+        self._seq = 0
+        self._latest_seq = {}  # 替换分组 -> 最新提交的序号
+        self._last_delivered_seq = {}  # 替换分组 -> 最近交付的序号
+        self._running = True
+
+        self.stats = {
+            'submitted': 0,
+            'completed_directly': 0,
+            'replaced': 0,
+            'started': 0,
+            'delivered': 0,
+            'dropped_stale': 0,
+            'cancelled': 0,
+            'preempted': 0,
+            'expired': 0,
+            'errors': 0
+        }
+        # 按通道统计交付结果的端到端耗时（提交 -> 完成，含排队时间）
+        self.latency_by_lane = {}
+
+        self._workers = []
+        for i in range(self.max_in_flight):
+            worker = threading.Thread(target=self._worker_loop, name=f"llm-dispatcher-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+        # 截止时间监视线程：取消超时的进行中请求
+        self._monitor = threading.Thread(target=self._deadline_loop, name="llm-dispatcher-deadline", daemon=True)
+        self._monitor.start()
+
+    def reconfigure(self, scheduling_config: Dict[str, Any]):
+        """
+        应用 llm_scheduling 中的优先级和截止时间（配置热加载时调用），已排队的请求保持原优先级
+        """
+        scheduling_config = scheduling_config or {}
+        priorities = scheduling_config.get('priorities') or {}
+        with self._cond:
+            self.source_priorities = dict(DEFAULT_SOURCE_PRIORITIES)
+            self.source_priorities.update(priorities.get('sources') or {})
+            self.task_priorities = dict(DEFAULT_TASK_PRIORITIES)
+            self.task_priorities.update(priorities.get('task_types') or {})
+            self.deadlines = dict(DEFAULT_DEADLINES)
+            self.deadlines.update(scheduling_config.get('deadline_seconds') or {})
+
+    def submit(self, prompt: str, task_type: str = 'scene_analysis', snapshot: Dict[str, Any] = None,
+               source: str = SOURCE_PERIODIC, priority: int = None, deadline: float = None) -> LLMRequest:
+        """
+        提交请求：周期性请求替换所有周期性通道中尚未开始的旧请求；按配置取消仍在进行的旧周期性请求
+        priority: 不传时按来源和任务类型的配置计算
+        deadline: 截止时长（秒），不传时取来源的默认值
+        """
+        with self._cond:
+            request = self._new_request(prompt, task_type, snapshot, source, priority, deadline)
+            self.stats['submitted'] += 1
+            self._supersede(request)
+            self._lanes.setdefault(request.lane, deque()).append(request)
+
+            # 工作线程全部繁忙时抢占优先级最低的进行中请求
+            active = [r for r in self._in_flight.values() if not r.handle.cancelled]
+            if len(active) >= self.max_in_flight:
+                victim = min(active, key=lambda r: (r.priority, -r.seq))
+                if victim.priority < request.priority:
+                    self._cancel(victim, 'preempted')
+
+            self._cond.notify_all()
+        return request
+
+    def complete(self, task_type: str, response: str, snapshot: Dict[str, Any] = None,
+                 source: str = SOURCE_PERIODIC) -> LLMRequest:
+        """
+        直接交付已有回复的请求（如命中缓存）：不排队也不占用工作线程，
+        与 submit 一样替换和取消同组的旧请求，之后完成的更旧回复会被丢弃
+        """
+        with self._cond:
+            request = self._new_request(None, task_type, snapshot, source, None, None)
+            request.started_at = request.created_at
+            self.stats['completed_directly'] += 1
+            self._supersede(request)
+            self._deliver(LLMResult(request, response=response))
+            self._cond.notify_all()
+        return request
+
+    def _new_request(self, prompt: str, task_type: str, snapshot: Dict[str, Any], source: str,
+                     priority: Optional[int], deadline: Optional[float]) -> LLMRequest:
+        """
+        分配序号并创建请求，记为所在替换分组的最新请求（调用方持有锁）
+        """
+        self._seq += 1
+        if priority is None:
+            priority = self.source_priorities.get(source, 0) + self.task_priorities.get(task_type, 0)
+        if deadline is None:
+            deadline = self.deadlines.get(source)
+        request = LLMRequest(
+            self._seq, prompt, task_type, dict(snapshot or {}, seq=self._seq, source=source),
+            source=source, priority=priority,
+            deadline=request_deadline(deadline)
+        )
+        self._latest_seq[request.group] = request.seq
+        return request
+
+    def _supersede(self, request: LLMRequest):
+        """
+        周期性请求替换同组中排队的旧请求，并按配置取消同组仍在进行的旧请求（调用方持有锁）
+        """
+        if request.source != SOURCE_PERIODIC:
+            return
+        for queued in self._lanes.values():
+            if queued and queued[0].group == request.group:
+                self.stats['replaced'] += len(queued)
+                queued.clear()
+        if self.cancel_superseded:
+            for old in self._in_flight.values():
+                if old.group == request.group:
+                    self._cancel(old, 'cancelled')
+
+    def _deliver(self, result: LLMResult):
+        """
+        记录交付并回调（调用方持有锁；周期性结果据此按序号顺序交付，用户提问按完成顺序全部交付）
+        """
+        request = result.request
+        self._last_delivered_seq[request.group] = request.seq
+        if result.error is not None:
+            self.stats['errors'] += 1
+        self.stats['delivered'] += 1
+        self._record_latency(request.lane, result.latency)
+        if self.on_result is not None:
+            self.on_result(result)
+
+    def is_latest(self, request: LLMRequest) -> bool:
+        """
+        请求是否仍是所在替换分组最新提交的请求（用于决定流式输出是否写入界面）
+        """
+        return request.seq == self._latest_seq.get(request.group) and not request.handle.cancelled
+
+    def _cancel(self, request: LLMRequest, reason: str):
+        if not request.handle.cancelled:
+            request.handle.cancel()
+            self.stats[reason] += 1
+
+    def _next_request(self) -> Optional[LLMRequest]:
+        """
+        取出优先级最高的未过期请求（调用方持有锁）
+        """
+        now = time.time()
+        best = None
+        for lane in self._lanes.values():
+            while lane and lane[0].expired(now):
+                lane.popleft()
+                self.stats['expired'] += 1
+            if lane and (best is None or (lane[0].priority, -lane[0].seq) > (best.priority, -best.seq)):
+                best = lane[0]
+        if best is not None:
+            self._lanes[best.lane].popleft()
+        return best
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                request = None
+                while self._running:
+                    request = self._next_request()
+                    if request is not None:
+                        break
+                    self._cond.wait()
+                if not self._running:
+                    return
+                request.started_at = time.time()
+                self._in_flight[request.seq] = request
+                self.stats['started'] += 1
+                self._cond.notify_all()
+
+            result = LLMResult(request)
+            try:
+                result.response = self.handler(request)
+            except Exception as e:
+                result.error = str(e)
+            result.finished_at = time.time()
+
+            with self._cond:
+                del self._in_flight[request.seq]
+                # 已被取消的回复，以及比已交付结果更旧的周期性回复直接丢弃（用户提问不会被替换，全部交付）
+                stale = request.source == SOURCE_PERIODIC and \
+                    request.seq < self._last_delivered_seq.get(request.group, 0)
+                if request.handle.cancelled or stale:
+                    self.stats['dropped_stale'] += 1
+                    continue
+                self._deliver(result)
+
+    def _deadline_loop(self):
+        with self._cond:
+            while self._running:
+                now = time.time()
+                deadlines = []
+                for request in self._in_flight.values():
+                    if request.handle.cancelled or request.deadline is None:
+                        continue
+                    if request.deadline <= now:
+                        self._cancel(request, 'expired')
+                    else:
+                        deadlines.append(request.deadline)
+                # 等到最近的截止时间，或有请求开始/提交时被唤醒
+                self._cond.wait(min(deadlines) - now if deadlines else None)
+
+    def _record_latency(self, lane: str, latency: float):
+        stats = self.latency_by_lane.get(lane)
+        if stats is None:
+            stats = {'count': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0}
+            self.latency_by_lane[lane] = stats
+        stats['count'] += 1
+        stats['total'] += latency
+        stats['max'] = max(stats['max'], latency)
+        stats['last'] = latency
+
+    def get_latency_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        获取各通道的端到端耗时（秒）：次数、平均、最大、最近一次
+        """
+        with self._cond:
+            return {
+                lane: {
+                    'count': stats['count'],
+                    'avg': stats['total'] / stats['count'],
+                    'max': stats['max'],
+                    'last': stats['last']
+                }
+                for lane, stats in self.latency_by_lane.items()
+            }
+
+    def cancel_all(self, source: str = None):
+        """
+        丢弃排队请求并取消进行中的请求；指定 source 时只处理该来源
+        """
+        with self._cond:
+            for lane in self._lanes.values():
+                kept = [r for r in lane if source is not None and r.source != source]
+                lane.clear()
+                lane.extend(kept)
+            for request in self._in_flight.values():
+                if source is None or request.source == source:
+                    self._cancel(request, 'cancelled')
+
+    def stop(self):
+        """
+        停止调度器
+        """
+        self.cancel_all()
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+    def get_debug_info(self) -> Dict[str, Any]:
+        """
+        获取调试信息
+        """
+        with self._cond:
+            return {
+                'max_in_flight': self.max_in_flight,
+                'in_flight': {r.lane: r.seq for r in self._in_flight.values()},
+                'pending': {lane: len(requests) for lane, requests in self._lanes.items() if requests},
+                'last_seq': self._seq,
+                'last_delivered_seq': dict(self._last_delivered_seq),
+                'source_priorities': dict(self.source_priorities),
+                'task_priorities': dict(self.task_priorities),
+                'stats': dict(self.stats),
+                'latency_by_lane': {lane: dict(stats) for lane, stats in self.latency_by_lane.items()}
+            }
@@ -0,0 +1,432 @@
+import logging
+import os
+from typing import Dict, Any, Callable, Optional
+
+from modules.analysis_config import AnalysisConfig, DEFAULT_TASK_TYPE
+from modules.llm_agent import OllamaClient, ContextSession, ReasoningFilter, strip_reasoning, to_ollama_options
+from modules.llm_dispatcher import LLMDispatcher, LLMRequest, LLMResult, SOURCE_PERIODIC, SOURCE_USER
+from modules.json_stream import JsonStreamParser, format_instruction, parse_json_response
+from modules.response_cache import ResponseCache, make_cache_key
+from modules.scene_analyzer import SceneAnalyzer
+from modules.similarity_cache import SimilarityCache, SceneEmbedder
+from modules.instrumentation import metrics, STAGE_PROMPT, STAGE_LLM
+from modules.logging_setup import get_logger
+
+prompt_logger = get_logger('prompt')
+llm_logger = get_logger('llm')
+cache_logger = get_logger('cache')
+
+# 项目根目录（配置中的相对缓存路径相对于此目录）
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def format_snapshot_tag(snapshot: Dict[str, Any]) -> str:
+    """
+    LLM输出所对应场景快照的标签
+    """
+    if snapshot.get('source') == SOURCE_USER:
+        source = "用户提问"
+    elif snapshot.get('cached'):
+        source = "缓存"
+    elif snapshot.get('similar_cached'):
+        source = f"相似场景缓存 {snapshot['similar_cached']:.2f}"
+    else:
+        source = "LLM"
+    return f"[帧 {snapshot.get('frame_idx')} | 场景 {snapshot.get('scene')} | 请求 #{snapshot.get('seq')} | {source}]\n"
+
+
+def format_structured_text(fields: Dict[str, Any]) -> str:
+    """
+    把结构化回复转为界面显示的文字（hybrid 格式取 structured_data 和 natural_summary）
+    """
+    data = fields.get('structured_data') if isinstance(fields.get('structured_data'), dict) else fields
+    lines = []
+    if data.get('scene'):
+        lines.append(f"场景：{data['scene']}")
+    if data.get('analysis'):
+        lines.append(f"分析：{data['analysis']}")
+    suggestions = data.get('suggestions')
+    if isinstance(suggestions, list) and suggestions:
+        lines.append("建议：")
+        lines.extend(f"- {item}" for item in suggestions)
+    if isinstance(data.get('confidence'), (int, float)):
+        lines.append(f"置信度：{data['confidence']:.2f}")
+    if fields.get('natural_summary'):
+        lines.append(f"摘要：{fields['natural_summary']}")
+    return "\n".join(lines)
+
+
+def structured_update(path: tuple, value: Any) -> Optional[str]:
+    """
+    结构化回复中某个值完整时，返回要追加显示的文字（只显示分析、建议条目和摘要）
+    """
+    if len(path) >= 2 and path[-2] == 'suggestions' and isinstance(path[-1], int):
+        return f"- {value}\n"
+    if path[-1] == 'analysis' and isinstance(value, str):
+        return f"分析：{value}\n建议：\n"
+    if path == ('natural_summary',) and isinstance(value, str):
+        return f"摘要：{value}\n"
+    return None
+
+
+class LLMPipeline:
+    def __init__(self, config: AnalysisConfig, scene_analyzer: SceneAnalyzer, client: OllamaClient,
+                 response_cache: ResponseCache = None, similarity_cache: SimilarityCache = None,
+                 context_session: ContextSession = None, on_stream: Callable[[str, str], None] = None,
+                 on_result: Callable[[LLMResult], None] = None, verbose: bool = True, max_in_flight: int = None):
+        """
+        LLM请求链路：场景 -> prompt -> 调度器 -> 缓存 / 上下文复用 -> Ollama -> 结果
+        GUI、无界面运行和压测共用同一条链路
+        on_stream(kind, text): 流式输出回调，kind 为 'reset'（新回复开始）、'delta'（增量文本）
+                               或 'suggestion'（结构化输出中一条已完整的建议，可立即显示在AR叠加层）
+        on_result: 调度器交付结果时的回调
+        verbose: 是否记录每次请求的prompt和prefill统计（prompt / llm 日志类别）
+        max_in_flight: 同时进行的请求数，不传时取 llm_settings.max_in_flight
+        """
+        self.config = config
+        self.scene_analyzer = scene_analyzer
+        self.client = client
+        self.response_cache = response_cache
+        self.similarity_cache = similarity_cache
+        self.context_session = context_session
+        self.on_stream = on_stream
+        self.on_result = on_result
+        self.verbose = verbose
+
+        # 按 (来源, 任务类型) 分通道排队，用户提问优先并可抢占周期性分析，超过截止时间的请求被丢弃
+        llm_settings = config.current.llm_settings
+        self.dispatcher = LLMDispatcher(
+            self.handle,
+            on_result=on_result,
+            max_in_flight=max_in_flight or llm_settings.get('max_in_flight', 1),
+            cancel_superseded=llm_settings.get('cancel_superseded', True)
+        )
+        self.dispatcher.reconfigure(config.current.llm_scheduling)
+
+    @classmethod
+    def from_config(cls, config: AnalysisConfig, scene_analyzer: SceneAnalyzer, client: OllamaClient = None,
+                    use_caches: bool = True, **kwargs) -> 'LLMPipeline':
+        """
+        根据配置创建客户端、回复缓存、近似场景缓存和上下文会话，并注册配置热加载
+        client: 传入时使用该客户端（如指向本地桩服务），否则按 llm_settings 创建
+        use_caches: 是否按配置启用回复缓存和近似场景缓存（压测时通常关闭）
+        """
+        cfg = config.current
+
+        # LLM客户端（连接池复用，超时与重试参数来自 llm_settings，随配置热加载更新）
+        if client is None:
+            client = OllamaClient.from_settings(cfg.llm_settings)
+            config.add_listener(lambda c: client.update_settings(c.llm_settings))
+
+        # 上下文复用：同一任务类型的后续请求复用 Ollama 返回的 context，只发送时序变化
+        context_settings = cfg.llm_settings.get('context_reuse', {})
+        context_session = None
+        if context_settings.get('enabled', False):
+            context_session = ContextSession.from_settings(context_settings)
+            config.add_listener(lambda c: context_session.reconfigure(c.llm_settings.get('context_reuse')))
+
+        # LLM回复缓存（SQLite持久化，重启后仍可命中）
+        cache_settings = cfg.response_cache
+        response_cache = None
+        if use_caches and cache_settings.get('enabled', False):
+            cache_path = cache_settings.get('path', 'cache/llm_response_cache.sqlite3')
+            if not os.path.isabs(cache_path):
+                cache_path = os.path.join(PROJECT_DIR, cache_path)
+            response_cache = ResponseCache(
+                cache_path,
+                max_entries=cache_settings.get('max_entries', 2000),
+                ttl_seconds=cache_settings.get('ttl_seconds', 7 * 24 * 3600),
+                memory_entries=cache_settings.get('memory_entries', 256)
+            )
+
+        # 近似场景缓存：场景向量余弦相似度超过阈值时复用回复（如只多了一个cup）
+        similarity_settings = cfg.similarity_cache
+        similarity_cache = None
+        if use_caches and similarity_settings.get('enabled', False):
+            similarity_cache = SimilarityCache(
+                SceneEmbedder(region_weight=similarity_settings.get('region_weight', 0.5)),
+                threshold=similarity_settings.get('threshold', 0.95),
+                max_entries=similarity_settings.get('max_entries', 20000)
+            )
+
+        pipeline = cls(config, scene_analyzer, client, response_cache=response_cache,
+                       similarity_cache=similarity_cache, context_session=context_session, **kwargs)
+        config.add_listener(lambda c: pipeline.dispatcher.reconfigure(c.llm_scheduling))
+        return pipeline
+
+    def submit_scene(self, structured_data: Dict[str, Any], temporal_analysis: Dict[str, Any],
+                     frame_idx: int = None) -> Optional[LLMRequest]:
+        """
+        提交周期性场景分析：按场景的 default_task 选择任务类型，创建压缩后的prompt，
+        提交到该任务的周期性通道（替换所有周期性通道中排队的旧prompt，并取消仍在进行的旧周期性请求）
+        命中回复缓存或近似场景缓存时直接交付，不进入调度队列
+        画面中没有物体时不提交，返回 None
+        """
+        if not structured_data['objects']:
+            return None
+
+        task_type = self.config.current.get_default_task(structured_data['scene_id'])
+        snapshot = {
+            'frame_idx': frame_idx,
+            'scene': structured_data['scene'],
+            'scene_id': structured_data['scene_id'],
+            'objects': sorted(obj['class'] for obj in structured_data['objects']),
+            'timestamp': structured_data['timestamp'],
+            'cache_key': make_cache_key(structured_data, task_type),
+            'structured_data': structured_data,
+            'embedding': self.similarity_cache.embed(structured_data) if self.similarity_cache is not None else None
+        }
+
+        # 缓存在提交线程中查询（亚毫秒级），命中时不必排在进行中的生成之后
+        cached = self.lookup_cache(task_type, snapshot)
+        if cached is not None:
+            template = self.config.current.get_output_template(task_type)
+            if template is not None:
+                snapshot['structured'] = parse_json_response(cached)
+            # 模型没有看到本次场景，下一次请求改为发送完整prompt
+            if self.context_session is not None:
+                self.context_session.reset(task_type)
+            return self.dispatcher.complete(task_type, cached, snapshot=snapshot)
+
+        # 创建压缩后的语义化prompt（合并重复物体、按优先物体排序、限制token预算）
+        log_stats = self.verbose and prompt_logger.isEnabledFor(logging.INFO)
+        start = metrics.start()
+        prompt, prompt_stats = self.scene_analyzer.create_compact_prompt(structured_data, task_type,
+                                                                         include_baseline=log_stats)
+        metrics.stop(STAGE_PROMPT, start)
+        if log_stats:
+            prompt_logger.info("token数 %s -> %d（预算 %s）", prompt_stats['tokens_before'],
+                               prompt_stats['tokens_after'], prompt_stats['token_budget'], extra={'data': prompt_stats})
+
+        # 添加时序变化信息
+        if temporal_analysis['changes'] != '首次检测':
+            prompt += f"\n\n[时序变化]：{temporal_analysis['changes']}"
+
+        return self.dispatcher.submit(prompt, task_type, snapshot=snapshot)
+
+    def submit_question(self, question: str, scene_data: Dict[str, Any] = None, frame_idx: int = None) -> LLMRequest:
+        """
+        提交用户提问：结合最新场景，以用户优先级提交（回答取决于问题，不查询缓存）
+        """
+        cfg = self.config.current
+        task_type = cfg.get_default_task(scene_data['scene_id']) if scene_data else DEFAULT_TASK_TYPE
+        if scene_data and scene_data['objects']:
+            prompt, _ = self.scene_analyzer.create_compact_prompt(scene_data, task_type)
+        else:
+            prompt = "当前画面中未检测到物体。"
+        prompt += f"\n\n[用户问题]：{question}\n请结合当前场景直接回答用户的问题。"
+
+        return self.dispatcher.submit(prompt, task_type, source=SOURCE_USER, snapshot={
+            'frame_idx': frame_idx,
+            'scene': scene_data['scene'] if scene_data else cfg.get_scene_name(None),
+            'scene_id': scene_data['scene_id'] if scene_data else None,
+            'question': question
+        })
+
+    def handle(self, request: LLMRequest) -> str:
+        """
+        在调度器工作线程中执行一次LLM请求，返回回复文本
+        JSON输出格式的任务另把解析后的字段放入 request.snapshot['structured']
+        """
+        template = self.config.current.get_output_template(request.task_type)
+        response = self._generate(request, template)
+        if template is not None and response:
+            request.snapshot['structured'] = parse_json_response(response)
+        return response
+
+    def lookup_cache(self, task_type: str, snapshot: Dict[str, Any]) -> Optional[str]:
+        """
+        依次查询回复缓存和近似场景缓存，命中时在 snapshot 中标记来源并返回回复
+        """
+        # 相同场景、任务和物体分布的请求直接返回缓存的回复
+        cache_key = snapshot.get('cache_key')
+        if self.response_cache is not None and cache_key:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                snapshot['cached'] = True
+                return cached
+
+        # 精确缓存未命中时查找近似场景
+        embedding = snapshot.get('embedding')
+        if self.similarity_cache is not None and embedding is not None:
+            similar = self.similarity_cache.lookup(embedding, task_type, snapshot.get('scene_id'))
+            if similar is not None:
+                response, similarity = similar
+                snapshot['similar_cached'] = similarity
+                return response
+        return None
+
+    def _generate(self, request: LLMRequest, template: Optional[Dict[str, Any]]) -> str:
+        """
+        调用 Ollama 生成回复（缓存已在提交时查询过）
+        """
+        # 根据任务类型添加配置中的系统提示
+        cfg = self.config.current
+        system_prompt = cfg.get_system_prompt(request.task_type)
+        full_prompt = f"{system_prompt}\n\n{request.prompt}"
+        if template is not None:
+            full_prompt += f"\n\n{format_instruction(template)}"
+
+        # 可复用上下文时只发送增量prompt（仅周期性分析，用户提问总是发送完整prompt）
+        prompt, context = full_prompt, None
+        if self.context_session is not None and request.source == SOURCE_PERIODIC:
+            # 增量相对于 context 实际对应的场景计算（中间被替换或取消的请求模型并未看到）
+            current_data = request.snapshot.get('structured_data')
+            build_delta = None
+            if current_data is not None:
+                build_delta = lambda basis: self.scene_analyzer.create_delta_prompt(
+                    current_data, basis, self.scene_analyzer.analyze_temporal_changes(current_data, basis))
+            prompt, context = self.context_session.prepare(request.task_type, full_prompt, build_delta)
+            if context is not None and template is not None:
+                prompt += "\n请按之前的JSON格式输出。"
+
+        # 任务的生成预算（num_predict、stop、temperature 等）
+        generation = cfg.get_generation(request.task_type)
+        options = to_ollama_options(generation)
+        hide_reasoning = cfg.llm_settings.get('hide_reasoning', True)
+        # 按长度提前结束会断开连接，拿不到 Ollama 最终数据块中的 context；要建立可复用 context 的
+        # 完整prompt不提前结束，长度只由 num_predict / stop 限制
+        max_answer_chars = generation.get('max_answer_chars') if template is None else None
+        if self.context_session is not None and request.source == SOURCE_PERIODIC and context is None:
+            max_answer_chars = None
+
+        start = metrics.start()
+        try:
+            # JSON输出要求 Ollama 约束格式；不按长度截断，根对象完整时结束
+            output_format = 'json' if template is not None else None
+            if not self.client.stream:
+                # 传入句柄，抢占和截止时间在非流式模式下同样能中断生成
+                result = self.client.generate(prompt, options=options, context=context, output_format=output_format,
+                                              handle=request.handle)
+                if hide_reasoning:
+                    result['response'] = strip_reasoning(result['response'])
+            else:
+                result = self._stream(request, prompt, context, options,
+                                      ReasoningFilter() if hide_reasoning else None, max_answer_chars,
+                                      template is not None)
+        except Exception:
+            self.reset_context(request)
+            raise
+
+        # LLM往返耗时（只统计实际调用模型的请求，不含缓存命中）
+        metrics.stop(STAGE_LLM, start)
+        request.snapshot['ttft'] = result.get('ttft')
+        if result.get('cancelled'):
+            self.reset_context(request)
+            return result['response']
+
+        if self.context_session is not None and request.source == SOURCE_PERIODIC:
+            self.context_session.record(request.task_type, result, reused=context is not None,
+                                        basis=request.snapshot.get('structured_data'))
+        if self.verbose and result.get('prompt_eval_duration') is not None:
+            llm_logger.info("prefill耗时 %.0f ms（%d tokens，%s）", result['prompt_eval_duration'] / 1e6,
+                            result.get('prompt_eval_count', 0), '复用上下文' if context is not None else '完整prompt')
+        # 增量prompt的回复依赖之前的对话，不能作为该场景完整prompt的回复缓存
+        if context is None:
+            self.cache_response(request, result['response'])
+        return result['response']
+
+    def _stream(self, request: LLMRequest, prompt: str, context, options: Dict[str, Any],
+                reasoning_filter: ReasoningFilter, max_answer_chars: int, structured: bool) -> Dict[str, Any]:
+        """
+        流式生成，只有最新的请求把增量输出交给 on_stream
+        JSON输出时增量解析，分析、建议等字段完整后立即交出，不显示原始JSON
+        """
+        def visible():
+            return self.on_stream is not None and self.dispatcher.is_latest(request)
+
+        def on_value(path, value):
+            if not visible():
+                return
+            text = structured_update(path, value)
+            if text is not None:
+                self.on_stream('delta', text)
+            if len(path) >= 2 and path[-2] == 'suggestions' and isinstance(path[-1], int):
+                self.on_stream('suggestion', str(value))
+
+        parser = JsonStreamParser(on_value) if structured else None
+
+        def push_token(text):
+            if parser is not None:
+                parser.feed(text)
+            elif visible():
+                self.on_stream('delta', text)
+
+        if visible():
+            self.on_stream('reset', format_snapshot_tag(request.snapshot))
+        return self.client.stream_generate(prompt, on_token=push_token, handle=request.handle, options=options,
+                                           context=context, reasoning_filter=reasoning_filter,
+                                           max_answer_chars=max_answer_chars,
+                                           output_format='json' if structured else None,
+                                           should_stop=(lambda: parser.done) if parser is not None else None)
+
+    def reset_context(self, request: LLMRequest):
+        """
+        模型没有看到本次场景（命中缓存、被取消或失败）时丢弃该任务的 context，
+        下一次请求改为发送完整prompt
+        """
+        if self.context_session is not None and request.source == SOURCE_PERIODIC:
+            self.context_session.reset(request.task_type)
+
+    def cache_response(self, request: LLMRequest, response: str):
+        """
+        把完整的回复写入缓存
+        """
+        if not response:
+            return
+        cache_key = request.snapshot.get('cache_key')
+        if self.response_cache is not None and cache_key:
+            self.response_cache.put(cache_key, response, meta={
+                'scene': request.snapshot.get('scene'),
+                'task_type': request.task_type
+            })
+        embedding = request.snapshot.get('embedding')
+        if self.similarity_cache is not None and embedding is not None:
+            self.similarity_cache.add(embedding, response, request.task_type, request.snapshot.get('scene_id'))
+
+    def print_stats(self, result: LLMResult):
+        """
+        记录本次结果的端到端耗时以及缓存和上下文复用统计
+        """
+        latency = self.dispatcher.get_latency_stats().get(result.request.lane)
+        if latency is not None:
+            llm_logger.info("%s 端到端耗时 %.2f s（平均 %.2f s，最大 %.2f s，共 %d 次）", result.request.lane,
+                            result.latency, latency['avg'], latency['max'], latency['count'])
+        if result.snapshot.get('ttft') is not None:
+            llm_logger.info("首个token耗时 %.0f ms", result.snapshot['ttft'] * 1000)
+
+        if self.response_cache is not None:
+            stats = self.response_cache.get_stats()
+            cache_logger.info("回复缓存命中率 %.1f%%（命中 %d，未命中 %d）", stats['hit_rate'] * 100, stats['hits'],
+                              stats['misses'])
+        if self.similarity_cache is not None:
+            stats = self.similarity_cache.get_stats()
+            cache_logger.info("相似缓存命中率 %.1f%%（命中 %d，未命中 %d，条目 %d）", stats['hit_rate'] * 100,
+                              stats['hits'], stats['misses'], stats['entries'])
+        if self.context_session is not None:
+            stats = self.context_session.get_stats()
+            cache_logger.info("上下文复用平均prefill：完整prompt %.0f ms（%d 次），增量 %.0f ms（%d 次），"
+                              "重置 %d 次，提前结束 %d 次", stats['full']['avg_prefill_ms'], stats['full']['calls'], stats['delta']['avg_prefill_ms'],
+                              stats['delta']['calls'], stats['reset_count'], stats['stopped_early'])
+
+    def close(self):
+        """
+        停止调度器并关闭缓存和连接池
+        """
+        self.dispatcher.stop()
+        if self.response_cache is not None:
+            self.response_cache.close()
+        self.client.close()
+
+    def get_debug_info(self) -> Dict[str, Any]:
+        """
+        获取调试信息
+        """
+        return {
+            'dispatcher': self.dispatcher.get_debug_info(),
+            'client': self.client.get_debug_info(),
+            'response_cache': self.response_cache.get_stats() if self.response_cache is not None else None,
+            'similarity_cache': self.similarity_cache.get_stats() if self.similarity_cache is not None else None,
+            'context_reuse': self.context_session.get_stats() if self.context_session is not None else None,
+            'latency': metrics.snapshot([STAGE_PROMPT, STAGE_LLM])
+        }
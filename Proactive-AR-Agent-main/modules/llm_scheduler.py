@@ -0,0 +1,101 @@
+import time
+from typing import Dict, Any, Iterable
+
+
+def class_change_score(previous_classes: Iterable[str], current_classes: Iterable[str]) -> float:
+    """
+    两组物体类别之间的变化分数：新增与移除的类别数 / 类别并集大小（0~1）
+    """
+    previous = set(previous_classes)
+    current = set(current_classes)
+    union = previous | current
+    if not union:
+        return 0.0
+    return len(previous ^ current) / len(union)
+
+
+class ChangeTriggeredScheduler:
+    def __init__(self, threshold: float = 0.3, min_interval: float = 1.0, max_interval: float = 15.0,
+                 debounce: float = 0.5):
+        """
+        变化触发的LLM调度：场景变化分数超过阈值并持续 debounce 秒后触发，
+        两次触发间隔不小于 min_interval，无变化时最长 max_interval 触发一次
+        threshold: 变化分数阈值（对应 temporal_analysis.change_detection_threshold）
+        min_interval / max_interval: 最小 / 最大触发间隔（秒）
+        debounce: 变化需持续的时间（秒），过滤单帧抖动
+        """
+        self.threshold = threshold
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.debounce = debounce
+
+        self.last_trigger_time = None
+        self.change_since = None
+        self.last_reason = None
+        self.trigger_counts = {'initial': 0, 'change': 0, 'max_interval': 0}
+
+    @classmethod
+    def from_config(cls, scheduling_config: Dict[str, Any], threshold: float = 0.3) -> 'ChangeTriggeredScheduler':
+        """
+        根据 llm_scheduling 配置创建调度器
+        """
+        scheduler = cls(threshold=threshold)
+        scheduler.reconfigure(scheduling_config, threshold)
+        return scheduler
+
+    def reconfigure(self, scheduling_config: Dict[str, Any], threshold: float = None):
+        """
+        应用新的调度参数（配置热加载时调用），保留触发状态
+        """
+        scheduling_config = scheduling_config or {}
+        if threshold is not None:
+            self.threshold = threshold
+        self.min_interval = scheduling_config.get('min_interval_seconds', self.min_interval)
+        self.max_interval = scheduling_config.get('max_interval_seconds', self.max_interval)
+        self.debounce = scheduling_config.get('debounce_seconds', self.debounce)
+
+    def update(self, change_score: float, now: float = None) -> str:
+        """
+        输入当前变化分数（每帧调用），需要触发LLM时返回触发原因，否则返回 None
+        触发原因：'initial'（首次）、'change'（场景变化）、'max_interval'（超过最大间隔）
+        """
+        now = time.time() if now is None else now
+
+        # 记录变化持续的起始时间（去抖）
+        if change_score >= self.threshold:
+            if self.change_since is None:
+                self.change_since = now
+        else:
+            self.change_since = None
+
+        if self.last_trigger_time is None:
+            return self._trigger(now, 'initial')
+
+        elapsed = now - self.last_trigger_time
+        if elapsed < self.min_interval:
+            return None
+        if self.change_since is not None and now - self.change_since >= self.debounce:
+            return self._trigger(now, 'change')
+        if elapsed >= self.max_interval:
+            return self._trigger(now, 'max_interval')
+        return None
+
+    def _trigger(self, now: float, reason: str) -> str:
+        self.last_trigger_time = now
+        self.change_since = None
+        self.last_reason = reason
+        self.trigger_counts[reason] += 1
+        return reason
+
+    def get_debug_info(self) -> Dict[str, Any]:
+        """
+        获取调试信息
+        """
+        return {
+            'threshold': self.threshold,
+            'min_interval': self.min_interval,
+            'max_interval': self.max_interval,
+            'debounce': self.debounce,
+            'last_reason': self.last_reason,
+            'trigger_counts': dict(self.trigger_counts)
+        }
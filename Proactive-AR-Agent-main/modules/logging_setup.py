@@ -0,0 +1,227 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Any, Optional
+
+# 所有模块日志的根名称，类别为其下一级名称（如 proactive_ar.frame）
+LOGGER_NAME = 'proactive_ar'
+
+LOG_FORMAT_TEXT = 'text'
+LOG_FORMAT_JSON = 'json'
+
+
+def get_logger(category: str) -> logging.Logger:
+    """
+    获取某个类别的日志器，如 get_logger('frame')、get_logger('frame.detail')
+    """
+    return logging.getLogger(f"{LOGGER_NAME}.{category}")
+
+
+def _category(record: logging.LogRecord) -> str:
+    if record.name.startswith(LOGGER_NAME + '.'):
+        return record.name[len(LOGGER_NAME) + 1:]
+    return record.name
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, rates: Dict[str, float] = None):
+        """
+        按类别限速：rates 为 类别 -> 每秒最多记录数（令牌桶，允许短时突发到该数量）
+        子类别未配置时使用父类别的限速（frame.detail -> frame），0 或未配置表示不限速
+        被丢弃的条数累计到下一条记录的 suppressed 字段
+        """
+        super().__init__()
+        self._lock = threading.Lock()
+        self.rates = {}
+        self._buckets = {}  # 类别 -> [令牌数, 上次补充时间, 被丢弃条数]
+        self.suppressed_total = {}
+        self.set_rates(rates)
+
+    def set_rates(self, rates: Dict[str, float] = None):
+        with self._lock:
+            self.rates = dict(rates or {})
+            self._buckets.clear()
+
+    def _rate_for(self, category: str) -> Optional[float]:
+        while True:
+            rate = self.rates.get(category)
+            if rate is not None or '.' not in category:
+                return rate
+            category = category.rsplit('.', 1)[0]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        category = _category(record)
+        rate = self._rate_for(category)
+        if not rate or rate <= 0:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(category)
+            if bucket is None:
+                bucket = self._buckets[category] = [max(1.0, rate), now, 0]
+            bucket[0] = min(max(1.0, rate), bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if bucket[0] < 1.0:
+                bucket[2] += 1
+                self.suppressed_total[category] = self.suppressed_total.get(category, 0) + 1
+                return False
+            bucket[0] -= 1.0
+            record.suppressed = bucket[2]
+            bucket[2] = 0
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        """
+        文本格式：时间 级别 [类别] 消息（有被限速丢弃的记录时附加条数）
+        """
+        super().__init__('%(asctime)s %(levelname)s [%(category)s] %(message)s', '%H:%M:%S')
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.category = _category(record)
+        text = super().format(record)
+        if getattr(record, 'suppressed', 0):
+            text += f"（此前省略 {record.suppressed} 条）"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        机器可读格式：每条记录一行JSON，extra={'data': {...}} 中的字段合并到记录中
+        """
+        entry = {
+            'time': round(record.created, 3),
+            'level': record.levelname,
+            'category': _category(record),
+            'message': record.getMessage()
+        }
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        data = getattr(record, 'data', None)
+        if isinstance(data, dict):
+            entry.update(data)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        不在调用线程中格式化：原样入队，由监听线程格式化并写出
+        （只用于进程内队列，记录参数应为之后不再修改的对象）
+        """
+        return record
+
+
+class LogManager:
+    def __init__(self, level: str = 'INFO', log_format: str = LOG_FORMAT_TEXT, path: str = None,
+                 rate_limits: Dict[str, float] = None, frame_detail: bool = False, queue_size: int = 10000):
+        """
+        日志层：调用线程只做级别判断、限速和入队，格式化与写出在 QueueListener 线程中完成
+        level: 根日志级别
+        log_format: text 或 json（机器可读）
+        path: 日志文件路径，为空时写到标准输出
+        rate_limits: 类别 -> 每秒最多记录数
+        frame_detail: 是否输出逐帧详情（frame.detail 类别的 DEBUG 记录）
+        queue_size: 队列容量，写出跟不上时丢弃新记录而不阻塞调用线程
+        """
+        self.logger = logging.getLogger(LOGGER_NAME)
+        self.logger.propagate = False
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.rate_filter = RateLimitFilter(rate_limits)
+        self.handler = DeferredQueueHandler(self.queue)
+        self.handler.addFilter(self.rate_filter)
+        self.dropped = 0
+
+        self.path = path
+        if path:
+            self.output = logging.FileHandler(path, encoding='utf-8')
+        else:
+            self.output = logging.StreamHandler(sys.stdout)
+        self.listener = QueueListener(self.queue, self.output, respect_handler_level=False)
+
+        self.log_format = None
+        self.set_format(log_format)
+        self.set_levels(level, frame_detail)
+        self.logger.addHandler(self.handler)
+        # 队列已满时 QueueHandler 会走 handleError，这里改为计数后丢弃
+        self.handler.handleError = self._on_queue_full
+        self._started = False
+
+    @classmethod
+    def from_config(cls, logging_config: Dict[str, Any]) -> 'LogManager':
+        """
+        根据 logging 配置创建日志层并启动写出线程
+        """
+        logging_config = logging_config or {}
+        manager = cls(
+            level=logging_config.get('level', 'INFO'),
+            log_format=logging_config.get('format', LOG_FORMAT_TEXT),
+            path=logging_config.get('file'),
+            rate_limits=logging_config.get('rate_limits'),
+            frame_detail=logging_config.get('frame_detail', False),
+            queue_size=logging_config.get('queue_size', 10000)
+        )
+        return manager.start()
+
+    def reconfigure(self, logging_config: Dict[str, Any]):
+        """
+        应用新的级别、格式和限速（配置热加载时调用），输出文件不变
+        """
+        logging_config = logging_config or {}
+        self.set_format(logging_config.get('format', self.log_format))
+        self.set_levels(logging_config.get('level', 'INFO'), logging_config.get('frame_detail', False))
+        self.rate_filter.set_rates(logging_config.get('rate_limits'))
+
+    def set_format(self, log_format: str):
+        if log_format not in (LOG_FORMAT_TEXT, LOG_FORMAT_JSON):
+            log_format = LOG_FORMAT_TEXT
+        if log_format != self.log_format:
+            self.output.setFormatter(JsonFormatter() if log_format == LOG_FORMAT_JSON else TextFormatter())
+            self.log_format = log_format
+
+    def set_levels(self, level: str, frame_detail: bool):
+        self.logger.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+        get_logger('frame.detail').setLevel(logging.DEBUG if frame_detail else logging.WARNING)
+
+    def _on_queue_full(self, record: logging.LogRecord):
+        self.dropped += 1
+
+    def start(self) -> 'LogManager':
+        if not self._started:
+            self.listener.start()
+            self._started = True
+            atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        """
+        写出队列中剩余的记录并停止写出线程
+        """
+        if self._started:
+            self._started = False
+            self.listener.stop()
+            self.output.flush()
+
+    def get_debug_info(self) -> Dict[str, Any]:
+        """
+        获取调试信息
+        """
+        return {
+            'level': logging.getLevelName(self.logger.level),
+            'format': self.log_format,
+            'path': self.path,
+            'queued': self.queue.qsize(),
+            'dropped_queue_full': self.dropped,
+            'rate_limits': dict(self.rate_filter.rates),
+            'suppressed': dict(self.rate_filter.suppressed_total)
+        }
@@ -0,0 +1,261 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List
+
+from modules.prompt_compactor import estimate_tokens
+
+# 默认回答（按约2个字符一个token切分后逐个输出）
+DEFAULT_ANSWER = (
+    "当前场景中的物体分布较为稳定。建议保持桌面整洁，把常用物品放在顺手的位置。"
+    "如果接下来准备做饭，可以先检查冰箱里的食材，再预热烤箱。"
+)
+
+
+# format 为 json 时的默认回答
+DEFAULT_JSON_ANSWER = {
+    "scene": "厨房",
+    "objects": ["oven", "cup", "bowl"],
+    "analysis": "用户可能正在准备做饭。",
+    "suggestions": ["先预热烤箱", "把杯子放回柜子", "准备好碗筷"],
+    "confidence": 0.8
+}
+
+
+def split_tokens(text: str, chars_per_token: int = 2) -> List[str]:
+    """
+    把文本切成近似token的片段
+    """
+    return [text[i:i + chars_per_token] for i in range(0, len(text), chars_per_token)]
+
+
+class MockOllamaServer:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, tokens_per_second: float = 40.0,
+                 prefill_latency: float = 0.2, prefill_per_token: float = 0.0005, failure_rate: float = 0.0,
+                 failure_status: int = 503, think_tokens: int = 0, answer: str = DEFAULT_ANSWER, seed: int = None):
+        """
+        本地 Ollama 替身：实现 /api/generate（流式和非流式），用于无模型环境下的测试和压测
+        port: 监听端口，0 表示自动分配（见 url）
+        tokens_per_second: 生成速度
+        prefill_latency / prefill_per_token: 首个token前的固定延迟 / 每个prompt token的prefill耗时（秒）
+        failure_rate: 请求失败的概率，失败时返回 failure_status
+        think_tokens: 回答前输出的 <think> 思考过程token数（模拟 deepseek-r1）
+        """
+        self.tokens_per_second = tokens_per_second
+        self.prefill_latency = prefill_latency
+        self.prefill_per_token = prefill_per_token
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.think_tokens = think_tokens
+        self.answer = answer
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'requests': 0,
+            'streamed': 0,
+            'failures': 0,
+            'completed': 0,
+            'disconnected': 0
+        }
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                if self.path != '/api/generate':
+                    self._send_json(404, {'error': f"unknown path {self.path}"})
+                    return
+                length = int(self.headers.get('Content-Length', 0))
+                server.handle_generate(self, json.loads(self.rfile.read(length) or b'{}'))
+
+            def do_GET(self):
+                if self.path == '/api/tags':
+                    self._send_json(200, {'models': [{'name': 'mock'}]})
+                else:
+                    self._send_json(404, {'error': f"unknown path {self.path}"})
+
+            def _send_json(self, status: int, body: Dict[str, Any]):
+                data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'MockOllamaServer':
+        """
+        在后台线程中启动服务
+        """
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        停止服务
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def __enter__(self) -> 'MockOllamaServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def build_tokens(self, options: Dict[str, Any], output_format: Any = None) -> List[str]:
+        """
+        生成本次回复的token序列：思考过程 + 回答，受 num_predict 和 stop 约束
+        output_format 不为空时回答为JSON（不输出思考过程）
+        """
+        if output_format:
+            tokens = split_tokens(json.dumps(DEFAULT_JSON_ANSWER, ensure_ascii=False, indent=2), 3)
+            # 与真实 Ollama 一样，JSON结束后可能继续输出空白
+            tokens.extend(["\n"] * 20)
+            num_predict = options.get('num_predict')
+            return tokens[:num_predict] if num_predict is not None and num_predict >= 0 else tokens
+
+        tokens = []
+        if self.think_tokens > 0:
+            tokens.append("<think>")
+            tokens.extend(["思考"] * self.think_tokens)
+            tokens.append("</think>")
+            tokens.append("\n\n")
+        tokens.extend(split_tokens(self.answer))
+
+        num_predict = options.get('num_predict')
+        if num_predict is not None and num_predict >= 0:
+            tokens = tokens[:num_predict]
+
+        stops = options.get('stop') or []
+        if stops:
+            text = ""
+            for i, token in enumerate(tokens):
+                text += token
+                if any(stop in text for stop in stops):
+                    return tokens[:i]
+        return tokens
+
+    def handle_generate(self, handler: BaseHTTPRequestHandler, body: Dict[str, Any]):
+        self._count('requests')
+        with self._lock:
+            failed = self._random.random() < self.failure_rate
+        if failed:
+            self._count('failures')
+            handler._send_json(self.failure_status, {'error': 'injected failure'})
+            return
+
+        options = body.get('options') or {}
+        context = list(body.get('context') or [])
+        prompt_tokens = estimate_tokens(body.get('prompt', ''))
+        tokens = self.build_tokens(options, body.get('format'))
+
+        # 模拟prefill：带 context 的请求只需处理新增的prompt
+        prefill = self.prefill_latency + prompt_tokens * self.prefill_per_token
+        interval = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        final = {
+            'model': body.get('model', 'mock'),
+            'response': '',
+            'done': True,
+            'done_reason': 'stop',
+            'context': context + list(range(prompt_tokens + len(tokens))),
+            'prompt_eval_count': prompt_tokens,
+            'prompt_eval_duration': int(prefill * 1e9),
+            'eval_count': len(tokens),
+            'eval_duration': int(len(tokens) * interval * 1e9)
+        }
+        time.sleep(prefill)
+
+        if not body.get('stream', True):
+            time.sleep(len(tokens) * interval)
+            final['response'] = ''.join(tokens)
+            handler._send_json(200, final)
+            self._count('completed')
+            return
+
+        self._count('streamed')
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/x-ndjson')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+        try:
+            for token in tokens:
+                self._write_chunk(handler, {'model': final['model'], 'response': token, 'done': False})
+                time.sleep(interval)
+            self._write_chunk(handler, final)
+            handler.wfile.write(b"0\r\n\r\n")
+            handler.wfile.flush()
+            self._count('completed')
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端取消生成时会关闭连接
+            self._count('disconnected')
+            handler.close_connection = True
+
+    @staticmethod
+    def _write_chunk(handler: BaseHTTPRequestHandler, body: Dict[str, Any]):
+        data = (json.dumps(body, ensure_ascii=False) + "\n").encode('utf-8')
+        handler.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        handler.wfile.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取请求统计
+        """
+        with self._lock:
+            return dict(self.stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 Ollama 替身服务（/api/generate）")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--tps', type=float, default=40.0, help="每秒生成的token数")
+    parser.add_argument('--latency', type=float, default=0.2, help="首个token前的固定延迟（秒）")
+    parser.add_argument('--prefill-per-token', type=float, default=0.0005, help="每个prompt token的prefill耗时（秒）")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="请求失败概率（0~1）")
+    parser.add_argument('--failure-status', type=int, default=503)
+    parser.add_argument('--think-tokens', type=int, default=0, help="回答前输出的思考过程token数")
+    args = parser.parse_args()
+
+    server = MockOllamaServer(
+        args.host, args.port, tokens_per_second=args.tps, prefill_latency=args.latency,
+        prefill_per_token=args.prefill_per_token, failure_rate=args.failure_rate,
+        failure_status=args.failure_status, think_tokens=args.think_tokens
+    )
+    print(f"Mock Ollama 已启动: {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f"请求统计: {server.get_stats()}")
+
+
+if __name__ == '__main__':
+    main()
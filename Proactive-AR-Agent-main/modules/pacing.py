@@ -0,0 +1,150 @@
+import time
+from typing import Dict, Any
+
+from modules.logging_setup import get_logger
+
+PACING_REALTIME = 'realtime'
+PACING_MAX = 'max'
+PACING_FIXED = 'fixed'
+PACING_MODES = (PACING_REALTIME, PACING_MAX, PACING_FIXED)
+
+logger = get_logger('pacing')
+
+# 无法读取源帧率时使用
+DEFAULT_SOURCE_FPS = 30.0
+
+
+class PacingController:
+    def __init__(self, mode: str = PACING_REALTIME, fixed_fps: float = 15.0, max_lag_frames: float = 1.0):
+        """
+        按视频时钟控制读帧节奏，替代固定的 sleep
+        - realtime: 第 i 帧在 开始时间 + i / 源帧率 时处理，提前则等待，落后超过 max_lag_frames 帧则丢帧
+        - max: 不等待也不丢帧，尽快处理
+        - fixed: 以 fixed_fps 的固定速率处理每一帧（不丢帧）
+        所有模式都统计相对视频时钟的延迟（正值表示处理落后于视频）
+        """
+        self.mode = PACING_REALTIME
+        self.fixed_fps = fixed_fps
+        self.max_lag_frames = max_lag_frames
+        self.set_mode(mode)
+
+        self.source_fps = DEFAULT_SOURCE_FPS
+        self._start = None
+        self._processed = 0
+        self.frame_index = -1
+        self.stats = {}
+        self._reset_stats()
+
+    @classmethod
+    def from_config(cls, pacing_config: Dict[str, Any]) -> 'PacingController':
+        """
+        根据 pacing 配置创建节奏控制器
+        """
+        pacer = cls()
+        pacer.reconfigure(pacing_config)
+        return pacer
+
+    def reconfigure(self, pacing_config: Dict[str, Any]):
+        """
+        应用新的节奏参数（配置热加载时调用），切换模式时重新对齐视频时钟
+        """
+        pacing_config = pacing_config or {}
+        self.fixed_fps = pacing_config.get('fixed_fps', self.fixed_fps)
+        self.max_lag_frames = pacing_config.get('max_lag_frames', self.max_lag_frames)
+        mode = pacing_config.get('mode', self.mode)
+        if mode != self.mode:
+            self.set_mode(mode)
+            self._start = None
+
+    def set_mode(self, mode: str):
+        if mode not in PACING_MODES:
+            logger.warning("未知的节奏模式 %s，使用 %s", mode, PACING_REALTIME)
+            mode = PACING_REALTIME
+        self.mode = mode
+
+    def _reset_stats(self):
+        self.stats = {
+            'processed': 0,
+            'dropped': 0,
+            'late': 0,
+            'sleep_seconds': 0.0,
+            'lag': 0.0,
+            'max_lag': 0.0,
+            'total_lag': 0.0
+        }
+
+    def start(self, source_fps: float = None):
+        """
+        开始一个新的视频源：记录源帧率，视频时钟从下一帧开始计时
+        """
+        self.source_fps = source_fps if source_fps and source_fps > 0 else DEFAULT_SOURCE_FPS
+        self._start = None
+        self._processed = 0
+        self.frame_index = -1
+        self._reset_stats()
+
+    def pace(self, frame_index: int) -> bool:
+        """
+        在读取第 frame_index 帧（从0开始）之前调用：需要时等待，返回 False 表示应跳过该帧
+        """
+        now = time.perf_counter()
+        if self._start is None:
+            # 以第一帧（或切换模式后的第一帧）对齐视频时钟
+            self._start = now - frame_index / self.source_fps
+            self._processed = 0
+
+        media_due = self._start + frame_index / self.source_fps
+        if self.mode == PACING_REALTIME:
+            if now - media_due > self.max_lag_frames / self.source_fps:
+                self.stats['dropped'] += 1
+                return False
+            due = media_due
+        elif self.mode == PACING_FIXED:
+            due = self._start + self._processed / self.fixed_fps if self.fixed_fps > 0 else now
+        else:
+            due = now
+
+        if due > now:
+            time.sleep(due - now)
+            self.stats['sleep_seconds'] += due - now
+            now = due
+
+        lag = now - media_due
+        self.frame_index = frame_index
+        self._processed += 1
+        self.stats['processed'] += 1
+        self.stats['lag'] = lag
+        self.stats['max_lag'] = max(self.stats['max_lag'], lag)
+        self.stats['total_lag'] += lag
+        if lag > 1.0 / self.source_fps:
+            self.stats['late'] += 1
+        return True
+
+    @property
+    def media_time(self) -> float:
+        """
+        最近处理的一帧在视频中的时间（秒）
+        """
+        return max(self.frame_index, 0) / self.source_fps
+
+    @property
+    def lag(self) -> float:
+        """
+        最近一帧相对视频时钟的延迟（秒）
+        """
+        return self.stats['lag']
+
+    def get_debug_info(self) -> Dict[str, Any]:
+        """
+        获取调试信息
+        """
+        processed = self.stats['processed']
+        seen = processed + self.stats['dropped']
+        return {
+            'mode': self.mode,
+            'source_fps': self.source_fps,
+            'fixed_fps': self.fixed_fps,
+            'avg_lag': self.stats['total_lag'] / processed if processed else 0.0,
+            'drop_rate': self.stats['dropped'] / seen if seen else 0.0,
+            'stats': dict(self.stats)
+        }
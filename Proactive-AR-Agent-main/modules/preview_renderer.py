@@ -0,0 +1,129 @@
+import time
+from typing import Dict, Any, List, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+from modules.instrumentation import metrics, STAGE_RENDER
+
+BOX_COLOR = (0, 255, 0)
+TEXT_COLOR = (0, 0, 0)
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 0.5
+FONT_THICKNESS = 1
+# 测量标签宽度时置信度部分的占位文本（Hershey 字体的数字等宽）
+CONF_PLACEHOLDER = "(0.00)"
+
+
+def position_label(center_x: float, center_y: float, width: int, height: int) -> str:
+    """
+    按中心点所在的三分区域返回位置描述，如 "左上"
+    """
+    relative_x = center_x / width * 100
+    relative_y = center_y / height * 100
+
+    if relative_x < 33:
+        x_position = "左"
+    elif relative_x < 66:
+        x_position = "中"
+    else:
+        x_position = "右"
+
+    if relative_y < 33:
+        y_position = "上"
+    elif relative_y < 66:
+        y_position = "中"
+    else:
+        y_position = "下"
+    return x_position + y_position
+
+
+class PreviewRenderer:
+    def __init__(self, width: int = 480, height: int = 360):
+        """
+        预览渲染器：先把帧缩小到预分配的预览缓冲区，再在预览分辨率上绘制检测框和标签
+        缩放、颜色转换和 PhotoImage 都复用同一块缓冲区，每帧开销与原始分辨率无关
+        """
+        self.width = width
+        self.height = height
+        self._bgr = np.zeros((height, width, 3), dtype=np.uint8)
+        self._rgba = np.zeros((height, width, 4), dtype=np.uint8)
+        # 与 _rgba 共享内存的 PIL 图像（RGBA 才能零拷贝），颜色转换写入 _rgba 后无需再拷贝
+        self._image = Image.frombuffer('RGBA', (width, height), self._rgba, 'raw', 'RGBA', 0, 1)
+        self._photo = None
+        # (类别, 位置) -> (标签宽, 标签高)
+        self._label_sizes = {}
+
+        self.stats = {
+            'frames': 0,
+            'detections': 0,
+            'label_cache_hits': 0,
+            'label_cache_misses': 0,
+            'total_render_ms': 0.0
+        }
+
+    def _label_size(self, class_name: str, position: str) -> Tuple[int, int]:
+        key = (class_name, position)
+        size = self._label_sizes.get(key)
+        if size is None:
+            self.stats['label_cache_misses'] += 1
+            size = cv2.getTextSize(f"{class_name} {position} {CONF_PLACEHOLDER}", FONT, FONT_SCALE, FONT_THICKNESS)[0]
+            self._label_sizes[key] = size
+        else:
+            self.stats['label_cache_hits'] += 1
+        return size
+
+    def render(self, frame: np.ndarray, detections: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        渲染一帧预览，返回预览缓冲区（RGBA，下次调用时会被覆盖）
+        """
+        start = time.perf_counter()
+        frame_height, frame_width = frame.shape[:2]
+        cv2.resize(frame, (self.width, self.height), dst=self._bgr, interpolation=cv2.INTER_LINEAR)
+        scale_x = self.width / frame_width
+        scale_y = self.height / frame_height
+
+        for detection in detections:
+            bbox = detection['bbox']  # [x1, y1, x2, y2]，原始分辨率
+            conf = detection.get('conf') or 0.0
+            position = position_label((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2, frame_width, frame_height)
+
+            x1, y1 = int(bbox[0] * scale_x), int(bbox[1] * scale_y)
+            x2, y2 = int(bbox[2] * scale_x), int(bbox[3] * scale_y)
+            cv2.rectangle(self._bgr, (x1, y1), (x2, y2), BOX_COLOR, 2)
+
+            label_width, label_height = self._label_size(detection['class'], position)
+            cv2.rectangle(self._bgr, (x1, y1 - label_height - 10), (x1 + label_width, y1), BOX_COLOR, -1)
+            cv2.putText(self._bgr, f"{detection['class']} {position} ({conf:.2f})", (x1, y1 - 5),
+                        FONT, FONT_SCALE, TEXT_COLOR, FONT_THICKNESS)
+
+        cv2.cvtColor(self._bgr, cv2.COLOR_BGR2RGBA, dst=self._rgba)
+        self.stats['frames'] += 1
+        self.stats['detections'] += len(detections)
+        elapsed = time.perf_counter() - start
+        self.stats['total_render_ms'] += elapsed * 1000
+        metrics.record(STAGE_RENDER, elapsed)
+        return self._rgba
+
+    def photo(self) -> ImageTk.PhotoImage:
+        """
+        把当前预览缓冲区贴到持久的 PhotoImage 上并返回（需在Tk主线程调用）
+        """
+        if self._photo is None:
+            self._photo = ImageTk.PhotoImage('RGBA', (self.width, self.height))
+        self._photo.paste(self._image)
+        return self._photo
+
+    def get_debug_info(self) -> Dict[str, Any]:
+        """
+        获取调试信息
+        """
+        frames = self.stats['frames']
+        return {
+            'size': (self.width, self.height),
+            'avg_render_ms': self.stats['total_render_ms'] / frames if frames else 0.0,
+            'label_cache_size': len(self._label_sizes),
+            'stats': dict(self.stats),
+            'latency': metrics.snapshot([STAGE_RENDER])
+        }
@@ -0,0 +1,65 @@
+import re
+from typing import List, Dict, Any
+
+# 粗略的token切分：每个汉字/全角符号计1个token，英文单词和数字按约4个字符1个token
+_TOKEN_PATTERN = re.compile(r'[　-〿㐀-鿿＀-￯]|[A-Za-z]+|\d+|[^\sA-Za-z\d]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的token数（不依赖分词器，用于比较压缩前后的长度）
+    """
+    tokens = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        if piece.isascii() and piece.isalnum():
+            tokens += (len(piece) + 3) // 4
+        else:
+            tokens += 1
+    return tokens
+
+
+def aggregate_objects(objects: List[Dict]) -> List[Dict[str, Any]]:
+    """
+    把重复类别合并为一条：数量、合并后的区域列表（按出现顺序去重）、最高置信度
+    """
+    aggregated = {}
+    for obj in objects:
+        entry = aggregated.get(obj['class'])
+        if entry is None:
+            entry = {'class': obj['class'], 'count': 0, 'regions': [], 'confidence': 0.0}
+            aggregated[obj['class']] = entry
+        entry['count'] += 1
+        region = obj.get('relative_position')
+        if region and region not in entry['regions']:
+            entry['regions'].append(region)
+        entry['confidence'] = max(entry['confidence'], obj.get('confidence', 0.0))
+    return list(aggregated.values())
+
+
+def order_objects(entries: List[Dict[str, Any]], priority_rank: Dict[str, int]) -> List[Dict[str, Any]]:
+    """
+    排序：场景的 priority_objects 在前（按配置顺序），其余按数量、置信度降序
+    """
+    unranked = len(priority_rank)
+    return sorted(entries, key=lambda e: (priority_rank.get(e['class'], unranked), -e['count'], -e['confidence']))
+
+
+def describe_entry(entry: Dict[str, Any]) -> str:
+    """
+    单条合并后物体的描述，如 cup×6（画面left侧bottom方、画面中央）
+    """
+    name = entry['class'] if entry['count'] == 1 else f"{entry['class']}×{entry['count']}"
+    if not entry['regions']:
+        return name
+    return f"{name}（{'、'.join(entry['regions'])}）"
+
+
+def dedupe_groups(groups: Dict[str, List[str]], group_names: Dict[str, str]) -> List[str]:
+    """
+    分组描述中每个类别只出现一次
+    """
+    descriptions = []
+    for group_name, group_objects in groups.items():
+        unique = list(dict.fromkeys(group_objects))
+        descriptions.append(f"{group_names.get(group_name, group_name)}：{', '.join(unique)}")
+    return descriptions
@@ -0,0 +1,66 @@
+import json
+from typing import Dict, Any, List
+
+from modules.frame_source import FrameSource
+
+
+def load_detection_fixture(path: str) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    读取检测记录（JSONL，每行 {"frame": 源帧序号, "detections": [...]}）
+    """
+    frames = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                frames[int(entry['frame'])] = entry.get('detections') or []
+    return frames
+
+
+class RecordedDetector:
+    def __init__(self, fixture_path: str):
+        """
+        回放检测器：按源帧序号返回记录的检测结果，视频帧仍由 FrameSource 解码
+        用于在没有 YOLO 的环境中复现和压测检测之后的流水线
+        """
+        self.fixture_path = fixture_path
+        self.detections = load_detection_fixture(fixture_path)
+        self.frame_count = 0
+        self.missing_frames = 0
+
+    def process_video_frame(self, video_path, pacer=None, source_options=None):
+        """
+        与 SimpleDetector.process_video_frame 接口相同；解码时缩小的帧会同比例缩放检测框
+        """
+        source = FrameSource.from_options(video_path, source_options, pacer=pacer)
+        if not source.open():
+            print(f"错误：无法打开视频文件: {video_path}")
+            return
+
+        out_width, out_height = source.output_size
+        scale_x = out_width / source.width if source.width else 1.0
+        scale_y = out_height / source.height if source.height else 1.0
+        for frame_index, timestamp, frame in source:
+            self.frame_count += 1
+            recorded = self.detections.get(frame_index)
+            if recorded is None:
+                self.missing_frames += 1
+                recorded = []
+            frame_detections = []
+            for det in recorded:
+                x1, y1, x2, y2 = det['bbox']
+                frame_detections.append(dict(det, bbox=[x1 * scale_x, y1 * scale_y, x2 * scale_x, y2 * scale_y]))
+            yield [det['class'] for det in frame_detections], frame_detections, frame
+
+    def get_debug_info(self):
+        """
+        获取调试信息
+        """
+        return {
+            'fixture_path': self.fixture_path,
+            'recorded_frames': len(self.detections),
+            'frame_count': self.frame_count,
+            'missing_frames': self.missing_frames,
+            'mode': 'recorded'
+        }
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+# 默认缓存文件路径
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'llm_response_cache.sqlite3')
+
+
+def canonicalize_scene(structured_data: Dict[str, Any], task_type: str) -> str:
+    """
+    把prompt的输入规范化为稳定的字符串：场景、任务类型、排序后的(类别, 区域)多重集
+    置信度、时间戳、检测顺序等不影响结果
+    """
+    counts = {}
+    for obj in structured_data.get('objects', []):
+        item = (obj['class'], obj.get('relative_position', ''))
+        counts[item] = counts.get(item, 0) + 1
+
+    canonical = {
+        'scene': structured_data.get('scene_id') or structured_data.get('scene'),
+        'task_type': task_type,
+        'objects': sorted([cls, region, n] for (cls, region), n in counts.items())
+    }
+    return json.dumps(canonical, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+def make_cache_key(structured_data: Dict[str, Any], task_type: str) -> str:
+    """
+    生成缓存键
+    """
+    return hashlib.sha1(canonicalize_scene(structured_data, task_type).encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 2000, ttl_seconds: float = 7 * 24 * 3600,
+                 memory_entries: int = 256):
+        """
+        LLM回复缓存：SQLite持久化（重启后仍有效）+ 内存LRU前置层
+        path: SQLite文件路径
+        max_entries: 持久化条目上限，超出时淘汰最久未使用的条目
+        ttl_seconds: 条目有效期（秒）
+        memory_entries: 内存层条目上限
+        """
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = max(1, int(memory_entries))
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, response TEXT NOT NULL, meta TEXT, '
+            'created_at REAL NOT NULL, last_access REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)')
+        self._conn.commit()
+
+        # 内存层：key -> (response, created_at)
+        self._memory = OrderedDict()
+        # 内存命中只记录访问时间，在下次写入时批量回写，避免命中路径上的磁盘写
+        self._touched = {}
+
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        查询缓存，未命中或已过期时返回 None
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, created_at = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._touched[key] = now
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return response
+                del self._memory[key]
+
+            row = self._conn.execute(
+                'SELECT response, created_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            response, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._conn.commit()
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self._remember(key, response, created_at)
+            self._touched[key] = now
+            self.hits += 1
+            return response
+
+    def put(self, key: str, response: str, meta: Dict[str, Any] = None):
+        """
+        写入缓存，并按TTL和容量淘汰旧条目
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+            self._touched.pop(key, None)
+            self._flush_touched()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, response, meta, created_at, last_access) VALUES (?, ?, ?, ?, ?)',
+                (key, response, json.dumps(meta, ensure_ascii=False) if meta else None, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _remember(self, key: str, response: str, created_at: float):
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _flush_touched(self):
+        if self._touched:
+            self._conn.executemany(
+                'UPDATE responses SET last_access = ? WHERE key = ?',
+                [(t, k) for k, t in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def _evict(self, now: float):
+        cursor = self._conn.execute('DELETE FROM responses WHERE created_at < ?', (now - self.ttl_seconds,))
+        self.expired += max(0, cursor.rowcount)
+
+        count = self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            victims = [row[0] for row in self._conn.execute(
+                'SELECT key FROM responses ORDER BY last_access ASC LIMIT ?', (overflow,)
+            )]
+            self._conn.executemany('DELETE FROM responses WHERE key = ?', [(k,) for k in victims])
+            for k in victims:
+                self._memory.pop(k, None)
+            self.evicted += len(victims)
+
+    def clear(self):
+        """
+        清空缓存
+        """
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            self._conn.execute('DELETE FROM responses')
+            self._conn.commit()
+
+    def close(self):
+        """
+        回写访问时间并关闭数据库
+        """
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取命中率统计
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'memory_hits': self.memory_hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'miss_rate': self.misses / lookups if lookups else 0.0,
+            'expired': self.expired,
+            'evicted': self.evicted,
+            'memory_entries': len(self._memory)
+        }
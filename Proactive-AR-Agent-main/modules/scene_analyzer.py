@@ -1,32 +1,33 @@
 import json
 import time
 from datetime import datetime
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
+
+from modules.analysis_config import AnalysisConfig, CompiledConfig, DEFAULT_CONFIG_PATH
+from modules.prompt_compactor import estimate_tokens, aggregate_objects, order_objects, describe_entry, dedupe_groups
+from modules.scene_state import SceneStateEstimator
+from modules.llm_scheduler import class_change_score
+from modules.temporal_engine import TemporalEngine
+from modules.instrumentation import metrics, STAGE_SCENE_ANALYSIS, STAGE_PROMPT
 
 class SceneAnalyzer:
-    def __init__(self):
+    def __init__(self, config_path: str = DEFAULT_CONFIG_PATH, config: AnalysisConfig = None, watch_config: bool = False):
         """
         场景分析器：将YOLOv8检测结果转化为结构化、语义化的输入
+        config_path: 分析配置文件路径
+        config: 共享的配置管理器（传入时忽略 config_path）
+        watch_config: 是否监视配置文件并热加载
         """
-        # 场景分类映射
-        self.scene_mapping = {
-            'kitchen': ['oven', 'microwave', 'toaster', 'sink', 'refrigerator', 'fork', 'knife', 'spoon', 'bowl', 'cup', 'wine glass'],
-            'living_room': ['tv', 'couch', 'chair', 'coffee table', 'remote', 'laptop'],
-            'bedroom': ['bed', 'chair', 'tv', 'laptop'],
-            'office': ['laptop', 'keyboard', 'mouse', 'chair', 'desk'],
-            'bathroom': ['toilet', 'sink', 'toothbrush', 'hair drier'],
-            'outdoor': ['car', 'bicycle', 'motorcycle', 'bus', 'train', 'truck', 'traffic light', 'fire hydrant', 'stop sign']
-        }
+        # 场景映射、功能分组、任务阈值等均来自编译后的配置表，热加载时整体替换
+        self.config = config if config is not None else AnalysisConfig(config_path, watch=watch_config)
         
-        # 物体功能分组
-        self.functional_groups = {
-            'cooking_tools': ['fork', 'knife', 'spoon', 'bowl', 'cup', 'wine glass', 'oven', 'microwave', 'toaster', 'sink'],
-            'food_items': ['banana', 'apple', 'sandwich', 'orange', 'broccoli', 'carrot', 'hot dog', 'pizza', 'donut', 'cake'],
-            'furniture': ['chair', 'couch', 'bed', 'dining table', 'toilet'],
-            'electronics': ['tv', 'laptop', 'mouse', 'remote', 'keyboard', 'cell phone'],
-            'appliances': ['microwave', 'oven', 'toaster', 'sink', 'refrigerator'],
-            'personal_items': ['backpack', 'umbrella', 'handbag', 'tie', 'suitcase', 'toothbrush', 'hair drier']
-        }
+        # 时序分析引擎（环形缓冲区，大小由 temporal_analysis.max_history_frames 决定）
+        self.temporal_engine = TemporalEngine.from_config(self.config.current.temporal)
+        self._temporal_config_version = self.config.current.version
+        
+        # 场景状态估计器（跨帧平滑场景分类，避免单帧误检导致场景跳变）
+        self.scene_estimator = SceneStateEstimator.from_config(self.config.current.scene_smoothing)
+        self._smoothing_config_version = self.config.current.version
         
         # 位置描述映射
         self.position_descriptions = {
@@ -41,6 +42,20 @@ class SceneAnalyzer:
             'bottom_right': '右下角'
         }
     
+    @property
+    def scene_mapping(self) -> Dict[str, Tuple[str, ...]]:
+        """
+        当前配置中的场景分类映射（只读，修改请编辑配置文件）
+        """
+        return self.config.current.scene_keywords
+    
+    @property
+    def functional_groups(self) -> Dict[str, Tuple[str, ...]]:
+        """
+        当前配置中的物体功能分组（只读，修改请编辑配置文件）
+        """
+        return self.config.current.group_members
+    
     def calculate_relative_position(self, bbox: List[float], frame_width: int, frame_height: int) -> str:
         """
         计算物体在画面中的相对位置
@@ -77,59 +92,69 @@ class SceneAnalyzer:
         else:
             return f'画面{x_region}侧{y_region}方'
     
-    def classify_scene(self, detections: List[Dict]) -> str:
+    def score_scenes(self, detections: List[Dict], config: CompiledConfig = None) -> Dict[str, int]:
         """
-        根据检测到的物体分类场景
+        统计各场景的关键词命中数
         """
-        detected_classes = [det['class'] for det in detections]
+        class_scenes = (config or self.config.current).class_scenes
         
         scene_scores = {}
-        for scene, objects in self.scene_mapping.items():
-            score = sum(1 for obj in detected_classes if obj in objects)
-            if score > 0:
-                scene_scores[scene] = score
-        
-        if scene_scores:
-            # 返回得分最高的场景
-            best_scene = max(scene_scores.items(), key=lambda x: x[1])[0]
-            scene_names = {
-                'kitchen': '厨房',
-                'living_room': '客厅',
-                'bedroom': '卧室',
-                'office': '办公室',
-                'bathroom': '浴室',
-                'outdoor': '户外'
-            }
-            return scene_names.get(best_scene, '未知场景')
+        for det in detections:
+            for scene in class_scenes.get(det['class'], ()):
+                scene_scores[scene] = scene_scores.get(scene, 0) + 1
+        return scene_scores
+    
+    def classify_scene_id(self, detections: List[Dict], config: CompiledConfig = None) -> str:
+        """
+        根据检测到的物体分类场景，返回场景ID（如 'kitchen'），无法判断时返回 None
+        """
+        cfg = config or self.config.current
+        scene_scores = self.score_scenes(detections, cfg)
+        
+        if not scene_scores:
+            return None
         
-        return '未知场景'
+        # 返回得分最高的场景（得分相同时按配置顺序）
+        return max((s for s in cfg.scene_order if s in scene_scores), key=lambda s: scene_scores[s])
+    
+    def classify_scene(self, detections: List[Dict]) -> str:
+        """
+        根据检测到的物体分类场景
+        """
+        cfg = self.config.current
+        return cfg.get_scene_name(self.classify_scene_id(detections, cfg))
     
-    def group_objects_by_function(self, detections: List[Dict]) -> Dict[str, List[str]]:
+    def group_objects_by_function(self, detections: List[Dict], config: CompiledConfig = None) -> Dict[str, List[str]]:
         """
         按功能对物体进行分组
         """
-        detected_classes = [det['class'] for det in detections]
+        cfg = config or self.config.current
+        class_groups = cfg.class_groups
         
-        groups = {}
-        for group_name, objects in self.functional_groups.items():
-            group_objects = [obj for obj in detected_classes if obj in objects]
-            if group_objects:
-                groups[group_name] = group_objects
+        found = {}
+        for det in detections:
+            for group_name in class_groups.get(det['class'], ()):
+                found.setdefault(group_name, []).append(det['class'])
         
-        return groups
+        return {group_name: found[group_name] for group_name in cfg.group_order if group_name in found}
     
-    def filter_high_confidence_detections(self, detections: List[Dict], confidence_threshold: float = 0.6) -> List[Dict]:
+    def filter_high_confidence_detections(self, detections: List[Dict], confidence_threshold: float = None) -> List[Dict]:
         """
-        过滤低置信度的检测结果
+        过滤低置信度的检测结果（默认阈值取配置中 scene_analysis 的 confidence_threshold）
         """
+        if confidence_threshold is None:
+            confidence_threshold = self.config.current.default_confidence_threshold
         return [det for det in detections if det.get('conf', 0.0) >= confidence_threshold]
     
     def create_structured_data(self, detections: List[Dict], frame_width: int, frame_height: int) -> Dict[str, Any]:
         """
         创建结构化的检测数据
         """
+        # 整帧使用同一份配置快照，热加载不会造成帧内不一致
+        cfg = self.config.current
+        
         # 过滤低置信度检测
-        filtered_detections = self.filter_high_confidence_detections(detections)
+        filtered_detections = self.filter_high_confidence_detections(detections, cfg.default_confidence_threshold)
         
         # 处理每个检测结果
         objects = []
@@ -144,14 +169,15 @@ class SceneAnalyzer:
             })
         
         # 分类场景
-        scene = self.classify_scene(filtered_detections)
+        scene_id = self.classify_scene_id(filtered_detections, cfg)
         
         # 按功能分组
-        groups = self.group_objects_by_function(filtered_detections)
+        groups = self.group_objects_by_function(filtered_detections, cfg)
         
         return {
             'objects': objects,
-            'scene': scene,
+            'scene': cfg.get_scene_name(scene_id),
+            'scene_id': scene_id,
             'groups': groups,
             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'total_objects': len(objects)
@@ -161,10 +187,14 @@ class SceneAnalyzer:
         """
         创建语义化的prompt
         """
-        objects = structured_data['objects']
+        cfg = self.config.current
         scene = structured_data['scene']
         groups = structured_data['groups']
         
+        # 按任务的置信度阈值过滤物体
+        threshold = cfg.task_threshold.get(task_type, cfg.default_confidence_threshold)
+        objects = [obj for obj in structured_data['objects'] if obj['confidence'] >= threshold]
+        
         # 构建物体描述
         object_descriptions = []
         for obj in objects:
@@ -174,18 +204,15 @@ class SceneAnalyzer:
         # 构建分组描述
         group_descriptions = []
         for group_name, group_objects in groups.items():
-            group_names = {
-                'cooking_tools': '烹饪工具',
-                'food_items': '食材',
-                'furniture': '家具',
-                'electronics': '电子设备',
-                'appliances': '家用电器',
-                'personal_items': '个人物品'
-            }
-            group_desc = f"{group_names.get(group_name, group_name)}：{', '.join(group_objects)}"
+            group_desc = f"{cfg.group_names.get(group_name, group_name)}：{', '.join(group_objects)}"
             group_descriptions.append(group_desc)
         
-        # 根据任务类型构建不同的prompt
+        return self.render_prompt(task_type, scene, object_descriptions, group_descriptions)
+    
+    def render_prompt(self, task_type: str, scene: str, object_descriptions: List[str], group_descriptions: List[str]) -> str:
+        """
+        按任务类型的模板拼装prompt
+        """
         if task_type == 'scene_analysis':
             prompt = f"""你是智能环境分析助手。请根据以下场景信息进行分析：
 
@@ -223,6 +250,65 @@ class SceneAnalyzer:
         
         return prompt
     
+    def create_compact_prompt(self, structured_data: Dict[str, Any], task_type: str = 'scene_analysis',
+                              token_budget: int = None, include_baseline: bool = False) -> Tuple[str, Dict[str, Any]]:
+        """
+        创建压缩后的prompt：重复类别合并为数量并合并区域，按场景的 priority_objects 排序，
+        分组描述去重；超出token预算时依次去掉分组描述和低优先级物体
+        token_budget 默认取 llm_settings.prompt_token_budget，未配置时取 llm_settings.max_tokens
+        include_baseline: 是否另外生成未压缩的语义化prompt以统计 tokens_before（用于日志和调试），不统计时为 None
+        返回 (prompt, 统计信息)
+        """
+        cfg = self.config.current
+        if token_budget is None:
+            token_budget = cfg.llm_settings.get('prompt_token_budget', cfg.llm_settings.get('max_tokens', 500))
+        scene = structured_data['scene']
+        
+        threshold = cfg.task_threshold.get(task_type, cfg.default_confidence_threshold)
+        objects = [obj for obj in structured_data['objects'] if obj['confidence'] >= threshold]
+        entries = order_objects(aggregate_objects(objects), cfg.priority_rank.get(structured_data.get('scene_id'), {}))
+        object_descriptions = [describe_entry(entry) for entry in entries]
+        group_descriptions = dedupe_groups(structured_data['groups'], cfg.group_names)
+        
+        prompt = self.render_prompt(task_type, scene, object_descriptions, group_descriptions)
+        kept = len(entries)
+        groups_dropped = False
+        
+        # 超出预算时先去掉分组描述，再从低优先级一端截断物体
+        if estimate_tokens(prompt) > token_budget and group_descriptions:
+            groups_dropped = True
+            prompt = self.render_prompt(task_type, scene, object_descriptions, [])
+        while estimate_tokens(prompt) > token_budget and kept > 1:
+            kept -= 1
+            omitted = sum(entry['count'] for entry in entries[kept:])
+            descriptions = object_descriptions[:kept] + [f"另有{len(entries) - kept}类共{omitted}个物体"]
+            prompt = self.render_prompt(task_type, scene, descriptions, [])
+        
+        stats = {
+            'tokens_before': estimate_tokens(self.create_semantic_prompt(structured_data, task_type))
+                             if include_baseline else None,
+            'tokens_after': estimate_tokens(prompt),
+            'token_budget': token_budget,
+            'objects_before': len(objects),
+            'entries_after': kept,
+            'groups_dropped': groups_dropped
+        }
+        return prompt, stats
+
+    def create_delta_prompt(self, current_data: Dict[str, Any], previous_data: Dict[str, Any],
+                            temporal_analysis: Dict[str, Any]) -> Optional[str]:
+        """
+        创建增量prompt：只描述相对上一次完成的LLM请求的时序变化，用于复用 Ollama context 的后续请求
+        首次检测或场景类型切换时返回 None（应发送完整prompt）
+        """
+        if previous_data is None or previous_data.get('scene_id') != current_data.get('scene_id'):
+            return None
+
+        return f"""[场景更新]：{current_data['scene']}，当前共 {current_data['total_objects']} 个物体
+[时序变化]：{temporal_analysis['changes']}
+
+请结合之前的场景信息和上述变化，更新你的分析和建议。"""
+
     def create_hybrid_input(self, structured_data: Dict[str, Any], task_type: str = 'scene_analysis') -> Dict[str, Any]:
         """
         创建混合输入（结构化数据 + 自然语言）
@@ -243,7 +329,8 @@ class SceneAnalyzer:
             return {
                 'changes': '首次检测',
                 'new_objects': [obj['class'] for obj in current_data['objects']],
-                'removed_objects': []
+                'removed_objects': [],
+                'change_score': 1.0 if current_data['objects'] else 0.0
             }
         
         current_objects = set(obj['class'] for obj in current_data['objects'])
@@ -258,8 +345,70 @@ class SceneAnalyzer:
         if removed_objects:
             changes.append(f"移除物体：{', '.join(removed_objects)}")
         
+        # 变化分数只反映物体类别集合的变化（与 change_detection_threshold 比较后触发LLM调度）；
+        # significant_changes 中的位置变化由 TemporalEngine 统计，不参与调度触发
+        change_score = class_change_score(previous_objects, current_objects)
+        
         return {
             'changes': '；'.join(changes) if changes else '无明显变化',
             'new_objects': list(new_objects),
-            'removed_objects': list(removed_objects)
-        } 
\ No newline at end of file
+            'removed_objects': list(removed_objects),
+            'change_score': change_score
+        }
+    
+    def update_temporal_state(self, structured_data: Dict[str, Any], frame_width: int, frame_height: int) -> Dict[str, Any]:
+        """
+        将当前帧压入时序分析引擎，返回相对上一帧的变化及窗口变化分数（可每帧调用）
+        """
+        cfg = self.config.current
+        if cfg.version != self._temporal_config_version:
+            # 配置热加载后在检测线程内应用新的时序参数
+            self.temporal_engine.reconfigure(cfg.temporal)
+            self._temporal_config_version = cfg.version
+        return self.temporal_engine.update(structured_data['objects'], frame_width, frame_height)
+    
+    def update_scene_state(self, structured_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        用当前帧更新场景状态估计器，并把 structured_data 中的场景替换为平滑后的结果
+        原始单帧分类保留在 raw_scene / raw_scene_id 中
+        """
+        cfg = self.config.current
+        if cfg.version != self._smoothing_config_version:
+            self.scene_estimator.reconfigure(cfg.scene_smoothing)
+            self._smoothing_config_version = cfg.version
+        
+        scene_id, confidence = self.scene_estimator.update(self.score_scenes(structured_data['objects'], cfg))
+        
+        structured_data['raw_scene'] = structured_data['scene']
+        structured_data['raw_scene_id'] = structured_data.get('scene_id')
+        structured_data['scene'] = cfg.get_scene_name(scene_id)
+        structured_data['scene_id'] = scene_id
+        structured_data['scene_confidence'] = confidence
+        return structured_data
+    
+    def process_frame(self, detections: List[Dict], frame_width: int, frame_height: int,
+                      previous_data: Dict[str, Any] = None) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+        """
+        逐帧分析：生成结构化数据、平滑场景分类、更新时序引擎，并计算相对 previous_data（上次LLM调用时）的变化
+        返回 (结构化数据, 相对上一帧的时序变化, 相对 previous_data 的时序分析)
+        """
+        start = metrics.start()
+        structured_data = self.create_structured_data(detections, frame_width, frame_height)
+        # 跨帧平滑场景分类（后续任务切换和prompt均使用平滑后的场景）
+        self.update_scene_state(structured_data)
+        # 逐帧更新时序分析引擎（环形缓冲区，增量统计）
+        frame_temporal = self.update_temporal_state(structured_data, frame_width, frame_height)
+        temporal_analysis = self.analyze_temporal_changes(structured_data, previous_data)
+        metrics.stop(STAGE_SCENE_ANALYSIS, start)
+        return structured_data, frame_temporal, temporal_analysis
+    
+    def get_debug_info(self) -> Dict[str, Any]:
+        """
+        获取调试信息
+        """
+        return {
+            'config': self.config.get_debug_info(),
+            'temporal': self.temporal_engine.get_debug_info(),
+            'scene_state': self.scene_estimator.get_debug_info(),
+            'latency': metrics.snapshot([STAGE_SCENE_ANALYSIS, STAGE_PROMPT])
+        }
@@ -0,0 +1,147 @@
+from typing import Dict, Any, Tuple
+
+
+class SceneStateEstimator:
+    def __init__(self, decay: float = 0.8, switch_margin: float = 0.15, min_dwell_frames: int = 5,
+                 min_confidence: float = 0.05):
+        """
+        场景状态估计器：跨帧维护指数衰减的场景类别直方图，并对场景切换施加滞回
+        decay: 每帧衰减系数（越大越平滑，切换越慢）
+        switch_margin: 候选场景权重需超过当前场景的最小差值
+        min_dwell_frames: 候选场景需连续领先的帧数才会切换
+        min_confidence: 当前场景权重低于该值时视为未知场景
+        """
+        self.decay = decay
+        self.switch_margin = switch_margin
+        self.min_dwell_frames = max(1, int(min_dwell_frames))
+        self.min_confidence = min_confidence
+
+        self.histogram = {}  # 场景ID -> 衰减后的权重
+        self.current_scene = None
+        self.last_scene = None  # 衰减为未知前的场景，未知期间新场景仍需满足滞回条件
+        self.candidate_scene = None
+        self.candidate_frames = 0
+        self.switch_count = 0
+        self.frame_count = 0
+
+    @classmethod
+    def from_config(cls, smoothing_config: Dict[str, Any]) -> 'SceneStateEstimator':
+        """
+        根据 analysis_config.json 的 scene_smoothing 配置创建估计器
+        """
+        estimator = cls()
+        estimator.reconfigure(smoothing_config or {})
+        return estimator
+
+    def reconfigure(self, smoothing_config: Dict[str, Any]):
+        """
+        应用新的平滑参数，保留已有状态
+        """
+        self.decay = smoothing_config.get('decay', self.decay)
+        self.switch_margin = smoothing_config.get('switch_margin', self.switch_margin)
+        self.min_dwell_frames = max(1, int(smoothing_config.get('min_dwell_frames', self.min_dwell_frames)))
+        self.min_confidence = smoothing_config.get('min_confidence', self.min_confidence)
+
+    def update(self, scene_scores: Dict[str, float]) -> Tuple[str, float]:
+        """
+        输入单帧各场景的得分（如关键词命中数），返回平滑后的 (场景ID, 置信度)
+        每帧开销只与场景数量有关
+        """
+        self.frame_count += 1
+        total = sum(scene_scores.values())
+        keep = self.decay
+        gain = 1.0 - self.decay
+
+        # 指数衰减：H = decay * H + (1 - decay) * 本帧归一化得分
+        for scene in list(self.histogram):
+            weight = self.histogram[scene] * keep
+            if weight < 1e-6:
+                del self.histogram[scene]
+            else:
+                self.histogram[scene] = weight
+        if total > 0:
+            for scene, score in scene_scores.items():
+                if score > 0:
+                    self.histogram[scene] = self.histogram.get(scene, 0.0) + gain * score / total
+
+        if not self.histogram:
+            return self.current_scene, 0.0
+
+        leader = max(self.histogram, key=self.histogram.get)
+        leader_weight = self.histogram[leader]
+
+        # 当前场景衰减为未知后，仍以之前的场景为参照，避免单帧噪声立即成为新场景
+        reference = self.current_scene or self.last_scene
+
+        if self.current_scene is None and (reference is None or leader == reference):
+            # 刚启动或回到之前的场景时直接采用领先场景
+            if leader_weight >= self.min_confidence:
+                self._switch_to(leader)
+        elif leader != reference:
+            current_weight = self.histogram.get(reference, 0.0)
+            if leader_weight - current_weight >= self.switch_margin:
+                if leader == self.candidate_scene:
+                    self.candidate_frames += 1
+                else:
+                    self.candidate_scene = leader
+                    self.candidate_frames = 1
+                if self.candidate_frames >= self.min_dwell_frames and leader_weight >= self.min_confidence:
+                    self._switch_to(leader)
+            else:
+                self.candidate_scene = None
+                self.candidate_frames = 0
+        else:
+            self.candidate_scene = None
+            self.candidate_frames = 0
+
+        # 长时间没有相关物体时，当前场景衰减为未知
+        if self.current_scene is not None and self.histogram.get(self.current_scene, 0.0) < self.min_confidence:
+            self.last_scene = self.current_scene
+            self.current_scene = None
+            self.candidate_scene = None
+            self.candidate_frames = 0
+
+        return self.current_scene, self.get_confidence()
+
+    def _switch_to(self, scene: str):
+        if scene != self.current_scene:
+            self.switch_count += 1
+        self.current_scene = scene
+        self.candidate_scene = None
+        self.candidate_frames = 0
+
+    def get_confidence(self) -> float:
+        """
+        当前场景在衰减直方图中的占比
+        """
+        if self.current_scene is None:
+            return 0.0
+        total = sum(self.histogram.values())
+        if total <= 0:
+            return 0.0
+        return self.histogram.get(self.current_scene, 0.0) / total
+
+    def reset(self):
+        """
+        清空状态
+        """
+        self.histogram.clear()
+        self.current_scene = None
+        self.last_scene = None
+        self.candidate_scene = None
+        self.candidate_frames = 0
+
+    def get_debug_info(self) -> Dict[str, Any]:
+        """
+        获取调试信息
+        """
+        return {
+            'current_scene': self.current_scene,
+            'last_scene': self.last_scene,
+            'confidence': self.get_confidence(),
+            'candidate_scene': self.candidate_scene,
+            'candidate_frames': self.candidate_frames,
+            'switch_count': self.switch_count,
+            'frame_count': self.frame_count,
+            'histogram': dict(self.histogram)
+        }
@@ -0,0 +1,164 @@
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+# 与检测器 target_classes 一致的类别表（COCO 80 类）
+DEFAULT_VOCABULARY = [
+    'person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train',
+    'truck', 'boat', 'traffic light', 'fire hydrant', 'stop sign',
+    'parking meter', 'bench', 'bird', 'cat', 'dog', 'horse', 'sheep',
+    'cow', 'elephant', 'bear', 'zebra', 'giraffe', 'backpack', 'umbrella',
+    'handbag', 'tie', 'suitcase', 'frisbee', 'skis', 'snowboard',
+    'sports ball', 'kite', 'baseball bat', 'baseball glove', 'skateboard',
+    'surfboard', 'tennis racket', 'bottle', 'wine glass', 'cup', 'fork',
+    'knife', 'spoon', 'bowl', 'banana', 'apple', 'sandwich', 'orange',
+    'broccoli', 'carrot', 'hot dog', 'pizza', 'donut', 'cake', 'chair',
+    'couch', 'potted plant', 'bed', 'dining table', 'toilet', 'tv',
+    'laptop', 'mouse', 'remote', 'keyboard', 'cell phone', 'microwave',
+    'oven', 'toaster', 'sink', 'refrigerator', 'book', 'clock', 'vase',
+    'scissors', 'teddy bear', 'hair drier', 'toothbrush'
+]
+
+# SceneAnalyzer.calculate_relative_position 的全部输出
+REGIONS = [
+    '画面left侧top方', '画面top方', '画面right侧top方',
+    '画面left侧', '画面中央', '画面right侧',
+    '画面left侧bottom方', '画面bottom方', '画面right侧bottom方'
+]
+
+
+class SceneEmbedder:
+    def __init__(self, vocabulary: List[str] = None, region_weight: float = 0.5):
+        """
+        场景向量化：类别直方图 + 区域直方图，拼接为定长向量并做L2归一化
+        vocabulary: 类别表，表外类别计入 "其他" 维
+        region_weight: 区域部分相对类别部分的权重
+        """
+        self.vocabulary = list(vocabulary or DEFAULT_VOCABULARY)
+        self.class_index = {cls: i for i, cls in enumerate(self.vocabulary)}
+        self.region_index = {region: i for i, region in enumerate(REGIONS)}
+        self.region_weight = region_weight
+
+        self.other_index = len(self.vocabulary)
+        self.region_offset = self.other_index + 1
+        self.dim = self.region_offset + len(REGIONS)
+
+    def embed(self, structured_data: Dict[str, Any]) -> np.ndarray:
+        """
+        将 create_structured_data 的输出转为定长向量
+        """
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for obj in structured_data.get('objects', []):
+            vector[self.class_index.get(obj['class'], self.other_index)] += 1.0
+            region = self.region_index.get(obj.get('relative_position'))
+            if region is not None:
+                vector[self.region_offset + region] += self.region_weight
+
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm
+        return vector
+
+
+class SimilarityCache:
+    def __init__(self, embedder: SceneEmbedder = None, threshold: float = 0.95, max_entries: int = 20000):
+        """
+        近似场景回复缓存：进程内 NumPy 向量索引，余弦相似度超过阈值时复用已有回复
+        同一个 (任务类型, 场景) 分区内才会复用；条目数超过上限时淘汰最久未使用的条目
+        threshold: 复用回复所需的最小余弦相似度
+        max_entries: 索引容量
+        """
+        self.embedder = embedder or SceneEmbedder()
+        self.threshold = threshold
+        self.max_entries = max(1, int(max_entries))
+
+        # 预分配索引存储，向量均已归一化，点积即余弦相似度
+        self._vectors = np.zeros((self.max_entries, self.embedder.dim), dtype=np.float32)
+        self._partitions = np.zeros(self.max_entries, dtype=np.int32)
+        self._last_used = np.zeros(self.max_entries, dtype=np.int64)
+        self._responses = [None] * self.max_entries
+        self._size = 0
+        self._clock = 0
+        self._partition_ids = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def embed(self, structured_data: Dict[str, Any]) -> np.ndarray:
+        return self.embedder.embed(structured_data)
+
+    def _partition(self, task_type: str, scene_id: str) -> int:
+        key = (task_type, scene_id)
+        partition = self._partition_ids.get(key)
+        if partition is None:
+            partition = len(self._partition_ids) + 1
+            self._partition_ids[key] = partition
+        return partition
+
+    def lookup(self, vector: np.ndarray, task_type: str, scene_id: str = None) -> Optional[Tuple[str, float]]:
+        """
+        查找最相似的已缓存场景，相似度不低于阈值时返回 (回复, 相似度)，否则返回 None
+        """
+        with self._lock:
+            self._clock += 1
+            size = self._size
+            if size == 0:
+                self.misses += 1
+                return None
+
+            partition = self._partition(task_type, scene_id)
+            similarities = self._vectors[:size] @ vector
+            similarities[self._partitions[:size] != partition] = -1.0
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            self._last_used[best] = self._clock
+            self.hits += 1
+            return self._responses[best], similarity
+
+    def add(self, vector: np.ndarray, response: str, task_type: str, scene_id: str = None):
+        """
+        加入一条回复，索引已满时覆盖最久未使用的条目
+        """
+        with self._lock:
+            self._clock += 1
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+                self.evicted += 1
+
+            self._vectors[slot] = vector
+            self._partitions[slot] = self._partition(task_type, scene_id)
+            self._last_used[slot] = self._clock
+            self._responses[slot] = response
+
+    def clear(self):
+        """
+        清空索引
+        """
+        with self._lock:
+            self._size = 0
+            self._responses = [None] * self.max_entries
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取命中率统计
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evicted': self.evicted,
+            'entries': self._size,
+            'max_entries': self.max_entries
+        }
@@ -0,0 +1,204 @@
+from collections import deque
+from typing import List, Dict, Any, Tuple
+
+# 变化类别（与 analysis_config.json 中 significant_changes 的取值一致）
+CHANGE_TYPES = ('object_appearance', 'object_disappearance', 'position_change')
+
+
+class TemporalEngine:
+    def __init__(self, max_history_frames: int = 10, change_detection_threshold: float = 0.3,
+                 position_change_threshold: float = 0.1, significant_changes: List[str] = None):
+        """
+        时序分析引擎：用固定大小的环形缓冲区保存每帧的紧凑场景直方图，
+        并增量维护窗口内的出现/消失/位移统计
+        max_history_frames: 环形缓冲区大小（帧）
+        change_detection_threshold: 判定为显著变化的窗口变化分数阈值
+        position_change_threshold: 判定为位移的归一化中心点距离
+        significant_changes: 参与总变化分数计算的变化类别
+        """
+        self.max_history_frames = max(1, int(max_history_frames))
+        self.change_detection_threshold = change_detection_threshold
+        self.position_change_threshold = position_change_threshold
+        self.significant_changes = tuple(
+            c for c in (significant_changes or CHANGE_TYPES) if c in CHANGE_TYPES
+        )
+
+        # 环形缓冲区：每个槽位为 (histogram, events, frame_score)
+        #   histogram: {class: (count, cx, cy)}，cx/cy 为归一化中心点均值
+        #   events: {change_type: 该帧发生的变化数}
+        self.history = deque()
+
+        # 窗口内增量统计
+        self.presence = {}  # 类别 -> 窗口内出现该类别的帧数
+        self.event_totals = {c: 0 for c in CHANGE_TYPES}
+        self.score_totals = {c: 0.0 for c in CHANGE_TYPES}
+        self.frame_count = 0
+
+    @classmethod
+    def from_config(cls, temporal_config: Dict[str, Any]) -> 'TemporalEngine':
+        """
+        根据 analysis_config.json 的 temporal_analysis 配置创建引擎
+        """
+        temporal_config = temporal_config or {}
+        return cls(
+            max_history_frames=temporal_config.get('max_history_frames', 10),
+            change_detection_threshold=temporal_config.get('change_detection_threshold', 0.3),
+            position_change_threshold=temporal_config.get('position_change_threshold', 0.1),
+            significant_changes=temporal_config.get('significant_changes')
+        )
+
+    def reconfigure(self, temporal_config: Dict[str, Any]):
+        """
+        应用新的 temporal_analysis 配置，保留已有历史（缓冲区变小时丢弃最旧的帧）
+        """
+        self.max_history_frames = max(1, int(temporal_config.get('max_history_frames', self.max_history_frames)))
+        self.change_detection_threshold = temporal_config.get('change_detection_threshold', self.change_detection_threshold)
+        self.position_change_threshold = temporal_config.get('position_change_threshold', self.position_change_threshold)
+        self.significant_changes = tuple(
+            c for c in (temporal_config.get('significant_changes') or CHANGE_TYPES) if c in CHANGE_TYPES
+        )
+        while len(self.history) > self.max_history_frames:
+            self._evict()
+
+    def build_histogram(self, objects: List[Dict], frame_width: int, frame_height: int) -> Dict[str, Tuple[int, float, float]]:
+        """
+        将一帧的物体列表压缩为 {类别: (数量, 归一化中心x, 归一化中心y)}
+        """
+        sums = {}
+        for obj in objects:
+            bbox = obj['bbox']
+            cx = (bbox[0] + bbox[2]) / 2 / frame_width
+            cy = (bbox[1] + bbox[3]) / 2 / frame_height
+            count, sx, sy = sums.get(obj['class'], (0, 0.0, 0.0))
+            sums[obj['class']] = (count + 1, sx + cx, sy + cy)
+
+        return {cls: (count, sx / count, sy / count) for cls, (count, sx, sy) in sums.items()}
+
+    def update(self, objects: List[Dict], frame_width: int, frame_height: int) -> Dict[str, Any]:
+        """
+        压入一帧并返回该帧相对上一帧的变化
+        objects: create_structured_data 输出中的 objects（或包含 class/bbox 的检测结果）
+        """
+        histogram = self.build_histogram(objects, frame_width, frame_height)
+        previous = self.history[-1][0] if self.history else None
+        self.frame_count += 1
+
+        if previous is None:
+            new_objects = list(histogram)
+            removed_objects = []
+            moved_objects = []
+        else:
+            new_objects = [cls for cls in histogram if cls not in previous]
+            removed_objects = [cls for cls in previous if cls not in histogram]
+            moved_objects = []
+            threshold = self.position_change_threshold
+            for cls, (_, cx, cy) in histogram.items():
+                prev = previous.get(cls)
+                if prev is not None and abs(cx - prev[1]) + abs(cy - prev[2]) > threshold:
+                    moved_objects.append(cls)
+
+        # 首帧没有可比较的上一帧，不计入变化统计
+        if previous is None:
+            events = {c: 0 for c in CHANGE_TYPES}
+        else:
+            events = {
+                'object_appearance': len(new_objects),
+                'object_disappearance': len(removed_objects),
+                'position_change': len(moved_objects)
+            }
+        union_size = max(1, len(histogram) + len(removed_objects))
+        frame_scores = {c: events[c] / union_size for c in CHANGE_TYPES}
+
+        # 缓冲区已满时先扣除最旧一帧的贡献
+        if len(self.history) >= self.max_history_frames:
+            self._evict()
+
+        for cls in histogram:
+            self.presence[cls] = self.presence.get(cls, 0) + 1
+        for c in CHANGE_TYPES:
+            self.event_totals[c] += events[c]
+            self.score_totals[c] += frame_scores[c]
+        self.history.append((histogram, events, frame_scores))
+
+        changes = []
+        if new_objects:
+            changes.append(f"新增物体：{', '.join(new_objects)}")
+        if removed_objects:
+            changes.append(f"移除物体：{', '.join(removed_objects)}")
+        if moved_objects:
+            changes.append(f"位置变化：{', '.join(moved_objects)}")
+
+        if previous is None:
+            change_text = '首次检测'
+        else:
+            change_text = '；'.join(changes) if changes else '无明显变化'
+
+        return {
+            'changes': change_text,
+            'new_objects': new_objects,
+            'removed_objects': removed_objects,
+            'moved_objects': moved_objects,
+            'scores': self.get_change_scores()
+        }
+
+    def _evict(self):
+        """
+        移除最旧一帧，并从窗口统计中扣除其贡献
+        """
+        histogram, events, frame_scores = self.history.popleft()
+        for cls in histogram:
+            remaining = self.presence[cls] - 1
+            if remaining:
+                self.presence[cls] = remaining
+            else:
+                del self.presence[cls]
+        for c in CHANGE_TYPES:
+            self.event_totals[c] -= events[c]
+            self.score_totals[c] -= frame_scores[c]
+
+    def get_change_scores(self) -> Dict[str, Any]:
+        """
+        获取窗口内的变化分数（O(1)，可每帧调用）
+        各类别分数为窗口内每帧变化比例的均值，overall 为参与判定类别之和（上限1.0）
+        """
+        frames = len(self.history)
+        if frames == 0:
+            scores = {c: 0.0 for c in CHANGE_TYPES}
+        else:
+            scores = {c: max(0.0, self.score_totals[c]) / frames for c in CHANGE_TYPES}
+
+        overall = min(1.0, sum(scores[c] for c in self.significant_changes))
+        scores['overall'] = overall
+        scores['is_significant'] = overall >= self.change_detection_threshold
+        return scores
+
+    def get_stable_classes(self, min_ratio: float = 0.5) -> List[str]:
+        """
+        获取窗口内稳定出现的类别（出现帧数占比不低于 min_ratio）
+        """
+        frames = len(self.history)
+        if frames == 0:
+            return []
+        return [cls for cls, n in self.presence.items() if n / frames >= min_ratio]
+
+    def reset(self):
+        """
+        清空历史
+        """
+        self.history.clear()
+        self.presence.clear()
+        self.event_totals = {c: 0 for c in CHANGE_TYPES}
+        self.score_totals = {c: 0.0 for c in CHANGE_TYPES}
+
+    def get_debug_info(self) -> Dict[str, Any]:
+        """
+        获取调试信息
+        """
+        return {
+            'history_frames': len(self.history),
+            'max_history_frames': self.max_history_frames,
+            'frame_count': self.frame_count,
+            'presence': dict(self.presence),
+            'event_totals': dict(self.event_totals),
+            'scores': self.get_change_scores()
+        }
@@ -3,35 +3,70 @@
 import threading
 import tkinter as tk
 from tkinter import scrolledtext
-from PIL import Image, ImageTk
-import cv2
-import time
 from modules.detector import process_video_frame
 from modules.object_tracker import ObjectTracker
-from modules.summarizer import update_window, get_attention_summary
+from modules.summarizer import RollingAggregator, get_attention_summary
 from modules.llm_agent import query_ollama
+from modules.llm_scheduler import ChangeTriggeredScheduler, class_change_score
+from modules.frame_mailbox import FrameMailbox
+from modules.preview_renderer import PreviewRenderer
+from modules.pacing import PacingController, PACING_REALTIME
 
-# 修改为基于时间的间隔
-LLM_INTERVAL_SECONDS = 5  # 每5秒调用一次LLM
-object_window = []
+# 变化触发的LLM调度参数
+LLM_CHANGE_THRESHOLD = 0.3       # 类别变化分数阈值
+LLM_MIN_INTERVAL_SECONDS = 1.0   # 两次调用的最小间隔
+LLM_MAX_INTERVAL_SECONDS = 15.0  # 场景无变化时的最长调用间隔
+LLM_DEBOUNCE_SECONDS = 0.5       # 变化需持续的时间
+# 最近 1 s / 10 s / 60 s 的物体类别计数（环形缓冲区增量维护）
+object_window = RollingAggregator()
 frame_idx = 0
 current_summary = ""
 llm_output = "尚未生成"
-last_llm_time = 0  # 记录上次LLM调用的时间
+last_llm_classes = set()  # 上次LLM调用时画面中的物体类别
+
+llm_scheduler = ChangeTriggeredScheduler(
+    threshold=LLM_CHANGE_THRESHOLD,
+    min_interval=LLM_MIN_INTERVAL_SECONDS,
+    max_interval=LLM_MAX_INTERVAL_SECONDS,
+    debounce=LLM_DEBOUNCE_SECONDS
+)
 
 # 初始化时序目标追踪器
 object_tracker = ObjectTracker(window_size=30, iou_threshold=0.5)  # 30秒窗口，IOU阈值0.5
 
+# 按视频时钟控制读帧节奏（取代固定的 sleep），处理不过来时丢帧
+pacer = PacingController(mode=PACING_REALTIME)
+
+# 预览画面：检测线程投递最新帧，界面线程约每 33 ms（30 fps）取一次
+frame_mailbox = FrameMailbox()
+PREVIEW_REFRESH_MS = 33
+preview_renderer = PreviewRenderer(480, 360)
+
 video_path = "test.mp4"
-cap = cv2.VideoCapture(video_path)
 
 def update_gui():
     summary_text.delete(1.0, tk.END)
     summary_text.insert(tk.END, current_summary or "（暂未识别到目标）")
+    pacing_info = pacer.get_debug_info()
+    summary_text.insert(tk.END, f"\n播放节奏: {pacing_info['mode']}，延迟 {pacer.lag * 1000:.0f} ms，"
+                                f"丢帧 {pacing_info['stats']['dropped']}")
     llm_text.delete(1.0, tk.END)
     llm_text.insert(tk.END, llm_output or "（尚无回复）")
     window.after(1000, update_gui)
 
+def refresh_preview():
+    """
+    在Tk主循环中按显示刷新率取出最新一帧，原地更新同一个画布图像项；
+    两次刷新之间到达的多帧只显示最新的一帧
+    """
+    latest = frame_mailbox.take()
+    if latest is not None:
+        frame, meta = latest
+        preview_renderer.render(frame, meta['detections'])
+        # PhotoImage 原地更新，图像项只需在首次绑定
+        canvas.itemconfigure(preview_item, image=preview_renderer.photo())
+    window.after(PREVIEW_REFRESH_MS, refresh_preview)
+
 def llm_worker(prompt):
     global llm_output
     try:
@@ -40,31 +75,22 @@ def llm_worker(prompt):
         llm_output = f"LLM调用失败: {str(e)}"
 
 def run_detection():
-    global frame_idx, current_summary, last_llm_time
-    frame_gen = process_video_frame(video_path)
-    for frame_objects, frame_detections in frame_gen:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frame_idx += 1
+    global frame_idx, current_summary, last_llm_classes
+    # 检测和预览共用同一次解码的帧，帧序号与时间戳来自帧来源，二者不会错位
+    frame_gen = process_video_frame(video_path, pacer=pacer)
+    for frame_objects, frame_detections, frame, frame_idx, timestamp in frame_gen:
+        # 更新时序追踪器（窗口按视频时间计算）
+        object_tracker.update(frame_detections, timestamp)
         
-        # 更新时序追踪器
-        object_tracker.update(frame_detections)
+        # 多时间窗口滚动计数（按视频时间）
+        object_window.update(frame_objects, timestamp)
         
-        # 保持原有的窗口更新逻辑（用于兼容）
-        update_window(object_window, frame_objects)
+        # 投递到预览信箱（不阻塞），由界面线程缩放、绘制并显示
+        frame_mailbox.put(frame, {'detections': frame_detections, 'frame_idx': frame_idx})
         
-        # 显示视频帧
-        img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        img = cv2.resize(img, (480, 360))  # 放大预览画面
-        img_pil = Image.fromarray(img)
-        img_tk = ImageTk.PhotoImage(img_pil)
-        canvas.create_image(0, 0, anchor=tk.NW, image=img_tk)
-        canvas.image = img_tk
-        
-        # 基于时间间隔调用LLM（每5秒）
-        current_time = time.time()
-        if current_time - last_llm_time >= LLM_INTERVAL_SECONDS:
+        # 与上次LLM调用时相比的物体类别变化超过阈值（去抖）或超过最大间隔时调用LLM
+        change_score = class_change_score(last_llm_classes, frame_objects)
+        if llm_scheduler.update(change_score):
             # 使用时序追踪的结果
             summary = object_tracker.get_summary()
             current_summary = summary
@@ -76,21 +102,14 @@ def run_detection():
                 )
                 threading.Thread(target=llm_worker, args=(prompt,), daemon=True).start()
             
-            last_llm_time = current_time  # 更新上次LLM调用时间
-            
-        time.sleep(0.01)
-
-# 保持原有的窗口更新函数（用于兼容）
-def update_window(object_window, frame_objects):
-    if len(object_window) >= 60:
-        object_window.pop(0)
-    object_window.append(frame_objects)
+            last_llm_classes = set(frame_objects)  # 记录本次调用时的物体类别
 
 window = tk.Tk()
 window.title("视频环境理解系统 - 时序追踪版")
 window.geometry("800x600")
 canvas = tk.Canvas(window, width=480, height=360, bg="black")
 canvas.pack(padx=10, pady=5, anchor=tk.NW)
+preview_item = canvas.create_image(0, 0, anchor=tk.NW)
 summary_label = tk.Label(window, text="环境物品摘要 (时序追踪):")
 summary_label.pack()
 summary_text = scrolledtext.ScrolledText(window, height=5)
@@ -102,4 +121,5 @@ llm_text.pack(fill=tk.BOTH, expand=True, padx=10)
 detector_thread = threading.Thread(target=run_detection, daemon=True)
 detector_thread.start()
 update_gui()
+refresh_preview()
 window.mainloop()
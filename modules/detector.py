@@ -1,25 +1,32 @@
 from ultralytics import YOLO
+from modules.frame_source import VideoFrameSource
 
-def process_video_frame(video_path):
+def process_video_frame(video_path, pacer=None):
+    """
+    逐帧检测：视频只由 VideoFrameSource 解码一次，
+    返回 (物体类别, 检测结果, 帧, 帧序号, 时间戳)，帧与检测结果一一对应
+    pacer: 可选的 PacingController，按视频时钟控制读帧节奏（落后时跳帧）
+    """
     model = YOLO("yolov8n.pt")
-    results = model.predict(source=video_path, stream=True)
-    for result in results:
-        boxes = result.boxes
+    for frame_idx, timestamp, frame in VideoFrameSource(video_path, pacer=pacer):
+        results = model.predict(source=frame, verbose=False)
         frame_objects = []
         frame_detections = []  # 用于追踪的详细信息
         
-        if boxes is not None:
-            for box in boxes:
-                cls_id = int(box.cls[0])
-                cls_name = result.names[cls_id]
-                conf = float(box.conf[0])
-                bbox = box.xyxy[0].cpu().numpy()  # [x1, y1, x2, y2]
-                
-                frame_objects.append(cls_name)
-                frame_detections.append({
-                    'class': cls_name,
-                    'bbox': bbox.tolist(),
-                    'conf': conf
-                })
+        for result in results:
+            boxes = result.boxes
+            if boxes is not None:
+                for box in boxes:
+                    cls_id = int(box.cls[0])
+                    cls_name = result.names[cls_id]
+                    conf = float(box.conf[0])
+                    bbox = box.xyxy[0].cpu().numpy()  # [x1, y1, x2, y2]
+                    
+                    frame_objects.append(cls_name)
+                    frame_detections.append({
+                        'class': cls_name,
+                        'bbox': bbox.tolist(),
+                        'conf': conf
+                    })
         
-        yield frame_objects, frame_detections
+        yield frame_objects, frame_detections, frame, frame_idx, timestamp
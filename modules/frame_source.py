@@ -0,0 +1,47 @@
+import cv2
+
+
+class VideoFrameSource:
+    def __init__(self, video_path, pacer=None):
+        """
+        统一的视频帧来源：每帧只解码一次，检测和预览使用同一个帧缓冲
+        迭代得到 (帧序号, 时间戳秒, 帧)，帧序号从1开始
+        pacer: 可选的 PacingController，按视频时钟控制节奏；落后时跳过的帧只 grab()，
+               不做颜色转换和拷贝（grab 仍会解码压缩帧）
+        """
+        self.video_path = video_path
+        self.pacer = pacer
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise IOError(f"无法打开视频文件: {video_path}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_count = 0
+        self.dropped = 0
+
+    def __iter__(self):
+        if self.pacer is not None:
+            self.pacer.start(self.fps)
+        try:
+            while True:
+                if self.pacer is not None and not self.pacer.pace(self.frame_count):
+                    if not self.cap.grab():
+                        break
+                    self.frame_count += 1
+                    self.dropped += 1
+                    continue
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                self.frame_count += 1
+                # 优先使用容器中的时间戳，读不到时按帧率推算
+                timestamp = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                if timestamp <= 0 and self.frame_count > 1:
+                    timestamp = (self.frame_count - 1) / self.fps
+                yield self.frame_count, timestamp, frame
+        finally:
+            self.release()
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
@@ -14,12 +14,13 @@ class ObjectTracker:
         self.tracked_objects = []  # 当前活跃对象池
         self.frame_count = 0
         
-    def update(self, new_detections):
+    def update(self, new_detections, timestamp=None):
         """
         更新追踪状态
         new_detections: 新检测到的目标列表，每个元素包含 {'class': str, 'bbox': [x1,y1,x2,y2], 'conf': float}
+        timestamp: 帧在视频中的时间（秒），不传时使用当前时间
         """
-        current_time = time.time()
+        current_time = time.time() if timestamp is None else timestamp
         self.frame_count += 1
         
         # 处理新检测到的目标
@@ -1,13 +1,157 @@
-
+import math
+import time
 from collections import Counter
 
-def update_window(object_window, frame_objects):
-    if len(object_window) >= 60:
-        object_window.pop(0)
-    object_window.append(frame_objects)
+# 默认同时维护的时间窗口（秒）
+DEFAULT_WINDOWS = (1.0, 10.0, 60.0)
+# 摘要默认使用的窗口和最少出现次数
+DEFAULT_SUMMARY_WINDOW = 10.0
+DEFAULT_MIN_COUNT = 3
+
+
+class RollingAggregator:
+    def __init__(self, windows=DEFAULT_WINDOWS, bucket_seconds=0.1):
+        """
+        多时间窗口滚动计数：按 bucket_seconds 把帧归入环形缓冲区的时间桶，
+        每个窗口增量维护各类别的出现次数（新桶加入、过期桶减去），查询只与类别数有关
+        windows: 同时维护的窗口长度（秒）
+        bucket_seconds: 时间桶长度（秒），决定窗口边界的精度
+        """
+        self.bucket_seconds = bucket_seconds
+        self.windows = tuple(sorted(float(w) for w in windows))
+        # 每个窗口覆盖的桶数（包含当前桶）
+        self._window_buckets = {w: max(1, int(round(w / bucket_seconds))) for w in self.windows}
+        self._capacity = max(self._window_buckets.values()) + 1
+        # 环形缓冲区：每个槽位为 [桶编号, 类别计数, 帧数]
+        self._ring = [[None, Counter(), 0] for _ in range(self._capacity)]
+        self._totals = {w: Counter() for w in self.windows}
+        self._frames = {w: 0 for w in self.windows}
+        # 每个窗口当前包含的最早桶编号
+        self._tails = {w: None for w in self.windows}
+        self._current = None
+        self.frame_count = 0
+
+    def _slot(self, bucket_id):
+        return self._ring[bucket_id % self._capacity]
+
+    def _expire(self, bucket_id):
+        for w in self.windows:
+            new_tail = bucket_id - self._window_buckets[w] + 1
+            tail = self._tails[w]
+            if tail is None or new_tail - tail >= self._capacity:
+                # 首帧或间隔超过整个缓冲区：窗口内已无数据
+                self._totals[w].clear()
+                self._frames[w] = 0
+                self._tails[w] = new_tail
+                continue
+            totals = self._totals[w]
+            while tail < new_tail:
+                slot = self._slot(tail)
+                if slot[0] == tail:
+                    totals.subtract(slot[1])
+                    self._frames[w] -= slot[2]
+                    for cls in slot[1]:
+                        if totals[cls] <= 0:
+                            del totals[cls]
+                tail += 1
+            self._tails[w] = tail
+
+    def update(self, frame_objects, timestamp=None):
+        """
+        加入一帧检测到的物体类别列表；timestamp 为帧时间（秒，可为视频时间），不传时使用当前时间
+        时间倒退时（如切换视频）清空所有窗口
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        bucket_id = int(math.floor(timestamp / self.bucket_seconds))
+        if self._current is not None and bucket_id < self._current:
+            self.reset()
+        if bucket_id != self._current:
+            self._expire(bucket_id)
+            slot = self._slot(bucket_id)
+            if slot[0] != bucket_id:
+                slot[0] = bucket_id
+                slot[1].clear()
+                slot[2] = 0
+            self._current = bucket_id
+
+        slot = self._slot(bucket_id)
+        slot[1].update(frame_objects)
+        slot[2] += 1
+        for w in self.windows:
+            self._totals[w].update(frame_objects)
+            self._frames[w] += 1
+        self.frame_count += 1
+
+    def reset(self):
+        """
+        清空所有窗口
+        """
+        for slot in self._ring:
+            slot[0] = None
+            slot[1].clear()
+            slot[2] = 0
+        for w in self.windows:
+            self._totals[w].clear()
+            self._frames[w] = 0
+            self._tails[w] = None
+        self._current = None
+
+    def _window(self, window):
+        if window is None:
+            window = DEFAULT_SUMMARY_WINDOW
+        window = float(window)
+        if window not in self._totals:
+            raise ValueError(f"未维护的窗口 {window} s，可用窗口: {self.windows}")
+        return window
+
+    def counts(self, window=None):
+        """
+        最近 window 秒内各类别的出现次数
+        """
+        return Counter(self._totals[self._window(window)])
+
+    def frames(self, window=None):
+        """
+        最近 window 秒内的帧数
+        """
+        return self._frames[self._window(window)]
+
+    def classes_seen(self, min_count=DEFAULT_MIN_COUNT, window=None):
+        """
+        最近 window 秒内出现至少 min_count 次的类别及次数
+        """
+        return {cls: count for cls, count in self._totals[self._window(window)].items() if count >= min_count}
+
+    def summary(self, min_count=DEFAULT_MIN_COUNT, window=None):
+        """
+        生成摘要文字，返回 (摘要, 计数)
+        """
+        counter = self.counts(window)
+        summary = ', '.join(f"{v} 个 {k}" for k, v in counter.items() if v >= min_count)
+        return summary, counter
+
+    def get_debug_info(self):
+        """
+        获取调试信息
+        """
+        return {
+            'windows': self.windows,
+            'bucket_seconds': self.bucket_seconds,
+            'frame_count': self.frame_count,
+            'frames': dict(self._frames),
+            'classes': {w: len(self._totals[w]) for w in self.windows}
+        }
+
+
+def update_window(object_window, frame_objects, timestamp=None):
+    """
+    兼容旧接口：向 RollingAggregator 加入一帧
+    """
+    object_window.update(frame_objects, timestamp)
+
 
-def get_attention_summary(object_window):
-    flat = [obj for frame in object_window for obj in frame]
-    counter = Counter(flat)
-    summary = ', '.join(f"{v} 个 {k}" for k, v in counter.items() if v >= 3)
-    return summary, counter
+def get_attention_summary(object_window, min_count=DEFAULT_MIN_COUNT, window=None):
+    """
+    兼容旧接口：最近 window 秒内出现至少 min_count 次的物体摘要，返回 (摘要, 计数)
+    """
+    return object_window.summary(min_count, window)